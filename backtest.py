@@ -0,0 +1,331 @@
+import argparse
+import csv
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from predict_realtimev3 import ALARM_NAMES, ALARM_THRESHOLDS
+
+# Replays the sensor history through the model and the confirmation counters
+# of predict_realtimev3.decide_command() for a grid of ALARM_THRESHOLDS values.
+# Everything is array work: one batched predict over all rows (the version's
+# sklearn estimator, see model_registry.ESTIMATOR_FILE), then the
+# counters as run lengths (a class's counter is the length of the current run
+# of that prediction; any other prediction resets it), so millions of rows
+# take seconds instead of one 2 s tick per row. Every reading counts as a
+# tick, like the --stream path of loggerDaV2.
+# A class's command only depends on its own threshold, so the grid is scored
+# per (class, threshold) cell, one process per class; any combination of
+# thresholds is just the cells it picks.
+# Ground truth is train_modelv3.label_frame() on the same rows.
+#   python backtest.py                              -> sensor_readings, current model
+#   python backtest.py --source logs --thresholds 1-8
+#   python backtest.py --synthetic 500000 --devices 4 --verify 20000
+
+PREDICT_CHUNK = 100000
+GRACE_SECONDS = 10.0        # an alarm this long after an event still counts for it
+FALSE_PER_DAY = 1.0         # suggested threshold: fastest one under this many false alarms
+DEFAULT_GRID = "1-6"
+REPORT_PATH = "backtest_report.csv"
+BLOCK_GAP = 1e10            # seconds between devices on the combined time axis
+
+# --- DATA ---
+def load_history(args):
+    import pandas as pd
+    import train_modelv3 as tm
+    if args.synthetic:
+        from bench_pipeline import sim_readings
+        frames = []
+        for d in range(args.devices):
+            df = sim_readings(args.synthetic // args.devices, seed=100 + d)
+            df["device_id"] = f"sim{d}"
+            frames.append(df)
+        return pd.concat(frames, ignore_index=True)
+    if args.source == "logs":
+        return tm.load_sensor_frame(chunksize=args.chunksize)
+    if args.source == "parquet":
+        return tm.load_sensor_parquet(args.dataset, args.since, args.until)
+    return tm.load_sensor_readings(chunksize=args.chunksize)
+
+def build_arrays(df, model, feature_cols):
+    # per device, in time order: prediction, rule label, time (s), device block
+    from predict_realtimev3 import predict_batch
+    from train_modelv3 import label_frame, make_features
+
+    if "device_id" not in df.columns:
+        df = df.assign(device_id="")
+    df = df.assign(device_id=df["device_id"].fillna(""))
+    parts = {"pred": [], "truth": [], "t": [], "block": []}
+    devices = []
+    predict_seconds = 0.0
+    for block, (device_id, group) in enumerate(df.groupby("device_id", sort=True)):
+        features, _ = make_features(group.sort_values(["ts", "id"]).reset_index(drop=True))
+        X = features[feature_cols].to_numpy(dtype=float)
+        t = time.perf_counter()
+        preds = [np.asarray(predict_batch(model, X[i:i + PREDICT_CHUNK], feature_cols))
+                 for i in range(0, len(X), PREDICT_CHUNK)]
+        predict_seconds += time.perf_counter() - t
+        parts["pred"].append(np.concatenate(preds).astype(np.int8))
+        parts["truth"].append(label_frame(features).astype(np.int8))
+        parts["t"].append(features["ts"].to_numpy("datetime64[ms]").astype(np.int64) / 1000.0)
+        parts["block"].append(np.full(len(features), block, dtype=np.int32))
+        devices.append(device_id)
+    return {k: np.concatenate(v) for k, v in parts.items()}, devices, predict_seconds
+
+# --- COUNTERS ---
+def run_lengths(pred, block):
+    # length of the run of equal predictions ending at each row, per device
+    idx = np.arange(len(pred))
+    starts = np.ones(len(pred), dtype=bool)
+    starts[1:] = (pred[1:] != pred[:-1]) | (block[1:] != block[:-1])
+    return idx - np.maximum.accumulate(np.where(starts, idx, 0)) + 1
+
+def commands(pred, runlen, thresholds):
+    # class whose ALARM command decide_command() would send at each row, 0 = NORMAL
+    thr = np.full(max(ALARM_NAMES) + 1, 3)     # ALARM_THRESHOLDS.get(pred, 3)
+    for k, v in thresholds.items():
+        thr[k] = v
+    return np.where((pred != 0) & (runlen >= thr[pred]), pred, 0)
+
+def episodes(mask, block):
+    # (first, last) row of each run of True, never across devices
+    same = np.zeros(len(mask), dtype=bool)
+    same[1:] = block[1:] == block[:-1]
+    prev = np.zeros(len(mask), dtype=bool)
+    prev[1:] = mask[:-1]
+    nxt = np.zeros(len(mask), dtype=bool)
+    nxt[:-1] = mask[1:] & same[1:]
+    return np.flatnonzero(mask & ~(prev & same)), np.flatnonzero(mask & ~nxt)
+
+# --- SCORING ---
+def _pct(values, q):
+    return float(np.percentile(values, q)) if len(values) else float("nan")
+
+def score(k, threshold, a, grace=GRACE_SECONDS):
+    pred, truth, t, block, runlen, key = a["pred"], a["truth"], a["t"], a["block"], a["runlen"], a["key"]
+    alarm = (pred == k) & (runlen >= threshold)
+    actual = truth == k
+
+    # events: detected when the alarm starts inside the event (or within grace after)
+    ev_first, ev_last = episodes(actual, block)
+    alarm_rows = np.flatnonzero(alarm)
+    window_end = np.searchsorted(key, key[ev_last] + grace, side="right") - 1
+    j = np.searchsorted(alarm_rows, ev_first)
+    first_alarm = alarm_rows[np.minimum(j, len(alarm_rows) - 1)] if len(alarm_rows) else ev_first
+    hit = (j < len(alarm_rows)) & (first_alarm <= window_end)
+    delays = t[first_alarm[hit]] - t[ev_first[hit]]
+
+    # alarms: false when no row of the class lies in it or up to grace before it
+    al_first, al_last = episodes(alarm, block)
+    seen = np.concatenate([[0], np.cumsum(actual)])
+    lo = np.searchsorted(key, key[al_first] - grace, side="left")
+    false = seen[al_last + 1] - seen[lo] == 0
+    durations = t[al_last] - t[al_first] + a["tick"]
+
+    days = a["hours"] / 24
+    return {
+        "class": k,
+        "name": ALARM_NAMES.get(k, str(k)),
+        "threshold": threshold,
+        "events": len(ev_first),
+        "detected": int(hit.sum()),
+        "recall": float(hit.mean()) if len(hit) else float("nan"),
+        "delay_p50": _pct(delays, 50),
+        "delay_p95": _pct(delays, 95),
+        "alarms": len(al_first),
+        "false_alarms": int(false.sum()),
+        "false_per_day": float(false.sum() / days) if days else float("nan"),
+        "duration_p50": _pct(durations, 50),
+        "duration_p95": _pct(durations, 95),
+        "alarm_share": float(alarm.mean()) if len(alarm) else 0.0,
+    }
+
+def prepare(arrays):
+    a = dict(arrays)
+    a["runlen"] = run_lengths(a["pred"], a["block"])
+    # one increasing time axis for searchsorted; devices never overlap on it
+    a["key"] = a["t"] + a["block"] * BLOCK_GAP
+    same = a["block"][1:] == a["block"][:-1]
+    steps = np.diff(a["t"])[same]
+    a["tick"] = float(np.median(steps)) if len(steps) else 1.0
+    first = np.flatnonzero(np.r_[True, ~same])
+    last = np.r_[first[1:] - 1, len(a["t"]) - 1]
+    a["hours"] = float((a["t"][last] - a["t"][first]).sum() + a["tick"] * len(first)) / 3600
+    return a
+
+# --- WORKER SIDE ---
+_shared = {}
+_scalars = {}
+
+def _share(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def _init_worker(blocks, scalars):
+    for key, (name, shape, dtype) in blocks.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    _scalars.update(scalars)
+
+def _score_class(k, thresholds, grace):
+    a = {key: arr for key, (_, arr) in _shared.items()}
+    a.update(_scalars)
+    return [score(k, thr, a, grace) for thr in thresholds]
+
+# --- PARENT SIDE ---
+def backtest(arrays, grid, grace=GRACE_SECONDS, workers=None):
+    # grid: class -> thresholds to try; returns one result dict per cell
+    a = prepare(arrays)
+    workers = min(workers or os.cpu_count(), len(grid))
+    if workers <= 1:
+        return [score(k, thr, a, grace) for k, thrs in grid.items() for thr in thrs]
+
+    scalars = {"tick": a["tick"], "hours": a["hours"]}
+    shms, blocks = [], {}
+    for key in ("pred", "truth", "t", "block", "runlen", "key"):
+        shm, meta = _share(a[key])
+        shms.append(shm)
+        blocks[key] = meta
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(blocks, scalars)) as pool:
+            futures = [pool.submit(_score_class, k, thrs, grace) for k, thrs in grid.items()]
+            return [r for fut in futures for r in fut.result()]
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+def suggest(results, max_false_per_day=FALSE_PER_DAY):
+    # per class: the lowest (fastest) threshold within the false-alarm budget,
+    # else the one with the fewest false alarms
+    best = {}
+    for k in sorted({r["class"] for r in results}):
+        cells = sorted((r for r in results if r["class"] == k), key=lambda r: r["threshold"])
+        ok = [r for r in cells if r["false_per_day"] <= max_false_per_day]
+        best[k] = ok[0] if ok else min(cells, key=lambda r: (r["false_per_day"], r["threshold"]))
+    return best
+
+def verify(arrays, n):
+    # vectorised counters vs. the live decide_command() loop on the first n rows of each device
+    from predict_realtimev3 import decide_command, new_counters
+    pred, block = arrays["pred"], arrays["block"]
+    expected = commands(pred, run_lengths(pred, block), ALARM_THRESHOLDS)
+    checked = 0
+    for b in np.unique(block):
+        rows = np.flatnonzero(block == b)[:n]
+        counters = new_counters()
+        for i in rows:
+            command = decide_command(int(pred[i]), counters)
+            want = "ALARM:NORMAL" if expected[i] == 0 else f"ALARM:{ALARM_NAMES[expected[i]]}"
+            if command != want:
+                raise AssertionError(f"row {i}: decide_command={command}, vectorised={want}")
+        checked += len(rows)
+    return checked
+
+# --- REPORT ---
+def print_report(results, best):
+    header = (f"{'class':<10} {'thr':>3} {'events':>7} {'recall':>6} {'delay50':>8} {'delay95':>8} "
+              f"{'alarms':>7} {'false':>6} {'false/d':>8} {'dur50':>7} {'dur95':>7} {'share':>7}")
+    print("\n" + header)
+    for r in sorted(results, key=lambda r: (r["class"], r["threshold"])):
+        mark = ""
+        if r is best[r["class"]]:
+            mark += " *"
+        if ALARM_THRESHOLDS.get(r["class"]) == r["threshold"]:
+            mark += " (current)"
+        print(f"{r['name']:<10} {r['threshold']:>3} {r['events']:>7} {r['recall']:6.3f} "
+              f"{r['delay_p50']:7.1f}s {r['delay_p95']:7.1f}s {r['alarms']:>7} {r['false_alarms']:>6} "
+              f"{r['false_per_day']:8.2f} {r['duration_p50']:6.1f}s {r['duration_p95']:6.1f}s "
+              f"{r['alarm_share']:7.4f}{mark}")
+    suggested = {k: r["threshold"] for k, r in best.items()}
+    print(f"\nCurrent ALARM_THRESHOLDS:   {ALARM_THRESHOLDS}")
+    print(f"Suggested ALARM_THRESHOLDS: {suggested}")
+
+def write_report(results, best, path):
+    keys = list(results[0])
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(keys + ["current", "suggested"])
+        for r in sorted(results, key=lambda r: (r["class"], r["threshold"])):
+            w.writerow([f"{r[k]:.4f}" if isinstance(r[k], float) else r[k] for k in keys]
+                       + [int(ALARM_THRESHOLDS.get(r["class"]) == r["threshold"]), int(r is best[r["class"]])])
+
+def parse_grid(spec, classes):
+    # "1-6" or "1,2,3,5" for every class; the current threshold is always tried
+    values = set()
+    for part in spec.split(","):
+        lo, _, hi = part.partition("-")
+        values.update(range(int(lo), int(hi or lo) + 1))
+    return {k: sorted(values | {ALARM_THRESHOLDS.get(k, 3)}) for k in classes}
+
+def main():
+    p = argparse.ArgumentParser(description="Vectorised alarm backtest over the sensor history")
+    p.add_argument("--source", choices=["readings", "logs", "parquet"], default="readings",
+                   help="typed sensor_readings, raw event_logs details, or export_dataset.py Parquet files")
+    p.add_argument("--dataset", help="--source parquet: dataset directory")
+    p.add_argument("--since", help="--source parquet: first day/time to load (YYYY-MM-DD[THH:MM])")
+    p.add_argument("--until", help="--source parquet: load rows before this day/time")
+    p.add_argument("--chunksize", type=int, default=50000)
+    p.add_argument("--expand", action="store_true",
+                   help="rebuild the 1 Hz series from rows stored with loggerDaV2.py --deadband")
+    p.add_argument("--synthetic", type=int, nargs="?", const=200000, metavar="ROWS",
+                   help="simulator readings with alarm episodes instead of the database")
+    p.add_argument("--devices", type=int, default=1, help="--synthetic: boards to split the rows over")
+    p.add_argument("--model", default="risk_model.pkl")
+    p.add_argument("--registry", default="models")
+    p.add_argument("--thresholds", default=DEFAULT_GRID, help="thresholds to try per class, e.g. 1-8 or 1,2,4")
+    p.add_argument("--grace", type=float, default=GRACE_SECONDS)
+    p.add_argument("--max-false-per-day", type=float, default=FALSE_PER_DAY)
+    p.add_argument("--workers", type=int)
+    p.add_argument("--verify", type=int, metavar="ROWS",
+                   help="check the vectorised counters against decide_command() on this many rows per device")
+    p.add_argument("--report", default=REPORT_PATH)
+    args = p.parse_args()
+
+    from fast_forest import CompiledForest
+    from predict_realtimev3 import load_model
+    # the sklearn estimator scores big batches faster than the compiled walk
+    model, feature_cols = load_model(args.model, args.registry, estimator=True)
+    if isinstance(model, CompiledForest) and model.estimator is None:
+        print("No sklearn estimator with this model version, scoring with the compiled walk (slower)")
+
+    t0 = time.perf_counter()
+    print("Loading history...")
+    df = load_history(args)
+    if df.empty:
+        print("No sensor rows found. Exit.")
+        return
+    if args.expand:
+        import deadband
+        df = deadband.expand(df)
+    t_load = time.perf_counter()
+    print("Features + batch predict...")
+    arrays, devices, predict_seconds = build_arrays(df, model, feature_cols)
+    t_pred = time.perf_counter()
+    rows = len(arrays['pred'])
+    print(f"  {rows} rows, {len(devices)} devices: load {t_load - t0:.1f} s, "
+          f"features + predict {t_pred - t_load:.1f} s "
+          f"(predict {predict_seconds:.1f} s, {rows / max(predict_seconds, 1e-9):,.0f} rows/s)")
+
+    if args.verify:
+        print(f"Verified {verify(arrays, args.verify)} rows against decide_command()")
+
+    grid = parse_grid(args.thresholds, [k for k in ALARM_NAMES if k != 0])
+    t = time.perf_counter()
+    results = backtest(arrays, grid, args.grace, args.workers)
+    t_grid = time.perf_counter() - t
+    best = suggest(results, args.max_false_per_day)
+    print_report(results, best)
+    print(f"{len(results)} (class, threshold) cells in {t_grid:.2f} s "
+          f"({len(arrays['pred']) * len(results) / max(t_grid, 1e-9) / 1e6:.0f} M row-cells/s)")
+    if args.report:
+        write_report(results, best, args.report)
+        print(f"Report written to {args.report}")
+
+if __name__ == "__main__":
+    main()
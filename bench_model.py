@@ -0,0 +1,108 @@
+import argparse
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from feature_state import FeatureState, _synthetic_rows
+from fast_forest import CompiledForest, compile_forest
+from predict_realtimev3 import predict_batch
+
+BATCH_MIN_RATIO = 0.8   # predict_batch / sklearn örnek/sn, altı = hata
+
+# Micro-benchmark: current sklearn + DataFrame path vs. the compiled forest.
+#   python bench_model.py                 -> uses risk_model.pkl
+#   python bench_model.py --synthetic     -> trains a 200-tree forest on synthetic data
+
+def synthetic_model(n=20000):
+    from train_modelv3 import parse_details, make_features, label_from_row
+    from sklearn.ensemble import RandomForestClassifier
+
+    df = pd.DataFrame(_synthetic_rows(n, seed=7), columns=["id", "ts", "details"])
+    df["details_parsed"] = df["details"].apply(parse_details)
+    df_features, feature_cols = make_features(df)
+    y = df_features["details_parsed"].apply(label_from_row)
+    clf = RandomForestClassifier(n_estimators=200, class_weight="balanced", random_state=42)
+    clf.fit(df_features[feature_cols], y)
+    return clf, feature_cols
+
+def feature_matrix(feature_cols, n):
+    from train_modelv3 import parse_details
+    state = FeatureState(feature_cols)
+    return np.array([state.update(parse_details(d), ts) for _, ts, d in _synthetic_rows(n, seed=11)])
+
+def timings(fn, items):
+    out = []
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        out.append(time.perf_counter() - t)
+    us = np.array(out) * 1e6
+    return f"ort={us.mean():8.1f}us  p50={np.percentile(us, 50):8.1f}us  p99={np.percentile(us, 99):8.1f}us"
+
+def throughput(fn, X, repeat=3):
+    best = min(_elapsed(fn, X) for _ in range(repeat))
+    return len(X) / best
+
+def _elapsed(fn, X):
+    t = time.perf_counter()
+    fn(X)
+    return time.perf_counter() - t
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--model", default="risk_model.pkl")
+    p.add_argument("--synthetic", action="store_true")
+    p.add_argument("--samples", type=int, default=20000)
+    args = p.parse_args()
+
+    if args.synthetic or not os.path.exists(args.model):
+        print("Sentetik veriyle model eğitiliyor...")
+        clf, feature_cols = synthetic_model()
+    else:
+        bundle = joblib.load(args.model)
+        clf, feature_cols = bundle["model"], bundle["features"]
+
+    t = time.perf_counter()
+    fast = CompiledForest(compile_forest(clf))
+    print(f"Derleme: {(time.perf_counter() - t) * 1000:.1f} ms, {len(fast.roots)} ağaç, {len(fast.feature)} düğüm")
+
+    X = feature_matrix(feature_cols, args.samples)
+    X_df = pd.DataFrame(X, columns=feature_cols)
+
+    expected = clf.predict(X_df)
+    got = fast.predict(X)
+    mismatch = int((expected != got).sum())
+    print(f"Doğruluk kontrolü: {len(X)} örnek, uyumsuz={mismatch}")
+
+    print("\nTek örnek gecikmesi:")
+    rows = X[:300]
+    print("  sklearn + DataFrame :", timings(
+        lambda r: clf.predict(pd.DataFrame([r], columns=feature_cols)), rows[:100]))
+    print("  derlenmiş orman     :", timings(fast.predict_one, rows))
+
+    # predict_batch: compiled walk for small batches, the sklearn estimator above
+    # SKLEARN_BATCH_ROWS; it must never be clearly slower than sklearn alone
+    fast.estimator = clf
+    batch_mismatch = int((predict_batch(fast, X, feature_cols) != expected).sum())
+    print(f"predict_batch doğruluk kontrolü: uyumsuz={batch_mismatch}")
+
+    print("\nToplu işlem hızı (örnek/sn):")
+    slow = []
+    for size in (16, 256, 4096, len(X)):
+        Xb = X[:size]
+        sk = throughput(lambda a: clf.predict(pd.DataFrame(a, columns=feature_cols)), Xb)
+        fa = throughput(fast.predict, Xb)
+        pb = throughput(lambda a: predict_batch(fast, a, feature_cols), Xb)
+        print(f"  batch={size:6d}  sklearn={sk:12,.0f}  derlenmiş={fa:12,.0f}  predict_batch={pb:12,.0f}")
+        if pb < BATCH_MIN_RATIO * sk:
+            slow.append(size)
+    if slow:
+        print(f"✖ predict_batch sklearn'den yavaş: batch={slow}")
+
+    raise SystemExit(1 if mismatch or batch_mismatch or slow else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from sim_arduino import ALARM_VALUES, SimBoard, sensor_line
+
+# End-to-end benchmark without hardware or MySQL:
+#   sim_arduino boards -> loggerDaV2.py -> SQLite stand-in (db.py) -> predictor
+#   -> ALARM command back on the board's port, plus the dashboard feed refresh.
+# Measures lines/s ingested, alarm latency (first alarm line -> command on the
+# board) and dashboard refresh cost, and writes one JSON file per run.
+#   python bench_pipeline.py --devices 4 --rate 20 --duration 60
+#   python bench_pipeline.py --mode poll --baseline bench_results/pipeline-....json
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, "bench_results")
+ALARM = "FIRE"
+ALARM_SECONDS = 8.0         # how long a board reports the alarm values
+ALARM_TIMEOUT = 20.0
+REFRESH_INTERVAL = 1.0      # dashboard feed polls once a second
+
+def sim_readings(n, seed=5, t0=datetime(2025, 1, 1)):
+    # n simulator readings, 1 s apart, with 5-20 s alarm episodes; parsed columns
+    # like load_sensor_frame() returns (also used by backtest.py --synthetic)
+    import pandas as pd
+    from train_modelv3 import parse_details_frame
+
+    rnd = random.Random(seed)
+    alarms = list(ALARM_VALUES)
+    lines, alarm, left = [], None, 0
+    for _ in range(n):
+        if left == 0:
+            alarm, left = (rnd.choice(alarms), rnd.randint(5, 20)) if rnd.random() < 0.05 else (None, 1)
+        left -= 1
+        lines.append(sensor_line(rnd, alarm).split(";", 3)[3])
+    df = pd.DataFrame({"id": range(1, n + 1), "ts": [t0 + timedelta(seconds=i) for i in range(n)]})
+    return pd.concat([df, parse_details_frame(pd.Series(lines))], axis=1)
+
+def train_sim_model(path, n=20000, seed=5):
+    # a small forest trained on simulator lines, so alarms are actually detected
+    from sklearn.ensemble import RandomForestClassifier
+    from train_modelv3 import make_features, label_frame, save_model
+
+    df_features, feature_cols = make_features(sim_readings(n, seed))
+    clf = RandomForestClassifier(n_estimators=50, class_weight="balanced", random_state=42, n_jobs=-1)
+    clf.fit(df_features[feature_cols], label_frame(df_features))
+    save_model(clf, feature_cols, path)
+
+def percentiles(values, scale=1000.0):
+    if not values:
+        return {"n": 0}
+    a = np.array(values) * scale
+    return {"n": len(a), "mean": round(float(a.mean()), 2), "p50": round(float(np.percentile(a, 50)), 2),
+            "p95": round(float(np.percentile(a, 95)), 2), "max": round(float(a.max()), 2)}
+
+def start_script(script, args, workdir, env, log_path):
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable, "-u", os.path.join(HERE, script)] + args,
+                            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT), log
+
+def stop_script(proc, timeout=15):
+    if proc.poll() is not None:
+        return
+    # SIGINT lets loggerDaV2 flush the write-behind queue and print its stats
+    if os.name == "posix":
+        proc.send_signal(signal.SIGINT)
+    else:
+        proc.terminate()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+class RefreshProbe(threading.Thread):
+    # what one dashboard refresh costs: LiveFeed fetch + row prep + DataFrame build
+    def __init__(self, hot_path=None):
+        super().__init__(name="dashboard-probe", daemon=True)
+        self.hot_path = hot_path
+        self.times = []
+        self.rows = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        import db
+        from dashboard_feed import LiveFeed, to_frame
+        from hot_window import HotReader
+        feed = LiveFeed(hot=HotReader(self.hot_path) if self.hot_path else None)
+        session = db.session()
+        while not self._stop_event.wait(REFRESH_INTERVAL):
+            t = time.perf_counter()
+            rows, _ = feed._fetch(session)
+            prepared = [feed._prepare(r) for r in rows]
+            feed.rows.extend(prepared)
+            if prepared:
+                feed.last_id = prepared[-1]["id"]
+            elif feed.last_id is None:
+                feed.last_id = 0
+            to_frame(list(feed.rows))
+            self.times.append(time.perf_counter() - t)
+            self.rows.append(len(rows))
+
+    def close(self):
+        self._stop_event.set()
+        self.join(5)
+
+def max_reading_id(session):
+    return session.query("SELECT MAX(id) FROM sensor_readings")[0][0] or 0
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    db_path = os.path.join(workdir, "bench.db")
+    env = dict(os.environ, SMART_HOME_DB=f"sqlite://{db_path}",
+               PYTHONPATH=HERE + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    os.environ["SMART_HOME_DB"] = env["SMART_HOME_DB"]
+    import db
+    db.DB_URL = env["SMART_HOME_DB"]
+
+    print(f"Workdir: {workdir}")
+    model_path = os.path.join(workdir, "risk_model.pkl")
+    t = time.perf_counter()
+    train_sim_model(model_path)
+    print(f"Simulator model trained in {time.perf_counter() - t:.1f} s")
+
+    boards = [SimBoard(f"sim{i}", args.rate, args.transport, seed=i, protocol=args.protocol)
+              for i in range(args.devices)]
+    bridge_args = ["--ports"] + [f"{b.port}={b.device_id}" for b in boards]
+    if args.mode == "stream":
+        bridge_args.append("--stream")
+    hot_path = os.path.join(workdir, "hot_window.bin") if args.hot_window else None
+    hot_args = ["--hot-window", hot_path] if hot_path else []
+    procs = [start_script("loggerDaV2.py", bridge_args + hot_args, workdir, env,
+                          os.path.join(workdir, "bridge.log"))]
+    if args.mode == "poll":
+        procs.append(start_script("predict_realtimev3.py", ["--multi-device"] + hot_args, workdir, env,
+                                  os.path.join(workdir, "predictor.log")))
+    for b in boards:
+        b.start()
+
+    session = db.session()
+    deadline = time.perf_counter() + 30
+    while max_reading_id(session) == 0 and time.perf_counter() < deadline:
+        session.commit()
+        time.sleep(0.2)
+    session.commit()
+    time.sleep(args.warmup)
+
+    probe = RefreshProbe(hot_path)
+    probe.start()
+    sent0 = sum(b.sent for b in boards)
+    rows0 = max_reading_id(session)
+    session.commit()
+    t_start = time.perf_counter()
+
+    # alarm round trips, rotating over the boards, until the window is over
+    latencies, missed, k = [], 0, 0
+    while time.perf_counter() - t_start < args.duration - ALARM_SECONDS:
+        board = boards[k % len(boards)]
+        k += 1
+        board.trigger(ALARM, int(ALARM_SECONDS * args.rate))
+        while board.alarm_started is None:
+            time.sleep(0.001)
+        started = board.alarm_started
+        hit = board.wait_command(lambda c: c == f"ALARM:{ALARM}", started, ALARM_TIMEOUT)
+        if hit:
+            latencies.append(hit[0] - started)
+        else:
+            missed += 1
+        # wait for the board to go back to NORMAL before the next round
+        board.wait_command(lambda c: c == "ALARM:NORMAL", started + ALARM_SECONDS, ALARM_TIMEOUT)
+        time.sleep(1.0)
+
+    while time.perf_counter() - t_start < args.duration:
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - t_start
+    sent = sum(b.sent for b in boards) - sent0
+    session.commit()
+    ingested = max_reading_id(session) - rows0
+    session.commit()
+    probe.close()
+
+    for b in boards:
+        b.close()
+    for proc, log in procs:
+        stop_script(proc)
+        log.close()
+
+    result = {
+        "benchmark": "pipeline",
+        "version": git_version(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {"devices": args.devices, "rate_per_device": args.rate, "duration_s": args.duration,
+                   "mode": args.mode, "transport": args.transport, "protocol": args.protocol,
+                   "hot_window": args.hot_window, "db": "sqlite"},
+        "ingest": {
+            "lines_sent": sent,
+            "rows_ingested": ingested,
+            "sent_per_s": round(sent / elapsed, 1),
+            "ingested_per_s": round(ingested / elapsed, 1),
+        },
+        "alarm_latency_ms": dict(percentiles(latencies), missed=missed),
+        "dashboard_refresh_ms": dict(percentiles(probe.times),
+                                     rows_per_refresh=round(float(np.mean(probe.rows)), 1) if probe.rows else 0),
+        "logs": workdir,
+    }
+    return result
+
+# key metric -> True if higher is better
+TRACKED = {
+    ("ingest", "ingested_per_s"): True,
+    ("alarm_latency_ms", "p50"): False,
+    ("alarm_latency_ms", "p95"): False,
+    ("dashboard_refresh_ms", "p50"): False,
+    ("dashboard_refresh_ms", "p95"): False,
+}
+
+def compare(result, baseline_path):
+    with open(baseline_path) as f:
+        base = json.load(f)
+    print(f"\nvs {baseline_path} ({base.get('version')}):")
+    if base.get("config") != result["config"]:
+        print(f"  note: different config {base.get('config')}")
+    for (section, key), higher_better in TRACKED.items():
+        old = base.get(section, {}).get(key)
+        new = result.get(section, {}).get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        worse = change < 0 if higher_better else change > 0
+        print(f"  {section}.{key}: {old} -> {new} ({change:+.1f}%){'  <- regression' if worse and abs(change) > 10 else ''}")
+
+def main():
+    p = argparse.ArgumentParser(description="End-to-end pipeline benchmark (simulated boards + SQLite)")
+    p.add_argument("--devices", type=int, default=2)
+    p.add_argument("--rate", type=float, default=10.0, help="lines/s per board")
+    p.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    p.add_argument("--warmup", type=float, default=3.0)
+    p.add_argument("--mode", choices=["stream", "poll"], default="stream",
+                   help="stream: loggerDaV2 --stream; poll: predict_realtimev3 --multi-device")
+    p.add_argument("--transport", choices=["pty", "tcp"], default="pty" if os.name == "posix" else "tcp")
+    p.add_argument("--protocol", choices=["text", "binary"], default="text",
+                   help="board output: LOG;SENSORS;ALL lines or serial_frames.py frames")
+    p.add_argument("--hot-window", action="store_true",
+                   help="bridge publishes to hot_window.py; predictor and dashboard feed read from it")
+    p.add_argument("--out", help="result file (default bench_results/pipeline-<time>.json)")
+    p.add_argument("--baseline", help="earlier result file to compare against")
+    args = p.parse_args()
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+
+    out = args.out or os.path.join(RESULTS_DIR, f"pipeline-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Result written to {out}")
+    if args.baseline:
+        compare(result, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import model_registry
+
+# Predictor cold start, split into the parts a restart pays before the first
+# alarm can be evaluated, each in a fresh interpreter:
+#   import : import predict_realtimev3 (numpy, mysql.connector, ...)
+#   load   : load_model(), pickle (joblib + sklearn) vs. models/ registry (mmap)
+#   first  : first predict_one() on the loaded model (page faults for mmap)
+# plus the in-process hot reload: publish a version -> Watcher.poll() has it.
+#   python bench_startup.py                 -> risk_model.pkl if present
+#   python bench_startup.py --synthetic --runs 10
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def child(kind, workdir):
+    # runs in a fresh interpreter; prints one JSON line on stdout
+    t0 = time.perf_counter()
+    import predict_realtimev3 as pr
+    t1 = time.perf_counter()
+    registry = pr.REGISTRY_DIR if kind == "registry" else os.path.join(workdir, "no-registry")
+    with contextlib.redirect_stdout(sys.stderr):
+        model, feature_cols = pr.load_model(os.path.join(workdir, "risk_model.pkl"), registry)
+    t2 = time.perf_counter()
+    pr.predict_one(model, [0.0] * len(feature_cols), feature_cols)
+    t3 = time.perf_counter()
+    print(json.dumps({"import": t1 - t0, "load": t2 - t1, "first": t3 - t2}))
+
+def run_child(kind, workdir):
+    env = dict(os.environ, PYTHONPATH=HERE + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    t = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", kind],
+                         cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    total = time.perf_counter() - t
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process"] = total   # interpreter start + all of the above + exit
+    return result
+
+def prepare(workdir, model_path, synthetic):
+    pkl = os.path.join(workdir, "risk_model.pkl")
+    if synthetic or not os.path.exists(model_path):
+        print("Sentetik veriyle model eğitiliyor...")
+        from bench_pipeline import train_sim_model
+        with contextlib.redirect_stdout(sys.stderr):
+            train_sim_model(pkl)      # writes the pkl and publishes workdir/models
+        return
+    import joblib
+    from fast_forest import compile_forest
+    shutil.copy(model_path, pkl)
+    bundle = joblib.load(pkl)
+    compiled = bundle.get("compiled") or compile_forest(bundle["model"])
+    model_registry.publish(compiled, bundle["features"], os.path.join(workdir, model_registry.REGISTRY_DIR))
+
+def hot_reload(workdir, runs):
+    root = os.path.join(workdir, model_registry.REGISTRY_DIR)
+    _, feature_cols, version = model_registry.load(root)
+    compiled = {name: np.load(os.path.join(root, version, f"{name}.npy")) for name in model_registry.ARRAYS}
+    with open(os.path.join(root, version, "meta.json")) as f:
+        meta = json.load(f)
+    compiled.update(depth=meta["depth"], n_features=meta["n_features"])
+
+    watcher = model_registry.Watcher(root, version)
+    idle, publish, swap = [], [], []
+    for _ in range(runs):
+        t = time.perf_counter()
+        watcher.poll()              # nothing new: the per-cycle cost
+        idle.append(time.perf_counter() - t)
+        time.sleep(0.01)            # distinct mtime on coarse filesystems
+        t = time.perf_counter()
+        model_registry.publish(compiled, feature_cols, root)
+        publish.append(time.perf_counter() - t)
+        t = time.perf_counter()
+        loaded = watcher.poll()
+        swap.append(time.perf_counter() - t)
+        assert loaded is not None
+    return idle, publish, swap
+
+def fmt(values, scale=1000.0, unit="ms"):
+    a = np.array(values) * scale
+    return f"p50={np.percentile(a, 50):9.3f}{unit}  min={a.min():9.3f}{unit}  max={a.max():9.3f}{unit}"
+
+def main():
+    p = argparse.ArgumentParser(description="Tahminci açılış süresi: import / yükleme / ilk tahmin")
+    p.add_argument("--model", default="risk_model.pkl")
+    p.add_argument("--synthetic", action="store_true")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--child", choices=["pkl", "registry"], help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child:
+        child(args.child, os.getcwd())
+        return
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    try:
+        prepare(workdir, args.model, args.synthetic)
+        for kind in ("pkl", "registry"):
+            run_child(kind, workdir)    # warm the OS file cache once, not timed
+        results = {kind: [run_child(kind, workdir) for _ in range(args.runs)] for kind in ("pkl", "registry")}
+
+        print(f"\nSoğuk başlangıç ({args.runs} süreç / yol):")
+        for kind, runs in results.items():
+            print(f"  {kind}:")
+            for part in ("import", "load", "first", "process"):
+                print(f"    {part:<8}: {fmt([r[part] for r in runs])}")
+
+        idle, publish, swap = hot_reload(workdir, max(args.runs, 5))
+        print("\nSıcak yeniden yükleme (aynı süreç):")
+        print(f"  değişiklik yok (poll) : {fmt(idle, 1e6, 'us')}")
+        print(f"  yayınlama (publish)   : {fmt(publish)}")
+        print(f"  algılama + yükleme    : {fmt(swap)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
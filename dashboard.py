@@ -1,13 +1,10 @@
 import streamlit as st
-import pandas as pd
-import mysql.connector
 import time
-import plotly.graph_objects as go
+from datetime import datetime, timedelta
 
-DB_HOST = "localhost"
-DB_USER = "root"
-DB_PASSWORD = ""
-DB_NAME = "smart_home"
+from dashboard_feed import LiveFeed, to_frame
+import hot_window
+import retention
 
 st.set_page_config(
     page_title="Smart Home AI Center",
@@ -15,78 +12,182 @@ st.set_page_config(
     layout="wide"
 )
 
-def get_data():
-    conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
-    
-    query = "SELECT details, event_timestamp FROM event_logs WHERE event_source='SENSORS' ORDER BY id DESC LIMIT 50"
-    df = pd.read_sql(query, conn)
-    
-    cmd_query = "SELECT command, created_at FROM command_queue ORDER BY id DESC LIMIT 1"
-    cursor = conn.cursor()
-    cursor.execute(cmd_query)
-    last_cmd = cursor.fetchone()
-    
-    conn.close()
-    return df, last_cmd
-
-def parse_sensor_data(df):
-    data_list = []
-    for index, row in df.iterrows():
-        d = {}
-        parts = row['details'].split(',')
-        for p in parts:
-            if '=' in p:
-                k, v = p.split('=', 1)
-                key = k.strip()
-                
-                if key == "DIST": key = "DISTANCE"
-                
-                try:
-                    d[key] = float(v)
-                except:
-                    d[key] = 0
-        d['ts'] = row['event_timestamp']
-        data_list.append(d)
-    
-    df_out = pd.DataFrame(data_list)
-    
-    required_cols = ["GAS", "FLAME", "LDR", "DISTANCE", "VIBRATION", "TEMP", "HUM"]
-    for col in required_cols:
-        if col not in df_out.columns:
-            df_out[col] = 0
-            
-    return df_out
+@st.cache_resource
+def get_feed():
+    # one polling thread + window for every session on this server; readings
+    # come from the bridge's shared memory whenever it runs with --hot-window
+    # (the reader keeps re-checking, the bridge may start after the dashboard)
+    return LiveFeed(hot=hot_window.HotReader()).start()
 
 st.title("🧠 AI-Powered Smart Home - Control Panel")
 st.markdown("This panel monitors sensor data and AI decisions in real-time.")
 
-placeholder = st.empty()
+FIRE_COLS = {"TEMP": "Temp (°C)", "FLAME": "Flame (IR)", "GAS": "Gas (MQ2)"}
+FIRE_COLORS = ["#008000", "#ff0000", "#ffa500"]
+SECURITY_COLS = {"DISTANCE": "Distance (cm)", "HUM": "Humidity (%)"}
+SECURITY_COLORS = ["#0000ff", "#00ffff"]
+# 0/1 next to distances in cm: its own chart (was the secondary y axis)
+VIBRATION_COLS = {"VIBRATION": "Vibration"}
+VIBRATION_COLOR = "#800080"
+REDRAW_AFTER = 600   # appended rows before a chart is rebuilt from the window
+
+def chart_frame(df, cols):
+    return df.set_index("ts")[list(cols)].rename(columns=cols)
+
+def ai_decision(last_cmd):
+    ai_status = "WAITING..."
+    status_color = "gray"
+
+    if last_cmd:
+        raw_cmd = last_cmd[0]
+        ai_status = raw_cmd.replace("ALARM:", "")
+
+        if ai_status == "NORMAL": status_color = "#28a745"
+        elif ai_status in ["FIRE", "GAS", "FLOOD"]: status_color = "#dc3545"
+        elif ai_status == "INTRUSION": status_color = "#ffc107"
+        elif ai_status == "VIBRATION": status_color = "#17a2b8"
+    return ai_status, status_color
+
+# history is aggregated per bucket in MySQL (raw rows for short ranges, the
+# retention.py rollups for long ones) and thinned with LTTB, so a chart gets
+# ~retention.CHART_POINTS points per series whatever the range
+HISTORY_RANGES = {
+    "Live": None,
+    "Last hour": timedelta(hours=1),
+    "Last 6 hours": timedelta(hours=6),
+    "Last 24 hours": timedelta(days=1),
+    "Last 7 days": timedelta(days=7),
+    "Last 30 days": timedelta(days=30),
+    "Last 365 days": timedelta(days=365),
+    "Custom": None,
+}
+HISTORY_TTL = 60        # seconds a (range, bucket) result is reused
+
+def bucket_label(seconds):
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds // size} {unit}"
+    return f"{seconds} s"
+
+def history_range(range_key):
+    # preset name -> ending now; (first day, last day) -> whole days
+    if isinstance(range_key, tuple):
+        first, last = range_key
+        since = datetime.combine(first, datetime.min.time())
+        return since, datetime.combine(last, datetime.min.time()) + timedelta(days=1)
+    now = datetime.now()
+    return now - HISTORY_RANGES[range_key], now
+
+@st.cache_data(ttl=HISTORY_TTL)
+def get_history(range_key, bucket):
+    # cached per (range, bucket): every session asking for the same view shares one query
+    since, until = history_range(range_key)
+    t = time.perf_counter()
+    df, table = retention.load_buckets(since, until, bucket)
+    return df, table, time.perf_counter() - t
+
+def history_chart(df, cols, **kwargs):
+    t = time.perf_counter()
+    if not isinstance(cols, dict):
+        cols = dict(zip(cols, cols))
+    frame = chart_frame(retention.downsample(df, list(cols)), cols)
+    st.line_chart(frame, **kwargs)
+    return len(frame), time.perf_counter() - t
+
+range_name = st.sidebar.radio("Time range", list(HISTORY_RANGES))
+if range_name != "Live":
+    range_key = range_name
+    if range_name == "Custom":
+        today = datetime.now().date()
+        days = st.sidebar.date_input("Days", (today - timedelta(days=1), today), max_value=today)
+        if len(days) != 2:
+            st.info("Pick the first and the last day.")
+            st.stop()
+        range_key = tuple(days)
+    since, until = history_range(range_key)
+    # finer buckets than auto would mean more rows than the chart can show
+    auto = retention.bucket_for(until - since)
+    buckets = [b for b in retention.CHART_BUCKETS if b >= auto]
+    bucket = st.sidebar.selectbox("Bucket", buckets, format_func=bucket_label)
+
+    df_hist, table, query_time = get_history(range_key, bucket)
+    if df_hist.empty:
+        st.info(f"No data in {table} for this range (rollups come from retention.py).")
+    else:
+        charts = []
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("📈 Climate & Fire Analysis")
+            charts.append(history_chart(df_hist, FIRE_COLS, color=FIRE_COLORS, height=350))
+            charts.append(history_chart(df_hist, ["GAS_min", "GAS", "GAS_max"], height=250))
+        with col2:
+            st.subheader("🕵️ Security & Environment")
+            charts.append(history_chart(df_hist, SECURITY_COLS, color=SECURITY_COLORS, height=350))
+            charts.append(history_chart(df_hist, VIBRATION_COLS, color=VIBRATION_COLOR, height=150))
+            charts.append(history_chart(df_hist, ["DISTANCE_min", "DISTANCE", "DISTANCE_max"], height=250))
+        st.caption(
+            f"{range_name}: {len(df_hist)} buckets of {bucket_label(bucket)} from {table} "
+            f"({df_hist['samples'].sum():.0f} readings), at most {max(n for n, _ in charts)} points per chart, "
+            f"query {query_time * 1000:.0f} ms, charts {sum(s for _, s in charts) * 1000:.0f} ms"
+        )
+    st.stop()
+
+feed = get_feed()
+
+kpi_placeholder = st.empty()
+st.divider()
+col1, col2 = st.columns(2)
+with col1:
+    st.subheader("📈 Climate & Fire Analysis")
+    fire_placeholder = st.empty()
+with col2:
+    st.subheader("🕵️ Security & Environment")
+    security_placeholder = st.empty()
+    vibration_placeholder = st.empty()
+with st.expander("📝 Live Data Flow (Last 5 Records)"):
+    table_placeholder = st.empty()
+error_placeholder = st.empty()
+
+last_id = None
+appended = 0
+fire_chart = security_chart = vibration_chart = None
 
 while True:
     try:
-        df_raw, last_cmd = get_data()
-        
-        if not df_raw.empty:
-            df_parsed = parse_sensor_data(df_raw)
-            
-            df_parsed['DISTANCE'] = df_parsed['DISTANCE'].rolling(window=3, min_periods=1).mean()
-            df_parsed['LDR'] = df_parsed['LDR'].rolling(window=3, min_periods=1).mean()
-
-            latest = df_parsed.iloc[0]
-            
-            ai_status = "WAITING..."
-            status_color = "gray"
-            
-            if last_cmd:
-                raw_cmd = last_cmd[0]
-                ai_status = raw_cmd.replace("ALARM:", "")
-                
-                if ai_status == "NORMAL": status_color = "#28a745"
-                elif ai_status in ["FIRE", "GAS", "FLOOD"]: status_color = "#dc3545"
-                elif ai_status == "INTRUSION": status_color = "#ffc107"
-                elif ai_status == "VIBRATION": status_color = "#17a2b8"
+        new_rows, gap = feed.rows_after(last_id)
+        window, last_cmd, error = feed.snapshot()
+
+        if error:
+            error_placeholder.error(f"Waiting for data flow... ({error})")
+        else:
+            error_placeholder.empty()
 
-            with placeholder.container():
+        if new_rows:
+            df_new = to_frame(new_rows)
+
+            if gap or fire_chart is None or appended > REDRAW_AFTER:
+                # (re)seed the charts with the whole shared window
+                df_window = to_frame(window)
+                fire_chart = fire_placeholder.line_chart(
+                    chart_frame(df_window, FIRE_COLS), color=FIRE_COLORS, height=350)
+                security_chart = security_placeholder.line_chart(
+                    chart_frame(df_window, SECURITY_COLS), color=SECURITY_COLORS, height=350)
+                vibration_chart = vibration_placeholder.line_chart(
+                    chart_frame(df_window, VIBRATION_COLS), color=VIBRATION_COLOR, height=150)
+                appended = 0
+                new_rows = window
+            else:
+                # only the new points go to the browser
+                fire_chart.add_rows(chart_frame(df_new, FIRE_COLS))
+                security_chart.add_rows(chart_frame(df_new, SECURITY_COLS))
+                vibration_chart.add_rows(chart_frame(df_new, VIBRATION_COLS))
+                appended += len(df_new)
+            last_id = new_rows[-1]["id"]
+
+            latest = new_rows[-1]
+            ai_status, status_color = ai_decision(last_cmd)
+
+            with kpi_placeholder.container():
                 kpi1, kpi2, kpi3, kpi4, kpi5 = st.columns(5)
                 
                 kpi1.markdown(f"### 🛡️ AI DECISION")
@@ -112,42 +213,12 @@ while True:
                     value=f"{latest.get('DISTANCE', 0):.1f} cm",
                     delta=f"LDR: {latest.get('LDR', 0):.0f}"
                 )
-                
-                st.divider()
 
-                col1, col2 = st.columns(2)
-                
-                unique_key_suffix = int(time.time() * 1000)
-
-                with col1:
-                    st.subheader("📈 Climate & Fire Analysis")
-                    fig = go.Figure()
-                    fig.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['TEMP'], name='Temp (°C)', line=dict(color='green')))
-                    fig.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['FLAME'], name='Flame (IR)', line=dict(color='red')))
-                    fig.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['GAS'], name='Gas (MQ2)', line=dict(color='orange')))
-                    fig.update_layout(height=350, margin=dict(l=20, r=20, t=30, b=20))
-                    
-                    st.plotly_chart(fig, use_container_width=True, key=f"fire_chart_{unique_key_suffix}")
-                    
-                with col2:
-                    st.subheader("🕵️ Security & Environment")
-                    fig2 = go.Figure()
-                    fig2.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['DISTANCE'], name='Distance (cm)', line=dict(color='blue')))
-                    fig2.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['HUM'], name='Humidity (%)', line=dict(color='cyan')))
-                    fig2.add_trace(go.Scatter(x=df_parsed['ts'], y=df_parsed['VIBRATION'], name='Vibration', line=dict(color='purple'), yaxis='y2'))
-                    
-                    fig2.update_layout(
-                        yaxis2=dict(overlaying='y', side='right', range=[-0.1, 1.1]),
-                        height=350, margin=dict(l=20, r=20, t=30, b=20)
-                    )
-                    
-                    st.plotly_chart(fig2, use_container_width=True, key=f"security_chart_{unique_key_suffix}")
-
-                with st.expander("📝 Live Data Flow (Last 5 Records)"):
-                    st.dataframe(df_parsed.head(5))
-
-        time.sleep(1)
+            table_placeholder.dataframe(to_frame(window[-5:][::-1]))
+
+        # wakes up as soon as the shared feed has polled again
+        feed.wait(timeout=2)
         
     except Exception as e:
         st.error(f"Waiting for data flow... ({e})")
-        time.sleep(2)
\ No newline at end of file
+        time.sleep(2)
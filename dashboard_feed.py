@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+import db
+import readings
+
+# Shared rolling window for the dashboard. One LiveFeed per Streamlit server
+# (st.cache_resource): a single thread polls only rows with id > last seen,
+# every browser session reads from the same in-memory window. With a
+# hot_window.HotReader the readings come from loggerDaV2's shared memory
+# while a bridge publishes there (MySQL otherwise, it is re-checked every
+# poll) and only the latest command is read from MySQL. Row ids are
+# feed-local, so they keep increasing across a switch between the two.
+
+WINDOW = 300            # rows kept in memory
+POLL_INTERVAL = 1.0     # seconds between DB polls
+SMOOTH_WINDOW = 3       # trailing mean for DISTANCE / LDR
+SMOOTHED = ["DISTANCE", "LDR"]
+
+FEED_COLUMNS = ["id", "ts"] + readings.KEYS
+
+LATEST_ROWS_SQL = f"SELECT id, ts, {', '.join(readings.COLUMNS)} FROM sensor_readings ORDER BY id DESC LIMIT %s"
+ROWS_AFTER_SQL = f"SELECT id, ts, {', '.join(readings.COLUMNS)} FROM sensor_readings WHERE id > %s ORDER BY id ASC LIMIT %s"
+LATEST_COMMAND_SQL = "SELECT id, command, created_at FROM command_queue WHERE id > %s ORDER BY id DESC LIMIT 1"
+
+class LiveFeed:
+    def __init__(self, window=WINDOW, poll_interval=POLL_INTERVAL, hot=None):
+        self.window = window
+        self.hot = hot
+        self._from_hot = False
+        self._seq = 0           # feed-local row ids
+        self._reset_id = 1      # first id after the last source switch
+        self.poll_interval = poll_interval
+        self.rows = deque(maxlen=window)
+        self.last_id = None
+        self.db_last_id = None  # sensor_readings cursor
+        self.last_cmd = None
+        self.last_cmd_id = 0
+        self.error = None
+        self.polls = 0
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self._raw = {c: deque(maxlen=SMOOTH_WINDOW) for c in SMOOTHED}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dashboard-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    # --- DB / hot window side (feed thread only) ---
+    def _fetch_hot(self):
+        polled = self.hot.poll(self.window)
+        if self.hot.error:
+            raise OSError(self.hot.error)   # bridge gone: shown like a DB error
+        return [(0, ts) + values for _, _, values, ts in polled[-self.window:]]
+
+    def _switch(self, from_hot):
+        # the window starts over from the other source; sessions redraw
+        with self.lock:
+            self.rows.clear()
+            for raw in self._raw.values():
+                raw.clear()
+            self._reset_id = self._seq + 1
+        self._from_hot = from_hot
+        self.db_last_id = None
+        if from_hot:
+            self.hot.rewind()
+
+    def _fetch(self, session):
+        from_hot = self.hot is not None and self.hot.live()
+        if from_hot != self._from_hot:
+            self._switch(from_hot)
+        if from_hot:
+            rows = self._fetch_hot()
+        elif self.db_last_id is None:
+            # first poll: newest WINDOW rows, oldest first
+            rows = session.query(LATEST_ROWS_SQL, (self.window,))[::-1]
+        else:
+            rows = session.query(ROWS_AFTER_SQL, (self.db_last_id, self.window))
+        if not from_hot:
+            self.db_last_id = rows[-1][0] if rows else (self.db_last_id or 0)
+        cmd = session.query(LATEST_COMMAND_SQL, (self.last_cmd_id,))
+        session.commit()  # end the read snapshot so the next poll sees new rows
+        out = []
+        for row in rows:
+            self._seq += 1
+            out.append((self._seq,) + tuple(row[1:]))
+        return out, cmd[0] if cmd else None
+
+    def _prepare(self, row):
+        # NULL -> 0 like the old parse_sensor_data, DISTANCE / LDR smoothed
+        out = dict(zip(FEED_COLUMNS, row))
+        for key in readings.KEYS:
+            if out[key] is None:
+                out[key] = 0.0
+            else:
+                out[key] = float(out[key])
+        for key in SMOOTHED:
+            raw = self._raw[key]
+            raw.append(out[key])
+            out[key] = sum(raw) / len(raw)
+        return out
+
+    def _run(self):
+        session = db.session()
+        while True:
+            try:
+                rows, cmd = self._fetch(session)
+
+                prepared = [self._prepare(r) for r in rows]
+                with self.changed:
+                    self.rows.extend(prepared)
+                    if prepared:
+                        self.last_id = prepared[-1]["id"]
+                    elif self.last_id is None:
+                        self.last_id = 0
+                    if cmd:
+                        self.last_cmd_id = cmd[0]
+                        self.last_cmd = (cmd[1], cmd[2])
+                    self.error = None
+                    self.polls += 1
+                    self.changed.notify_all()
+            except Exception as e:
+                with self.lock:
+                    self.error = str(e)
+                session.reset()
+            time.sleep(self.poll_interval)
+
+    # --- session side ---
+    def snapshot(self):
+        with self.lock:
+            return list(self.rows), self.last_cmd, self.error
+
+    def rows_after(self, last_id):
+        # (new rows, gap) -- gap means the caller fell behind the window and
+        # should redraw from snapshot() instead of appending
+        with self.lock:
+            if not self.rows or last_id is None or last_id < self._reset_id:
+                return list(self.rows), True
+            if self.rows[0]["id"] > last_id + 1 and len(self.rows) == self.rows.maxlen:
+                return list(self.rows), True
+            new = []
+            for row in reversed(self.rows):
+                if row["id"] <= last_id:
+                    break
+                new.append(row)
+            return new[::-1], False
+
+    def wait(self, timeout):
+        # block until the next poll lands (or timeout) instead of sleeping blindly
+        with self.changed:
+            polls = self.polls
+            self.changed.wait_for(lambda: self.polls != polls, timeout=timeout)
+        return self
+
+def to_frame(rows):
+    df = pd.DataFrame(rows, columns=FEED_COLUMNS)
+    df["ts"] = pd.to_datetime(df["ts"])
+    return df
@@ -0,0 +1,311 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import mysql.connector
+from mysql.connector import Error, errors, pooling
+
+# Shared DB access for the bridge, predictor, training and dashboard.
+#   connect()  -> pooled connection, health-checked with ping(reconnect=True);
+#                 conn.close() hands it back to the pool
+#   session()  -> per-thread Session: checks a connection out for one
+#                 transaction and hands it back on commit() / rollback(), one
+#                 prepared cursor per fixed SQL text while it holds it,
+#                 reconnect + retry when MySQL restarts
+#   SMART_HOME_DB=sqlite:///path.db -> local SQLite stand-in (benchmarks, no MySQL)
+
+DB_HOST = "localhost"
+DB_USER = "root"
+DB_PASSWORD = ""
+DB_NAME = "smart_home"
+
+DB_CONFIG = {
+    "host": DB_HOST,
+    "user": DB_USER,
+    "password": DB_PASSWORD,
+    "database": DB_NAME,
+    "connection_timeout": 5,
+}
+
+DB_URL = os.environ.get("SMART_HOME_DB", "")
+
+POOL_NAME = "smart_home"
+POOL_SIZE = 5             # sessions only hold a connection inside a transaction
+POOL_WAIT = 5.0           # seconds to wait for a free pooled connection
+PING_ATTEMPTS = 3
+PING_DELAY = 1            # seconds between reconnect attempts
+
+# connection dropped / server gone: safe to reconnect and retry
+RETRYABLE = (errors.InterfaceError, errors.OperationalError)
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name=POOL_NAME, pool_size=POOL_SIZE, pool_reset_session=True, **DB_CONFIG
+            )
+        return _pool
+
+def connect():
+    if DB_URL.startswith("sqlite:"):
+        # sqlite:///tmp/bench.db -> /tmp/bench.db, sqlite:bench.db -> bench.db
+        path = DB_URL[len("sqlite:"):]
+        return sqlite_connect(path[2:] if path.startswith("//") else path)
+    deadline = time.monotonic() + POOL_WAIT
+    while True:
+        try:
+            conn = get_pool().get_connection()
+            break
+        except errors.PoolError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    try:
+        # a pooled connection may be stale after a MySQL restart
+        conn.ping(reconnect=True, attempts=PING_ATTEMPTS, delay=PING_DELAY)
+    except Error:
+        conn.close()
+        raise
+    return conn
+
+class Session:
+    def __init__(self):
+        self.conn = None
+        self.cursors = {}
+        self.dirty = False      # uncommitted writes -> not safe to retry
+        self.reconnects = 0
+
+    def _connection(self):
+        if self.conn is None:
+            self.conn = connect()
+        return self.conn
+
+    def _cursor(self, sql, prepared):
+        if not prepared:
+            return self._connection().cursor()
+        cur = self.cursors.get(sql)
+        if cur is None:
+            cur = self.cursors[sql] = self._connection().cursor(prepared=True)
+        return cur
+
+    def _run(self, sql, params, prepared, many=False):
+        for attempt in range(2):
+            try:
+                cur = self._cursor(sql, prepared)
+                if many:
+                    cur.executemany(sql, params)
+                else:
+                    cur.execute(sql, params)
+                rows = cur.fetchall() if cur.with_rows else None
+                rowcount = cur.rowcount
+                if not prepared:
+                    cur.close()
+                return rows, rowcount
+            except RETRYABLE:
+                retry = attempt == 0 and not self.dirty
+                self.reset()
+                if not retry:
+                    raise
+                self.reconnects += 1
+
+    def query(self, sql, params=(), prepared=True):
+        return self._run(sql, params, prepared)[0]
+
+    def execute(self, sql, params=(), prepared=True):
+        rowcount = self._run(sql, params, prepared)[1]
+        self.dirty = True
+        return rowcount
+
+    def executemany(self, sql, rows):
+        # plain cursor: mysql.connector rewrites INSERTs into one multi-row statement
+        rowcount = self._run(sql, rows, False, many=True)[1]
+        self.dirty = True
+        return rowcount
+
+    def commit(self):
+        try:
+            if self.conn is not None:
+                self.conn.commit()
+        finally:
+            # back to the pool between transactions: idle threads (writer,
+            # dispatcher, spool, inference, ports) must not pin all POOL_SIZE
+            self.reset()
+
+    def rollback(self):
+        try:
+            if self.conn is not None:
+                self.conn.rollback()
+        except Error:
+            pass
+        self.reset()
+
+    def reset(self):
+        # drop cursors + connection; the next call checks out a fresh one
+        for cur in self.cursors.values():
+            try:
+                cur.close()
+            except Error:
+                pass
+        self.cursors = {}
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Error:
+                pass
+        self.conn = None
+        self.dirty = False
+
+    close = reset
+
+def session():
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = Session()
+    return s
+
+# --- SQLite stand-in ---
+# Same tables, same DML: %s -> ?, <=> -> IS, FOR UPDATE dropped, INSERT IGNORE
+# -> INSERT OR IGNORE. MySQL DDL is skipped (SQLITE_SCHEMA owns the tables) and
+# information_schema checks report "already there". sqlite3 errors surface as
+# the matching mysql.connector errors so callers' except clauses still work.
+SQLITE_BUSY_TIMEOUT = 30.0
+_sqlite_ready = set()
+_sqlite_lock = threading.Lock()
+
+def sqlite_schema():
+    import readings
+    sensors = ", ".join(f"{c} REAL" for c in readings.COLUMNS)
+    return f"""
+    CREATE TABLE IF NOT EXISTS event_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, event_timestamp TEXT, event_source TEXT,
+        event_status TEXT, details TEXT, device_id TEXT);
+    CREATE TABLE IF NOT EXISTS command_queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, command TEXT, is_sent INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP, device_id TEXT);
+    CREATE INDEX IF NOT EXISTS idx_sent ON command_queue (is_sent, id);
+    CREATE TABLE IF NOT EXISTS sensor_readings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, log_id INTEGER UNIQUE, device_id TEXT,
+        ts TEXT NOT NULL, {sensors});
+    CREATE INDEX IF NOT EXISTS idx_device_ts ON sensor_readings (device_id, ts);
+    CREATE INDEX IF NOT EXISTS idx_ts ON sensor_readings (ts);
+    CREATE TABLE IF NOT EXISTS spool_checkpoint (name TEXT PRIMARY KEY, last_seq INTEGER NOT NULL);
+    """
+
+@lru_cache(maxsize=256)
+def _sqlite_sql(sql):
+    head = sql.lstrip()[:32].upper()
+    if head.startswith(("CREATE TABLE", "ALTER TABLE")):
+        return None, "skip"
+    if "information_schema" in sql:
+        return None, "exists"
+    sql = sql.replace("%s", "?").replace("<=>", "IS")
+    sql = re.sub(r"\bFOR UPDATE\b", "", sql)
+    sql = re.sub(r"\bINSERT IGNORE\b", "INSERT OR IGNORE", sql)
+    return sql, "run"
+
+@contextmanager
+def _sqlite_errors():
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        raise errors.OperationalError(msg=str(e))
+    except sqlite3.IntegrityError as e:
+        raise errors.IntegrityError(msg=str(e))
+    except sqlite3.Error as e:
+        raise errors.DatabaseError(msg=str(e))
+
+class SQLiteCursor:
+    def __init__(self, conn):
+        self._cur = conn.cursor()
+        self._rows = None
+        self.with_rows = False
+        self.rowcount = -1
+
+    def execute(self, sql, params=()):
+        sql, kind = _sqlite_sql(sql)
+        self._rows = None
+        if kind == "skip":
+            self.with_rows, self.rowcount = False, 0
+        elif kind == "exists":
+            self._rows, self.with_rows, self.rowcount = [(1,)], True, 1
+        else:
+            with _sqlite_errors():
+                self._cur.execute(sql, tuple(params))
+            self.with_rows = self._cur.description is not None
+            self.rowcount = self._cur.rowcount
+
+    def executemany(self, sql, rows):
+        sql, kind = _sqlite_sql(sql)
+        self._rows = None
+        with _sqlite_errors():
+            self._cur.executemany(sql, [tuple(r) for r in rows])
+        self.with_rows = False
+        self.rowcount = self._cur.rowcount
+
+    def fetchall(self):
+        if self._rows is not None:
+            rows, self._rows = self._rows, []
+            return rows
+        with _sqlite_errors():
+            return self._cur.fetchall()
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        if self._rows is not None:
+            rows, self._rows = self._rows[:size], self._rows[size:]
+            return rows
+        with _sqlite_errors():
+            return self._cur.fetchmany(size)
+
+    def close(self):
+        self._cur.close()
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self.path = path
+        with _sqlite_errors():
+            self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+
+    def cursor(self, **kwargs):
+        # prepared= / buffered= have no SQLite meaning
+        return SQLiteCursor(self._conn)
+
+    def commit(self):
+        with _sqlite_errors():
+            self._conn.commit()
+
+    def rollback(self):
+        with _sqlite_errors():
+            self._conn.rollback()
+
+    def ping(self, **kwargs):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self._conn.close()
+
+def sqlite_connect(path):
+    conn = SQLiteConnection(path)
+    with _sqlite_lock:
+        if path not in _sqlite_ready:
+            with _sqlite_errors():
+                conn._conn.executescript(sqlite_schema())
+            _sqlite_ready.add(path)
+    return conn
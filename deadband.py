@@ -0,0 +1,296 @@
+import argparse
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+import metrics
+import readings
+from readings import GAS_CRIT, FLAME_CRIT, WATER_CRIT, DISTANCE_MOTION, LDR_DARK
+
+# Deadband compression of SENSORS/ALL readings at ingest (loggerDaV2 --deadband).
+# A board's reading is stored (event_logs + sensor_readings) only when
+#   - some value moved past its deadband since that board's last stored reading,
+#   - HEARTBEAT_SECONDS passed since then (a quiet board still shows it is alive),
+#   - it or the last stored one is in an alarm range (train_modelv3 label rules),
+#     so every held second carries a non-alarm value and labels never change.
+# The model (--stream), the hot window and the dashboard's live feed from it
+# still see every reading; only the stored rows thin out. A DB-polling
+# predictor should run with --hot-window when the bridge compresses.
+# expand() rebuilds the regular 1 Hz series from the stored rows (each second
+# holds the last stored reading) for train_modelv3.py / backtest.py --expand.
+# SMART_HOME_DEADBAND (on | gas=15,ldr=25,...) turns it on for the bridge and
+# tells readers the stored rows are compressed (retention.load_buckets fills
+# the buckets held readings left empty only then). SMART_HOME_DEADBAND_HEARTBEAT
+# is the bridge's --heartbeat default and what expand() / hold_buckets() hold
+# for, so a longer heartbeat's quiet stretches are not taken for outages.
+#   python loggerDaV2.py --ports COM4 COM5 --deadband gas=15,ldr=25
+#   python deadband.py --synthetic 86400          -> compression / reconstruction report
+#   python deadband.py --source readings          -> same, replayed over stored 1 Hz rows
+
+# column -> largest change that is not stored; 0 = any change is stored
+DEADBANDS = {
+    "gas": 10,
+    "flame": 10,
+    "ldr": 15,
+    "water": 5,
+    "vibration": 0,
+    "distance": 2.0,
+    "temp": 0.3,
+    "hum": 1.0,
+}
+HEARTBEAT_SECONDS = 60
+HEARTBEAT_SLACK = 5     # a longer gap between stored rows = the board / bridge was down
+DEADBAND_ENV = "SMART_HOME_DEADBAND"
+HEARTBEAT_ENV = "SMART_HOME_DEADBAND_HEARTBEAT"
+
+READINGS = metrics.Counter("bridge_deadband_readings_total", "SENSORS/ALL readings by deadband outcome", ["result"])
+
+def parse_deadbands(spec):
+    # "gas=15,ldr=25" -> DEADBANDS with those columns replaced
+    bands = dict(DEADBANDS)
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        name = name.strip().lower()
+        if not sep or name not in bands:
+            raise ValueError(f"geçersiz ölü bant: {part!r} (sütunlar: {', '.join(bands)})")
+        bands[name] = float(value)
+    return bands
+
+def configured():
+    # deadbands from SMART_HOME_DEADBAND, None when compression is off
+    spec = os.environ.get(DEADBAND_ENV, "").strip()
+    if spec.lower() in ("", "0", "off"):
+        return None
+    return parse_deadbands("" if spec.lower() in ("1", "on") else spec)
+
+def configured_heartbeat():
+    # heartbeat the bridge stores with, HEARTBEAT_SECONDS unless the env sets it
+    value = os.environ.get(HEARTBEAT_ENV, "").strip()
+    return float(value) if value else HEARTBEAT_SECONDS
+
+def alarming(values):
+    # anything label_frame() would not call normal (vibration without its
+    # flame / gas condition); NULL counts as 0, like there
+    gas, flame, ldr, water, vib, dist = (0.0 if v is None else v for v in values[:6])
+    return (flame <= FLAME_CRIT or gas >= GAS_CRIT or water >= WATER_CRIT or vib == 1
+            or (ldr > LDR_DARK and dist != 0 and abs(dist) < DISTANCE_MOTION))
+
+class Deadband:
+    # One per bridge, called from the thread that logs (event loop / serial
+    # thread); keeps the last stored reading of every board.
+    def __init__(self, bands=None, heartbeat=HEARTBEAT_SECONDS):
+        bands = DEADBANDS if bands is None else bands
+        self.bands = [bands[c] for c in readings.COLUMNS]
+        self.heartbeat = heartbeat
+        self.last = {}          # device id -> (time stored, values)
+        self.stats = {"seen": 0, "kept": 0}
+        self._kept = READINGS.labels("kept")
+        self._held = READINGS.labels("held")
+
+    def moved(self, old, new):
+        for band, a, b in zip(self.bands, old, new):
+            if (a is None) != (b is None):
+                return True
+            if a is not None and abs(b - a) > band:
+                return True
+        return False
+
+    def keep(self, device_id, values, now=None):
+        now = time.monotonic() if now is None else now
+        self.stats["seen"] += 1
+        last = self.last.get(device_id)
+        if (last is not None and now - last[0] < self.heartbeat and not alarming(values)
+                and not alarming(last[1]) and not self.moved(last[1], values)):
+            self._held.inc()
+            return False
+        self.last[device_id] = (now, values)
+        self.stats["kept"] += 1
+        self._kept.inc()
+        return True
+
+    def ratio(self):
+        return self.stats["seen"] / max(self.stats["kept"], 1)
+
+    def stats_line(self):
+        return f"okunan={self.stats['seen']}, saklanan={self.stats['kept']}, oran={self.ratio():.1f}x"
+
+# --- READ SIDE ---
+def expand(df, heartbeat=None, slack=HEARTBEAT_SLACK):
+    # stored rows (any loader's frame: ts, optional device_id, value columns)
+    # -> one row per second per board, each second a copy of the last stored
+    # row. A row covers the seconds up to the next one when that is at most
+    # heartbeat (default: configured_heartbeat()) + slack away; past that the
+    # board was down and nothing is made up.
+    import pandas as pd
+    heartbeat = configured_heartbeat() if heartbeat is None else heartbeat
+    if df.empty:
+        return df
+    df = df.reset_index(drop=True)
+    sec = pd.to_datetime(df["ts"]).to_numpy("datetime64[s]").astype(np.int64)
+    if "device_id" in df.columns:
+        groups = df.groupby("device_id", sort=False, dropna=False).indices.values()
+    else:
+        groups = [np.arange(len(df))]
+
+    take, out_sec = [], []
+    for idx in groups:
+        idx = idx[np.argsort(sec[idx], kind="stable")]
+        s = sec[idx]
+        last = np.r_[s[1:] != s[:-1], True]     # two rows in one second: the later one
+        idx, s = idx[last], s[last]
+        gap = np.diff(s, append=s[-1] + 1)
+        cover = np.where(gap <= heartbeat + slack, gap, 1)
+        take.append(np.repeat(idx, cover))
+        starts = np.repeat(s - np.cumsum(cover) + cover, cover)
+        out_sec.append(starts + np.arange(cover.sum()))
+
+    out = df.iloc[np.concatenate(take)].reset_index(drop=True)
+    out["ts"] = pd.to_datetime(np.concatenate(out_sec).astype("datetime64[s]"))
+    return out.sort_values("ts", kind="stable").reset_index(drop=True)
+
+# --- REPORT ---
+def compress_frame(df, bands=None, heartbeat=HEARTBEAT_SECONDS):
+    # replay a stored 1 Hz frame through Deadband -> boolean keep mask
+    import pandas as pd
+    band = Deadband(bands, heartbeat)
+    now = pd.to_datetime(df["ts"]).to_numpy("datetime64[s]").astype(np.int64).tolist()
+    devices = df["device_id"].tolist() if "device_id" in df.columns else [None] * len(df)
+    values = df[readings.KEYS].to_numpy(float)
+    rows = [tuple(None if v != v else v for v in row) for row in values.tolist()]
+    return np.array([band.keep(d, v, t) for d, v, t in zip(devices, rows, now)], dtype=bool)
+
+def drift_readings(n, devices=1, seed=7, t0=datetime(2025, 1, 1)):
+    # quiet-house signals like the real boards give: slow drift + small ADC
+    # noise, water / vibration flat, a few alarm episodes (sim_arduino draws
+    # every value at random, nothing to compress there)
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    frames = []
+    per = n // devices
+    for d in range(devices):
+        t = np.arange(per)
+        day = np.sin(2 * np.pi * (t / 86400.0 - 0.25))
+        cols = {
+            "GAS": 300 + np.cumsum(rng.normal(0, 0.05, per)) + rng.normal(0, 2, per),
+            "FLAME": 1000 + rng.normal(0, 3, per),
+            "LDR": 420 - 200 * day + rng.normal(0, 4, per),
+            "WATER": np.zeros(per),
+            "VIBRATION": np.zeros(per),
+            "DISTANCE": 180 + rng.normal(0, 0.4, per),
+            "TEMP": 22 + 2 * day + rng.normal(0, 0.05, per),
+            "HUM": 45 - 5 * day + rng.normal(0, 0.2, per),
+        }
+        for start in rng.integers(0, max(per - 60, 1), max(per // 20000, 1)):
+            key, value = [("FLAME", 300), ("GAS", 850), ("WATER", 300), ("VIBRATION", 1)][rng.integers(4)]
+            cols[key][start:start + rng.integers(5, 30)] = value
+        df = pd.DataFrame({k: np.round(v, 2) for k, v in cols.items()})
+        df.insert(0, "ts", t0 + pd.to_timedelta(t, unit="s"))
+        df.insert(0, "device_id", f"sim{d}")
+        frames.append(df)
+    df = pd.concat(frames, ignore_index=True)
+    df.insert(0, "id", np.arange(1, len(df) + 1))
+    return df
+
+def report(df, bands=None, heartbeat=HEARTBEAT_SECONDS):
+    # compress a 1 Hz frame, expand it back and compare values, model features
+    # and labels second by second
+    import pandas as pd
+    from train_modelv3 import label_frame, make_features
+
+    t = time.perf_counter()
+    keep = compress_frame(df, bands, heartbeat)
+    t_compress = time.perf_counter() - t
+    t = time.perf_counter()
+    rebuilt = expand(df[keep], heartbeat)
+    t_expand = time.perf_counter() - t
+
+    on = ["device_id", "ts"] if "device_id" in df.columns else ["ts"]
+    orig = df.assign(ts=pd.to_datetime(df["ts"]).dt.floor("s")).drop_duplicates(on, keep="last")
+    both = orig.merge(rebuilt, on=on, how="left", suffixes=("", "_r"), indicator=True)
+    covered = (both["_merge"] == "both").to_numpy()
+    columns = {}
+    for key in readings.KEYS:
+        a, b = both[key].to_numpy(float)[covered], both[f"{key}_r"].to_numpy(float)[covered]
+        err = np.abs(np.nan_to_num(a) - np.nan_to_num(b))
+        columns[key] = {"max": float(err.max(initial=0)), "rmse": float(np.sqrt(np.mean(err ** 2))) if len(err) else 0.0}
+
+    # make_features() per board, as training does, then matched by second
+    def features(frame):
+        if len(on) == 1:
+            return make_features(frame)
+        parts = [make_features(g) for _, g in frame.groupby("device_id", sort=False)]
+        return pd.concat([f for f, _ in parts], ignore_index=True), parts[0][1]
+
+    f_orig, feature_cols = features(orig)
+    f_reb, _ = features(rebuilt)
+    feats = f_orig.merge(f_reb, on=on, suffixes=("", "_r"))
+    feature_err = {c: float(np.abs(feats[c] - feats[f"{c}_r"]).max()) for c in feature_cols}
+    base = ["GAS", "FLAME", "LDR", "WATER", "VIBRATION", "DISTANCE"]
+    labels = np.asarray(label_frame(feats[base]))
+    labels_r = np.asarray(label_frame(feats[[f"{c}_r" for c in base]].set_axis(base, axis=1)))
+
+    return {
+        "rows": len(orig),
+        "stored": int(keep.sum()),
+        "ratio": len(orig) / max(int(keep.sum()), 1),
+        "covered": float(covered.mean()),
+        "columns": columns,
+        "feature_max_error": feature_err,
+        "label_agreement": float(np.mean(labels == labels_r)),
+        "compress_seconds": t_compress,
+        "expand_seconds": t_expand,
+    }
+
+def print_report(r, bands, heartbeat):
+    print(f"\nDeadbands: {', '.join(f'{k}={v:g}' for k, v in bands.items())}, heartbeat {heartbeat:g} s")
+    print(f"Readings {r['rows']:,} -> stored {r['stored']:,}  ({r['ratio']:.1f}x fewer rows)")
+    print(f"Seconds rebuilt by expand(): {r['covered']:.2%}  "
+          f"(compress {r['compress_seconds']:.2f} s, expand {r['expand_seconds']:.2f} s)")
+    print(f"\n{'column':<10} {'max err':>9} {'rmse':>9}")
+    for key, e in r["columns"].items():
+        print(f"{key:<10} {e['max']:>9.3f} {e['rmse']:>9.3f}")
+    print(f"\n{'feature':<12} {'max err':>9}")
+    for name, e in r["feature_max_error"].items():
+        print(f"{name:<12} {e:>9.3f}")
+    print(f"\nLabels equal on {r['label_agreement']:.4%} of seconds")
+
+def main():
+    p = argparse.ArgumentParser(description="Deadband compression ratio and 1 Hz reconstruction error")
+    p.add_argument("--source", choices=["readings", "parquet"], default="readings",
+                   help="stored uncompressed 1 Hz rows: sensor_readings or export_dataset.py Parquet")
+    p.add_argument("--dataset", help="--source parquet: dataset directory")
+    p.add_argument("--since", help="first day/time to load (YYYY-MM-DD[THH:MM])")
+    p.add_argument("--until", help="load rows before this day/time")
+    p.add_argument("--synthetic", type=int, metavar="N", help="N drifting readings instead of stored rows")
+    p.add_argument("--devices", type=int, default=1, help="--synthetic: boards")
+    p.add_argument("--deadband", metavar="COL=X,...", help="override deadbands, e.g. gas=15,ldr=25")
+    p.add_argument("--heartbeat", type=float, default=configured_heartbeat(),
+                   help="seconds after which a quiet board's reading is stored anyway "
+                        "(default: SMART_HOME_DEADBAND_HEARTBEAT or 60)")
+    args = p.parse_args()
+
+    bands = parse_deadbands(args.deadband)
+    if args.synthetic:
+        df = drift_readings(args.synthetic, args.devices)
+    elif args.source == "parquet":
+        import train_modelv3 as tm
+        df = tm.load_sensor_parquet(args.dataset, args.since, args.until)
+    else:
+        import train_modelv3 as tm
+        df = tm.load_sensor_readings()
+        if args.since:
+            df = df[df["ts"] >= datetime.fromisoformat(args.since)]
+        if args.until:
+            df = df[df["ts"] < datetime.fromisoformat(args.until)]
+    if df.empty:
+        print("No readings found.")
+        return
+    print(f"{len(df):,} readings loaded")
+    print_report(report(df, bands, args.heartbeat), bands, args.heartbeat)
+
+if __name__ == "__main__":
+    main()
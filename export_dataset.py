@@ -0,0 +1,159 @@
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import db
+import readings
+
+# Offline training dataset: sensor_readings exported to hive-partitioned
+# Parquet (dataset/sensor_readings/day=YYYY-MM-DD/...), appended incrementally
+# from an id watermark. train_modelv3.py --source parquet reads it back with
+# memory mapping, column pruning and partition/row-group filters.
+#   python export_dataset.py                      -> new rows since the last export
+#   python export_dataset.py --partition day device
+
+DATASET_DIR = os.path.join("dataset", "sensor_readings")
+WATERMARK_FILE = "_watermark.json"
+EXPORT_CHUNK = 200000       # rows per fetch / per written file
+ROW_GROUP_SIZE = 50000
+
+SCHEMA = pa.schema(
+    [("id", pa.int64()), ("device_id", pa.string()), ("ts", pa.timestamp("s"))]
+    + [(key, pa.float64()) for key in readings.KEYS]
+)
+
+# supported hive partition columns (device: device_id, NULL -> "none")
+PARTITIONS = ("day", "device")
+
+def read_watermark(root):
+    path = os.path.join(root, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {"last_id": 0, "rows": 0}
+    with open(path) as f:
+        return json.load(f)
+
+def write_watermark(root, state):
+    path = os.path.join(root, WATERMARK_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(tmp, path)
+
+def partition_schema(partition_cols):
+    # explicit string partitions so "2025-01-15" is not re-typed on read
+    return pa.schema([(c, pa.string()) for c in partition_cols])
+
+def to_table(rows, partition_cols):
+    columns = list(zip(*rows))
+    arrays = [
+        pa.array(columns[0], pa.int64()),
+        pa.array(columns[1], pa.string()),
+        pa.array(columns[2], pa.timestamp("s")),
+    ]
+    # NULL readings -> NaN, same as the float64 frames load_sensor_readings builds
+    arrays += [pa.array([float("nan") if v is None else float(v) for v in col], pa.float64())
+               for col in columns[3:]]
+    table = pa.Table.from_arrays(arrays, schema=SCHEMA)
+    if "day" in partition_cols:
+        table = table.append_column("day", pa.array([ts.strftime("%Y-%m-%d") for ts in columns[2]], pa.string()))
+    if "device" in partition_cols:
+        table = table.append_column("device", pa.array([d or "none" for d in columns[1]], pa.string()))
+    return table
+
+def export(root=DATASET_DIR, partition_cols=("day",), chunksize=EXPORT_CHUNK):
+    os.makedirs(root, exist_ok=True)
+    state = read_watermark(root)
+    if state.get("partition_cols", list(partition_cols)) != list(partition_cols):
+        raise SystemExit(f"{root} is partitioned by {state['partition_cols']}, "
+                         f"not {list(partition_cols)}; export to a new directory")
+
+    conn = db.connect()
+    cursor = conn.cursor(buffered=False)
+    cursor.execute(
+        f"SELECT {readings.SELECT_COLUMNS} FROM sensor_readings WHERE id > %s ORDER BY id ASC",
+        (state["last_id"],)
+    )
+
+    t0 = time.perf_counter()
+    exported = 0
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        table = to_table(rows, partition_cols)
+        # file names carry the first id of the chunk, so re-running after a
+        # crash overwrites the same files instead of duplicating rows
+        pq.write_to_dataset(
+            table, root,
+            partitioning=ds.partitioning(partition_schema(partition_cols), flavor="hive"),
+            basename_template=f"part-{rows[0][0]:012d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            row_group_size=ROW_GROUP_SIZE,
+        )
+        exported += len(rows)
+        state.update(last_id=rows[-1][0], rows=state["rows"] + len(rows),
+                     partition_cols=list(partition_cols))
+        write_watermark(root, state)
+        print(f"  ... {exported} rows (last id {rows[-1][0]}, "
+              f"{exported / (time.perf_counter() - t0):,.0f} rows/s)")
+    cursor.close()
+    conn.close()
+
+    print(f"Exported {exported} new rows to {root} (total {state['rows']}, last id {state['last_id']})")
+    return exported
+
+def _to_datetime(value):
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+def load_dataset(root=DATASET_DIR, since=None, until=None, device_id=None, columns=None):
+    # since/until: "YYYY-MM-DD" (until exclusive); day filters prune whole
+    # directories, the ts filter skips row groups by their statistics
+    state = read_watermark(root)
+    partition_cols = state.get("partition_cols", ["day"])
+    filters = []
+    if since:
+        if "day" in partition_cols:
+            filters.append(("day", ">=", str(since)[:10]))
+        filters.append(("ts", ">=", _to_datetime(since)))
+    if until:
+        if "day" in partition_cols:
+            filters.append(("day", "<=", str(until)[:10]))
+        filters.append(("ts", "<", _to_datetime(until)))
+    if device_id is not None:
+        if "device" in partition_cols:
+            filters.append(("device", "=", device_id))
+        filters.append(("device_id", "=", device_id))
+
+    table = pq.read_table(
+        root,
+        columns=columns or SCHEMA.names,
+        filters=filters or None,
+        partitioning=ds.partitioning(partition_schema(partition_cols), flavor="hive"),
+        memory_map=True,
+    )
+    df = table.to_pandas()
+    # files are read in directory order; training needs time order
+    return df.sort_values(["ts", "id"], kind="stable", ignore_index=True)
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Export sensor_readings to partitioned Parquet")
+    p.add_argument("--out", default=DATASET_DIR)
+    p.add_argument("--partition", nargs="+", choices=PARTITIONS, default=["day"],
+                   help="hive partition columns, e.g. --partition day device")
+    p.add_argument("--chunksize", type=int, default=EXPORT_CHUNK)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    export(args.out, args.partition, args.chunksize)
+
+if __name__ == "__main__":
+    main()
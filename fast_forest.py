@@ -0,0 +1,134 @@
+import numpy as np
+
+# Flattened RandomForestClassifier for the live loop: all trees live in a few
+# contiguous arrays and are walked together with NumPy, no sklearn/pandas
+# overhead per call. Predictions are bit-for-bit the same as clf.predict().
+
+TOGETHER_CELLS = 1 << 17    # rows x trees up to which all trees are walked at once
+
+def compile_forest(clf):
+    if getattr(clf, "n_outputs_", 1) != 1:
+        raise ValueError("sadece tek çıkışlı sınıflandırıcı destekleniyor")
+
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    depth = 0
+    for est in clf.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        left = tree.children_left.astype(np.int32)
+        right = tree.children_right.astype(np.int32)
+        leaf = left == -1
+        idx = np.arange(n, dtype=np.int32)
+
+        # leaves point to themselves
+        left = np.where(leaf, idx, left) + offset
+        right = np.where(leaf, idx, right) + offset
+        feature = np.where(leaf, 0, tree.feature).astype(np.int32)
+
+        # per-node class probabilities, normalised like DecisionTreeClassifier.predict_proba
+        proba = tree.value[:, 0, :].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+
+        features.append(feature)
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(left)
+        rights.append(right)
+        values.append(proba)
+        roots.append(offset)
+        offset += n
+        depth = max(depth, tree.max_depth)
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.array(roots, dtype=np.int32),
+        "depth": int(depth),
+        "classes": np.asarray(clf.classes_),
+        "n_features": int(clf.n_features_in_),
+    }
+
+class CompiledForest:
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.roots = arrays["roots"]
+        self.depth = arrays["depth"]
+        self.classes = arrays["classes"]
+        self.n_features = arrays["n_features"]
+        self.is_leaf = self.left == np.arange(len(self.left), dtype=self.left.dtype)
+        # sklearn model of the same version, if loaded: its Cython walk wins on
+        # big batches (predict_realtimev3.predict_batch picks it)
+        self.estimator = None
+
+    def _leaves(self, X):
+        # sklearn casts inputs to float32 before walking the trees
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            # one reading: step all trees together, leaves just stay put
+            nodes = self.roots
+            for _ in range(self.depth):
+                go_left = X[self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            return nodes
+
+        n = X.shape[0]
+        if n * len(self.roots) <= TOGETHER_CELLS:
+            # a few rows: every (row, tree) pair steps together, depth levels
+            nodes = np.broadcast_to(self.roots, (n, len(self.roots))).copy()
+            rows = np.arange(n)[:, np.newaxis]
+            for _ in range(self.depth):
+                go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+                nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            return nodes
+
+        # batch: one tree at a time over all rows, level by level; rows that
+        # reached a leaf drop out. X is read column-major so a level's lookups
+        # for one feature stay close together (flat index in intp: feature * n
+        # overflows int32 on big batches).
+        Xt = np.ascontiguousarray(X.T).ravel()
+        out = np.empty((n, len(self.roots)), dtype=np.int32)
+        rows = np.arange(n, dtype=np.int64)
+        for t, root in enumerate(self.roots):
+            leaves = out[:, t]
+            leaves[:] = root
+            if self.is_leaf[root]:
+                continue
+            idx, cur = rows, leaves.copy()
+            while idx.size:
+                go_left = Xt[self.feature[cur].astype(np.intp) * n + idx] <= self.threshold[cur]
+                cur = np.where(go_left, self.left[cur], self.right[cur])
+                done = self.is_leaf[cur]
+                if done.any():
+                    leaves[idx[done]] = cur[done]
+                    keep = ~done
+                    idx, cur = idx[keep], cur[keep]
+        return out
+
+    def predict_proba(self, X):
+        nodes = self._leaves(X)
+        # RandomForestClassifier adds tree probabilities one tree at a time;
+        # same summation order here so argmax ties break the same way
+        if nodes.ndim == 1:
+            return np.cumsum(self.value[nodes], axis=0)[-1] / len(self.roots)
+        proba = np.zeros((nodes.shape[0], self.value.shape[1]))
+        for t in range(nodes.shape[1]):
+            proba += self.value[nodes[:, t]]
+        return proba / len(self.roots)
+
+    def predict(self, X):
+        X = np.asarray(X)
+        if X.ndim == 1:
+            return self.classes[np.argmax(self.predict_proba(X))]
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
+
+    def predict_one(self, x):
+        return self.predict(np.asarray(x).ravel())
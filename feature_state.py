@@ -0,0 +1,137 @@
+import math
+from datetime import datetime, timedelta
+
+# Incremental version of make_features() in train_modelv3.py: one small ring
+# buffer per sensor, updated in O(1) per reading, no pandas on the hot path.
+
+BASE_COLS = ["GAS", "FLAME", "LDR", "WATER", "VIBRATION", "DISTANCE"]
+
+ROLL_COLS = {
+    "gas_roll3": "GAS",
+    "flame_roll3": "FLAME",
+    "ldr_roll3": "LDR",
+    "water_roll3": "WATER",
+    "dist_roll3": "DISTANCE",
+    "vib_roll3": "VIBRATION",
+}
+
+DIFF_COLS = {
+    "gas_diff1": "GAS",
+    "flame_diff1": "FLAME",
+    "dist_diff1": "DISTANCE",
+}
+
+def to_number(v):
+    # same result as pd.to_numeric(errors='coerce').fillna(0)
+    if v is None or isinstance(v, str) and not v.strip():
+        return 0.0
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if math.isnan(x) else x
+
+def to_datetime(ts):
+    if isinstance(ts, str):
+        return datetime.fromisoformat(ts.strip())
+    return ts
+
+def base_values(reading):
+    # DISTANCE falls back to the sketch's DIST key, like make_features()
+    dist = reading.get("DISTANCE")
+    if dist is None or isinstance(dist, float) and math.isnan(dist):
+        dist = reading.get("DIST")
+    return [
+        to_number(reading.get("GAS")),
+        to_number(reading.get("FLAME")),
+        to_number(reading.get("LDR")),
+        to_number(reading.get("WATER")),
+        to_number(reading.get("VIBRATION")),
+        to_number(dist),
+    ]
+
+class FeatureState:
+    def __init__(self, feature_cols, window=3):
+        self.feature_cols = list(feature_cols)
+        self.window = window
+        self.buf = [[0.0] * window for _ in BASE_COLS]
+        self.pos = 0
+        self.count = 0
+        self.prev = None
+
+        index = {c: i for i, c in enumerate(BASE_COLS)}
+        # (kind, sensor index) per output column, resolved once
+        self.plan = []
+        for col in self.feature_cols:
+            if col in index:
+                self.plan.append(("raw", index[col]))
+            elif col in ROLL_COLS:
+                self.plan.append(("roll", index[ROLL_COLS[col]]))
+            elif col in DIFF_COLS:
+                self.plan.append(("diff", index[DIFF_COLS[col]]))
+            elif col in ("hour", "minute", "second"):
+                self.plan.append((col, None))
+            else:
+                self.plan.append(("zero", None))
+
+    def update(self, reading, ts):
+        values = base_values(reading)
+        for i, v in enumerate(values):
+            self.buf[i][self.pos] = v
+        self.pos = (self.pos + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        prev = self.prev if self.prev is not None else values
+        self.prev = values
+
+        ts = to_datetime(ts)
+        out = []
+        for kind, i in self.plan:
+            if kind == "raw":
+                out.append(values[i])
+            elif kind == "roll":
+                out.append(self._mean(i))
+            elif kind == "diff":
+                out.append(values[i] - prev[i])
+            elif kind == "zero":
+                out.append(0)
+            else:
+                out.append(getattr(ts, kind))
+        return out
+
+    def _mean(self, i):
+        # oldest -> newest, same summation order as a 3-row rolling window
+        buf = self.buf[i]
+        total = 0.0
+        for k in range(self.window - self.count, self.window):
+            total += buf[(self.pos + k) % self.window]
+        return total / self.count
+
+# --- SYNTHETIC READINGS ---
+# missing keys, DIST/DISTANCE mix, non-numeric values; used by the benches and
+# tests/test_feature_state.py (parity with train_modelv3.make_features)
+def _synthetic_rows(n, seed=42):
+    import random
+    rnd = random.Random(seed)
+    t0 = datetime(2025, 1, 15, 23, 58, 30)
+    rows = []
+    for i in range(n):
+        parts = [
+            f"GAS={rnd.randint(100, 900)}",
+            f"FLAME={rnd.randint(0, 1023)}",
+            f"LDR={rnd.randint(0, 1023)}",
+            f"VIBRATION={rnd.randint(0, 1)}",
+        ]
+        if rnd.random() > 0.05:
+            parts.append(f"WATER={rnd.randint(0, 300)}")
+        r = rnd.random()
+        if r < 0.7:
+            parts.append(f"DIST={rnd.uniform(0, 400):.2f}")
+        elif r < 0.9:
+            parts.append(f"DISTANCE={rnd.uniform(0, 400):.2f}")
+        elif r < 0.95:
+            parts.append("DIST=nan")
+        parts.append(f"TEMP={rnd.uniform(15, 30):.2f},HUM={rnd.uniform(20, 80):.2f}")
+        if rnd.random() < 0.02:
+            parts[0] = "GAS=ERR"
+        rows.append((i + 1, t0 + timedelta(seconds=i), ",".join(parts)))
+    return rows
@@ -0,0 +1,253 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import readings
+
+# Newest readings of every board in a fixed-layout memory-mapped file, written
+# by loggerDaV2 (--hot-window) as lines arrive and read by the predictor and
+# the dashboard without a MySQL round trip for the readings:
+#   header | slot 0 | slot 1 | ...      one slot per board, SLOT_ROWS rows each
+#   slot:  device id, seq, rows written | ts float64[rows] | values float64[rows, columns]
+# Values are in readings.COLUMNS order, NaN = NULL. Rows go round the ring at
+# (rows written % SLOT_ROWS). One writer; readers never lock: seq is odd while
+# a row is being written, and a read that saw seq change is simply retried.
+# Readers gather just the rows they ask for out of NumPy views over the
+# mapping (one small copy, no query, no parse). Only readings live here: the
+# dashboard still reads the latest command from command_queue.
+# A restarted bridge swaps in a new file (readers see the inode change); where
+# a mapped file can't be replaced (Windows) it re-initialises the old one in
+# place and bumps the generation in the header instead.
+#   python loggerDaV2.py --ports COM4 COM5 --stream --hot-window
+#   python predict_realtimev3.py --multi-device --hot-window
+
+HOT_WINDOW_PATH = os.environ.get("SMART_HOME_HOT_WINDOW") or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "smart_home_hot_window.bin")
+MAX_DEVICES = 16
+SLOT_ROWS = 1024        # ~17 minutes per board at one reading a second
+STALE_SECONDS = 30.0    # no publish for this long: the bridge is not writing it
+READ_RETRIES = 100
+
+MAGIC = b"SHHW"
+VERSION = 1
+HEADER = struct.Struct("<4sIIII")   # magic, version, devices, rows per slot, columns
+HEADER_SIZE = 64                    # + float64 last publish time at offset 24,
+                                    #   uint64 generation at offset 32
+NAME_SIZE = 64
+SLOT_HEADER_SIZE = 128              # name, then uint64 seq, uint64 rows written
+
+def _slot_size(rows, columns):
+    return SLOT_HEADER_SIZE + rows * 8 * (1 + columns)
+
+class HotWindow:
+    def __init__(self, path, mm, writable):
+        self.path = path
+        self._mm = mm
+        magic, version, devices, rows, columns = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION or columns != len(readings.COLUMNS):
+            raise ValueError(f"{path}: tanınmayan sıcak pencere dosyası")
+        self.devices, self.rows, self.columns = devices, rows, columns
+        self._updated = np.ndarray((1,), np.float64, mm, 24)
+        self._generation = np.ndarray((1,), np.uint64, mm, 32)
+        size = _slot_size(rows, columns)
+        self.ctl, self.ts, self.values = [], [], []
+        for i in range(devices):
+            off = HEADER_SIZE + i * size
+            self.ctl.append(np.ndarray((2,), np.uint64, mm, off + NAME_SIZE))
+            self.ts.append(np.ndarray((rows,), np.float64, mm, off + SLOT_HEADER_SIZE))
+            self.values.append(np.ndarray((rows, columns), np.float64, mm, off + SLOT_HEADER_SIZE + rows * 8))
+        self._slot_offsets = [HEADER_SIZE + i * size for i in range(devices)]
+        self._slots = {}
+        self._lock = threading.Lock()
+        self.writable = writable
+
+    # --- writer (loggerDaV2) ---
+    @classmethod
+    def create(cls, path=HOT_WINDOW_PATH, devices=MAX_DEVICES, rows=SLOT_ROWS):
+        columns = len(readings.COLUMNS)
+        size = HEADER_SIZE + devices * _slot_size(rows, columns)
+        # a new file, swapped in: readers still on an old bridge's file notice the inode change
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, devices, rows, columns))
+            f.truncate(size)
+        try:
+            os.replace(tmp, path)
+        except PermissionError:
+            # Windows: a reader still maps the old file, it can't be replaced
+            os.remove(tmp)
+            return cls._reinit(path, size, devices, rows, columns)
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), size)
+        return cls(path, mm, True)
+
+    @classmethod
+    def _reinit(cls, path, size, devices, rows, columns):
+        # same file, emptied slots, next generation: attached readers start over
+        if os.path.getsize(path) != size:
+            raise OSError(f"{path}: başka bir düzende ve hâlâ kullanımda, silinemiyor")
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), size)
+        generation = struct.unpack_from("<Q", mm, 32)[0] if mm[:4] == MAGIC else 0
+        mm[HEADER_SIZE:size] = bytes(size - HEADER_SIZE)
+        mm[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        HEADER.pack_into(mm, 0, MAGIC, VERSION, devices, rows, columns)
+        struct.pack_into("<Q", mm, 32, generation + 1)
+        return cls(path, mm, True)
+
+    def _claim(self, device_id):
+        slot = len(self._slots)
+        if slot >= self.devices:
+            return None
+        name = (device_id or "").encode("utf-8")[:NAME_SIZE]
+        off = self._slot_offsets[slot]
+        self._mm[off:off + NAME_SIZE] = name.ljust(NAME_SIZE, b"\0")
+        self._slots[device_id] = slot
+        return slot
+
+    def publish(self, device_id, values, ts=None):
+        with self._lock:
+            slot = self._slots.get(device_id)
+            if slot is None:
+                slot = self._claim(device_id)
+                if slot is None:
+                    return False    # more boards than slots: that one stays DB-only
+            ctl = self.ctl[slot]
+            n = int(ctl[1])
+            pos = n % self.rows
+            ctl[0] += 1             # odd: row being written
+            self.ts[slot][pos] = time.time() if ts is None else ts
+            self.values[slot][pos] = [np.nan if v is None else v for v in values]
+            ctl[1] = n + 1
+            ctl[0] += 1
+            self._updated[0] = time.time()
+        return True
+
+    def close(self, remove=True):
+        self.ctl = self.ts = self.values = self._updated = self._generation = None   # views pin the mapping
+        try:
+            self._mm.close()
+        except BufferError:
+            pass    # a caller still holds a view; the mapping goes with it
+        if remove and self.writable:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    # --- readers ---
+    @classmethod
+    def attach(cls, path=HOT_WINDOW_PATH):
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(path, mm, False)
+
+    def generation(self):
+        return int(self._generation[0])
+
+    def alive(self, stale=STALE_SECONDS):
+        return time.time() - float(self._updated[0]) < stale
+
+    def slots(self):
+        # device id -> slot, for every board that has published
+        out = {}
+        for i, off in enumerate(self._slot_offsets):
+            if self.ctl[i][1] == 0:
+                continue
+            out[bytes(self._mm[off:off + NAME_SIZE]).rstrip(b"\0").decode("utf-8", "replace")] = i
+        return out
+
+    def read(self, slot, after=0, limit=None):
+        # rows written after `after` (a count from an earlier read), newest
+        # `limit` at most -> (rows written, ts, values); older rows the ring
+        # has overwritten are skipped
+        ctl = self.ctl[slot]
+        for _ in range(READ_RETRIES):
+            seq = int(ctl[0])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            n = int(ctl[1])
+            start = max(after, n - self.rows, 0 if limit is None else n - limit)
+            idx = np.arange(start, n) % self.rows
+            ts = self.ts[slot][idx]
+            values = self.values[slot][idx]
+            if int(ctl[0]) == seq:
+                return n, ts, values
+        raise RuntimeError(f"sıcak pencere okunamadı (slot {slot})")
+
+def to_reading(values):
+    # float64 row -> tuple in readings.COLUMNS order, NaN back to None
+    return tuple(None if v != v else float(v) for v in values.tolist())
+
+class HotReader:
+    # Per-process cursor over a HotWindow: poll() returns only rows not seen
+    # yet, for every board. Re-attaches when the bridge restarts (new file).
+    def __init__(self, path=HOT_WINDOW_PATH):
+        self.path = path
+        self.window = None
+        self._inode = None
+        self._generation = None
+        self.seen = {}          # device id -> rows written at the last poll
+        self.error = None
+
+    def _attach(self):
+        try:
+            inode = os.stat(self.path).st_ino
+            if inode != self._inode or self.window is None:
+                self.window = HotWindow.attach(self.path)
+                self._inode = inode
+                self._generation = self.window.generation()
+                self.seen = {}
+            elif self.window.generation() != self._generation:
+                # bridge restarted into the same file (see HotWindow._reinit)
+                self._generation = self.window.generation()
+                self.seen = {}
+            self.error = None
+            return True
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            return False
+
+    def live(self):
+        # a bridge is publishing here right now
+        return self._attach() and self.window.alive()
+
+    def rewind(self):
+        self.seen = {}
+
+    def poll(self, warmup=SLOT_ROWS):
+        # [(rows written, device id, values tuple, ts datetime)] in time order;
+        # a board seen for the first time gives its newest `warmup` rows
+        if not self._attach():
+            return []
+        out = []
+        for device_id, slot in self.window.slots().items():
+            after = self.seen.get(device_id)
+            n, ts, values = self.window.read(slot, after or 0, warmup if after is None else None)
+            self.seen[device_id] = n
+            first = n - len(ts)
+            out += [(first + i + 1, device_id, to_reading(v), datetime.fromtimestamp(t))
+                    for i, (t, v) in enumerate(zip(ts.tolist(), values))]
+        out.sort(key=lambda r: r[3])
+        return out
+
+    def latest(self, n):
+        # newest n rows of the board that published last -> [(values tuple, ts)]
+        if not self._attach():
+            return []
+        newest = None
+        for device_id, slot in self.window.slots().items():
+            _, ts, values = self.window.read(slot, limit=n)
+            if len(ts) and (newest is None or ts[-1] > newest[0][-1]):
+                newest = (ts, values)
+        if newest is None:
+            return []
+        ts, values = newest
+        return [(to_reading(v), datetime.fromtimestamp(t)) for t, v in zip(ts.tolist(), values)]
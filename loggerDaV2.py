@@ -1,24 +1,92 @@
 import serial
-import mysql.connector
 from mysql.connector import Error
 import time
+import logging
+import queue
+import threading
+import argparse
+import socket
+import asyncio
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-DB_HOST = 'localhost'
-DB_USER = 'root'
-DB_PASSWORD = ''
-DB_NAME = 'smart_home'
+import db
+import deadband
+import hot_window
+import metrics
+import readings
+import serial_frames
+import spool
 
 ARDUINO_PORT = 'COM4'
 BAUD_RATE = 9600
 
+# --- Multi-port (asyncio) ---
+# her port kendi bekleme süresiyle yeniden bağlanır: 1, 2, 4 ... 30 sn
+RECONNECT_MIN_DELAY = 1.0
+RECONNECT_MAX_DELAY = 30.0
+
+# --- Write-behind ---
+LOG_BATCH_SIZE = 200      # satır
+LOG_BATCH_MAX_AGE = 1.0   # saniye
+LOG_QUEUE_SIZE = 10000
+
+# --- Command dispatch ---
+COMMAND_POLL_INTERVAL = 1.0   # saniye
+COMMAND_WAKEUP_HOST = '127.0.0.1'
+COMMAND_WAKEUP_PORT = 50555   # predict_realtimev3 buraya UDP "uyandırma" yollar
+
+# --- Streaming inference ---
+STREAM_QUEUE_SIZE = 1000
+STREAM_REPORT_INTERVAL = 30.0  # saniye
+MODEL_CHECK_INTERVAL = 5.0     # saniye, models/CURRENT kontrolü
+
+# --- Metrics (no-op unless --metrics-port / --metrics-file) ---
+SERIAL_READ_SECONDS = metrics.Histogram(
+    "bridge_serial_read_seconds", "Time blocked in read() per chunk (about the line interval)", ["device"])
+SERIAL_LINES = metrics.Counter("bridge_serial_lines_total", "Text lines and binary frames read from the board", ["device"])
+SERIAL_BYTES = metrics.Counter("bridge_serial_bytes_total", "Bytes read from the board", ["device"])
+SERIAL_RECONNECTS = metrics.Counter("bridge_serial_reconnects_total", "Port open failures and disconnects", ["device"])
+PARSE_SECONDS = metrics.Histogram("bridge_parse_seconds", "LOG; line split and SENSORS/ALL value parse", ["device"])
+BAD_LINES = metrics.Counter("bridge_bad_lines_total", "Lines without the LOG;source;status;details shape", ["device"])
+DB_INSERT_SECONDS = metrics.Histogram("bridge_db_insert_seconds", "INSERT / executemany time per write")
+DB_COMMIT_SECONDS = metrics.Histogram("bridge_db_commit_seconds", "COMMIT time per write")
+DB_ROWS = metrics.Counter("bridge_db_rows_total", "Log rows by outcome", ["result"])
+WRITE_QUEUE_DEPTH = metrics.Gauge("bridge_write_queue_depth", "Rows waiting in the write-behind queue")
+DISPATCH_SECONDS = metrics.Histogram("bridge_command_dispatch_seconds", "command_queue claim, port writes and UPDATE")
+COMMAND_WRITE_SECONDS = metrics.Histogram("bridge_command_write_seconds", "Serial write of one command")
+COMMANDS_SENT = metrics.Counter("bridge_commands_sent_total", "Commands written to a board", ["device", "path"])
+COMMAND_ERRORS = metrics.Counter("bridge_command_errors_total", "Failed command polls / port writes")
+COMMANDS_COALESCED = metrics.Counter("bridge_commands_coalesced_total", "Pending commands dropped, a newer one for the same board replaced them")
+STREAM_DECISION_SECONDS = metrics.Histogram("bridge_stream_decision_seconds", "Serial line read -> model decision")
+STREAM_COMMAND_SECONDS = metrics.Histogram("bridge_stream_command_seconds", "Serial line read -> command on the port")
+STREAM_DROPPED = metrics.Counter("bridge_stream_dropped_total", "Readings dropped, inference queue full")
+
+logger = logging.getLogger("bridge")
+
+INSERT_LOG_SQL = """
+    INSERT INTO event_logs (event_timestamp, event_source, event_status, details, device_id)
+    VALUES (%s, %s, %s, %s, %s)
+"""
+
+SELECT_PENDING_COMMANDS_SQL = """
+    SELECT id, command, device_id FROM command_queue
+    WHERE is_sent=0 ORDER BY id ASC FOR UPDATE
+"""
+
+# is_sent=2: kuyrukta daha yenisi olduğu için hiç gönderilmedi
+COMMAND_SUPERSEDED = 2
+
+# komutlar seri porta doğrudan yazıldığında sadece kayıt için (is_sent=1)
+INSERT_COMMAND_AUDIT_SQL = """
+    INSERT INTO command_queue (command, is_sent, device_id)
+    VALUES (%s, 1, %s)
+"""
+
 def connect_database():
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = db.connect()
         cursor = conn.cursor()
         print("✔ MySQL bağlantısı başarılı.")
         return conn, cursor
@@ -26,82 +94,671 @@ def connect_database():
         print(f"✖ MySQL bağlantı hatası: {e}")
         return None, None
 
-def log_to_database(cursor, conn, source, status, details):
+def ensure_device_columns(cursor, conn):
+    # event_logs / command_queue get a nullable device_id; NULL command = all boards
+    for table in ("event_logs", "command_queue"):
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND COLUMN_NAME='device_id'",
+            (db.DB_NAME, table)
+        )
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN device_id VARCHAR(64) NULL")
+            print(f"✔ {table} tablosuna device_id kolonu eklendi.")
+    conn.commit()
+
+def prepare_database():
+    conn, cursor = connect_database()
+    if conn is None:
+        return False
+    try:
+        ensure_device_columns(cursor, conn)
+        readings.ensure_table(cursor, conn)
+    finally:
+        cursor.close()
+        conn.close()  # back to the pool
+    return True
+
+def log_to_database(session, source, status, details, device_id=None, values=None):
+    # session reconnects by itself after a MySQL restart
     try:
         timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-        sql = """
-            INSERT INTO event_logs (event_timestamp, event_source, event_status, details)
-            VALUES (%s, %s, %s, %s)
-        """
-        cursor.execute(sql, (timestamp, source, status, details))
-        conn.commit()
-        print(f"LOG → [{source}] [{status}] → {details}")
+        t = time.perf_counter()
+        session.execute(INSERT_LOG_SQL, (timestamp, source, status, details, device_id))
+        if values is not None:
+            session.execute(readings.INSERT_READING_SQL, (device_id, timestamp) + values)
+        t_commit = time.perf_counter()
+        DB_INSERT_SECONDS.observe(t_commit - t)
+        session.commit()
+        DB_COMMIT_SECONDS.observe(time.perf_counter() - t_commit)
+        DB_ROWS.labels("written").inc()
+        logger.debug("LOG → [%s] [%s] [%s] → %s", device_id, source, status, details)
     except Error as e:
+        session.rollback()
+        DB_ROWS.labels("failed").inc()
         print(f"✖ Log kaydedilemedi: {e}")
 
-def check_and_send_commands(cursor, conn, ser):
+# --- WRITE-BEHIND ---
+class LogRows:
+    # event_logs row (+ sensor_readings row for SENSORS/ALL) through self.put()
+    deadband = None     # deadband.Deadband: SENSORS/ALL rows it holds back are not written
+
+    def log(self, source, status, details, device_id=None, values=None):
+        if values is not None and self.deadband and not self.deadband.keep(device_id, values):
+            return True     # rebuilt on read by deadband.expand()
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        ok = self.put(INSERT_LOG_SQL, (timestamp, source, status, details, device_id))
+        if values is not None:
+            self.put(readings.INSERT_READING_SQL, (device_id, timestamp) + values)
+        return ok
+
+# Serial thread only enqueues; a separate thread with its own connection
+# flushes rows with executemany when the batch is full or old enough.
+class BatchWriter(LogRows, threading.Thread):
+    def __init__(self, batch_size=LOG_BATCH_SIZE, max_age=LOG_BATCH_MAX_AGE, maxsize=LOG_QUEUE_SIZE):
+        super().__init__(name="batch-writer", daemon=True)
+        self.batch_size = batch_size
+        self.max_age = max_age
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stats = {
+            "enqueued": 0,
+            "dropped": 0,      # queue full -> row dropped, serial read not blocked
+            "written": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_depth": 0,
+        }
+        self._stop_event = threading.Event()
+        self._stats_lock = threading.Lock()
+        WRITE_QUEUE_DEPTH.set_function(self.queue.qsize)
+
+    def put(self, sql, params):
+        try:
+            self.queue.put_nowait((sql, params))
+        except queue.Full:
+            with self._stats_lock:
+                self.stats["dropped"] += 1
+            DB_ROWS.labels("dropped").inc()
+            return False
+        with self._stats_lock:
+            self.stats["enqueued"] += 1
+            depth = self.queue.qsize()
+            if depth > self.stats["max_depth"]:
+                self.stats["max_depth"] = depth
+        return True
+
+    def run(self):
+        session = db.session()
+        batch = []
+        first_at = None
+        while not (self._stop_event.is_set() and self.queue.empty()):
+            if batch:
+                timeout = max(0.0, self.max_age - (time.monotonic() - first_at))
+            else:
+                timeout = self.max_age
+            try:
+                item = self.queue.get(timeout=timeout)
+                if not batch:
+                    first_at = time.monotonic()
+                batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() - first_at >= self.max_age):
+                self._flush(session, batch)
+                batch = []
+
+        if batch:
+            self._flush(session, batch)
+        session.close()
+
+    def _flush(self, session, batch):
+        # group by statement, keep arrival order inside each group
+        groups = {}
+        for sql, params in batch:
+            groups.setdefault(sql, []).append(params)
+        try:
+            t = time.perf_counter()
+            for sql, rows in groups.items():
+                session.executemany(sql, rows)
+            t_commit = time.perf_counter()
+            DB_INSERT_SECONDS.observe(t_commit - t)
+            session.commit()
+            DB_COMMIT_SECONDS.observe(time.perf_counter() - t_commit)
+            with self._stats_lock:
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+            DB_ROWS.labels("written").inc(len(batch))
+            logger.debug("LOG → %d satır yazıldı (kuyruk: %d)", len(batch), self.queue.qsize())
+        except Error as e:
+            print(f"✖ Toplu log kaydedilemedi ({len(batch)} satır): {e}")
+            with self._stats_lock:
+                self.stats["failed"] += len(batch)
+            DB_ROWS.labels("failed").inc(len(batch))
+            session.rollback()
+
+    def close(self, timeout=10):
+        self._stop_event.set()
+        self.join(timeout)
+
+    def stats_line(self):
+        with self._stats_lock:
+            s = dict(self.stats)
+        s["depth"] = self.queue.qsize()
+        return ", ".join(f"{k}={v}" for k, v in s.items())
+
+# Same interface as BatchWriter, but rows go to the on-disk spool first and a
+# replay thread moves them into MySQL, so a MySQL outage loses nothing.
+class SpoolWriter(LogRows, spool.Spool):
+    STATEMENTS = {
+        "log": INSERT_LOG_SQL,
+        "reading": readings.INSERT_READING_SQL,
+        "audit": INSERT_COMMAND_AUDIT_SQL,
+    }
+
+    def __init__(self, directory=spool.SPOOL_DIR, prepare=None):
+        super().__init__(directory, self.STATEMENTS, prepare=prepare)
+
+# --- COMMAND DISPATCH ---
+def coalesce_commands(rows):
+    # newest pending command per (board, command type) wins: ALARM:FIRE queued
+    # behind ALARM:NORMAL for the same board is stale before it reaches the
+    # serial link -> (rows to send in id order, ids superseded)
+    newest = {}
+    for row in rows:
+        cmd_id, command_text, device_id = row
+        newest[(device_id, command_text.split(":", 1)[0])] = row
+    keep = sorted(newest.values())
+    kept = {row[0] for row in keep}
+    return keep, [row[0] for row in rows if row[0] not in kept]
+
+def mark_commands(session, ids, status):
+    placeholders = ",".join(["%s"] * len(ids))
+    session.execute(f"UPDATE command_queue SET is_sent={status} WHERE id IN ({placeholders})",
+                    ids, prepared=False)
+
+def dispatch_pending_commands(session, write, stats=None):
+    # claim every pending command in one round trip, mark them sent in one UPDATE
+    rows = session.query(SELECT_PENDING_COMMANDS_SQL)
+    if not rows:
+        session.commit()  # end the transaction so the next poll sees new rows
+        return 0
+
+    rows, superseded = coalesce_commands(rows)
+    sent_ids = []
     try:
-        sql = "SELECT id, command FROM command_queue WHERE is_sent=0 ORDER BY id ASC LIMIT 1"
-        cursor.execute(sql)
-        row = cursor.fetchone()
-        if row:
-            cmd_id, command_text = row
-            full_command = command_text + "\n"
-            ser.write(full_command.encode('utf-8'))
-            print(f"⬅ ARDUINO'YA KOMUT GÖNDERİLDİ: {command_text}")
-            update_sql = "UPDATE command_queue SET is_sent=1 WHERE id=%s"
-            cursor.execute(update_sql, (cmd_id,))
-            conn.commit()
-    except Error as e:
-        print(f"✖ Komut kontrol hatası: {e}")
-    except Exception as ex:
-        print(f"✖ Seri port yazma hatası: {ex}")
+        if superseded:
+            mark_commands(session, superseded, COMMAND_SUPERSEDED)
+            COMMANDS_COALESCED.inc(len(superseded))
+            if stats is not None:
+                stats["coalesced"] += len(superseded)
+            logger.debug("Kuyrukta %d eski komut atlandı (yenisi var)", len(superseded))
+        for cmd_id, command_text, device_id in rows:
+            # write() returns False when the target board is not connected;
+            # the command stays pending until it comes back
+            if not write(command_text, device_id):
+                continue
+            sent_ids.append(cmd_id)
+            COMMANDS_SENT.labels(device_id or "", "queue").inc()
+            logger.info("⬅ ARDUINO'YA KOMUT GÖNDERİLDİ [%s]: %s", device_id or 'HEPSİ', command_text)
+    finally:
+        if sent_ids:
+            mark_commands(session, sent_ids, 1)
+        session.commit()
+    return len(sent_ids)
 
-def main():
-    print("MySQL <-> Arduino Köprüsü Başlatılıyor...\n")
-    conn, cursor = connect_database()
-    if conn is None:
-        return  
+class CommandDispatcher(threading.Thread):
+    def __init__(self, interval=COMMAND_POLL_INTERVAL, wakeup_port=COMMAND_WAKEUP_PORT):
+        super().__init__(name="command-dispatcher", daemon=True)
+        self.interval = interval
+        self.wakeup_port = wakeup_port
+        self.stats = {"polls": 0, "wakeups": 0, "sent": 0, "coalesced": 0, "errors": 0}
+        self._ports = {}
+        self._ser_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._sock = None
+
+    def attach(self, ser, device_id=None):
+        with self._ser_lock:
+            self._ports[device_id] = ser
+        self.wakeup()  # flush whatever piled up while the port was down
+
+    def detach(self, device_id=None):
+        with self._ser_lock:
+            self._ports.pop(device_id, None)
+
+    def wakeup(self):
+        self._wake.set()
+
+    def write(self, command_text, device_id=None):
+        data = (command_text + "\n").encode('utf-8')
+        with self._ser_lock:
+            if device_id is None:
+                targets = list(self._ports.values())
+            else:
+                targets = [self._ports[device_id]] if device_id in self._ports else []
+            t = time.perf_counter()
+            for ser in targets:
+                ser.write(data)
+            if targets:
+                COMMAND_WRITE_SECONDS.observe(time.perf_counter() - t)
+        return bool(targets)
+
+    def _listen(self):
+        while not self._stop_event.is_set():
+            try:
+                self._sock.recv(64)
+            except OSError:
+                break
+            self.stats["wakeups"] += 1
+            self.wakeup()
+
+    def run(self):
+        try:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._sock.bind((COMMAND_WAKEUP_HOST, self.wakeup_port))
+            threading.Thread(target=self._listen, name="command-wakeup", daemon=True).start()
+        except OSError as e:
+            print(f"✖ Komut uyandırma portu açılamadı ({self.wakeup_port}), sadece periyodik kontrol: {e}")
+            self._sock = None
 
+        session = db.session()
+        while not self._stop_event.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            with self._ser_lock:
+                attached = bool(self._ports)
+            if not attached:
+                continue
+
+            self.stats["polls"] += 1
+            t = time.perf_counter()
+            try:
+                self.stats["sent"] += dispatch_pending_commands(session, self.write, self.stats)
+                DISPATCH_SECONDS.observe(time.perf_counter() - t)
+            except Error as e:
+                self.stats["errors"] += 1
+                COMMAND_ERRORS.inc()
+                print(f"✖ Komut kontrol hatası: {e}")
+                session.rollback()
+            except Exception as ex:
+                self.stats["errors"] += 1
+                COMMAND_ERRORS.inc()
+                print(f"✖ Seri port yazma hatası: {ex}")
+
+        session.close()
+
+    def close(self, timeout=5):
+        self._stop_event.set()
+        self._wake.set()
+        if self._sock:
+            self._sock.close()
+        self.join(timeout)
+
+# --- STREAMING INFERENCE ---
+class LatencyStats:
+    def __init__(self, maxlen=1000):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return "n=0"
+        ms = sorted(x * 1000 for x in self.samples)
+        p50 = ms[len(ms) // 2]
+        p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+        return f"n={self.count} p50={p50:.1f}ms p95={p95:.1f}ms max={ms[-1]:.1f}ms"
+
+# SENSORS/ALL lines go straight from the serial thread into the model; alarm
+# commands are written back to the port and only audited in MySQL.
+class InferenceWorker(threading.Thread):
+    def __init__(self, predictor, dispatcher, writer, watcher=None, maxsize=STREAM_QUEUE_SIZE):
+        super().__init__(name="inference", daemon=True)
+        self.predictor = predictor
+        self.watcher = watcher
+        self.dispatcher = dispatcher
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.decision_latency = LatencyStats()   # serial line -> model decision
+        self.command_latency = LatencyStats()    # serial line -> command written to port
+        self.dropped = 0
+        self._stop_event = threading.Event()
+
+    def submit(self, values, device_id, t_read):
+        try:
+            self.queue.put_nowait((values, device_id, t_read, datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+            STREAM_DROPPED.inc()
+
+    def run(self):
+        import predict_realtimev3 as predictor_mod
+        next_report = time.monotonic() + STREAM_REPORT_INTERVAL
+        next_check = time.monotonic() + MODEL_CHECK_INTERVAL
+        while not self._stop_event.is_set():
+            if time.monotonic() >= next_report:
+                print(f"⏱ Akış gecikmesi: {self.latency_line()}")
+                next_report = time.monotonic() + STREAM_REPORT_INTERVAL
+            if self.watcher and time.monotonic() >= next_check:
+                # retrained model: swapped between two readings, no restart
+                loaded = predictor_mod.reload_model(self.watcher)
+                if loaded:
+                    self.predictor.swap(loaded[0], loaded[1])
+                next_check = time.monotonic() + MODEL_CHECK_INTERVAL
+            try:
+                values, device_id, t_read, ts = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            try:
+                command = self.predictor.on_reading(readings.reading_dict(values), ts, device_id)
+            except Exception as e:
+                print(f"✖ [{device_id}] Tahmin hatası: {e}")
+                continue
+            elapsed = time.perf_counter() - t_read
+            self.decision_latency.add(elapsed)
+            STREAM_DECISION_SECONDS.observe(elapsed)
+            if not command:
+                continue
+
+            try:
+                written = self.dispatcher.write(command, device_id)
+            except Exception as ex:
+                COMMAND_ERRORS.inc()
+                print(f"✖ Seri port yazma hatası: {ex}")
+                continue
+            if not written:
+                # board not attached: nothing remembered, the next reading tries again
+                logger.warning("✖ [%s] Kart bağlı değil, komut yazılamadı: %s", device_id, command)
+                continue
+            self.predictor.emitter.mark(command, device_id, time.monotonic())
+            elapsed = time.perf_counter() - t_read
+            self.command_latency.add(elapsed)
+            STREAM_COMMAND_SECONDS.observe(elapsed)
+            COMMANDS_SENT.labels(device_id or "", "stream").inc()
+            logger.info("⬅ ARDUINO'YA KOMUT GÖNDERİLDİ [%s]: %s", device_id, command)
+            self.writer.put(INSERT_COMMAND_AUDIT_SQL, (command, device_id))
+
+    def latency_line(self):
+        return (f"satır→karar {self.decision_latency.summary()} | "
+                f"satır→komut {self.command_latency.summary()} | düşen={self.dropped}")
+
+    def close(self, timeout=5):
+        self._stop_event.set()
+        self.join(timeout)
+
+def start_streaming(dispatcher, writer):
+    import model_registry
+    import predict_realtimev3 as predictor_mod
+    watcher = model_registry.Watcher(predictor_mod.REGISTRY_DIR)
+    try:
+        model, feature_cols = predictor_mod.load_model()
+    except Exception as e:
+        print(f"✖ Model yüklenemedi, akış modu kapalı: {e}")
+        return None
+    worker = InferenceWorker(predictor_mod.StreamingPredictor(model, feature_cols), dispatcher, writer, watcher)
+    worker.start()
+    print("✔ Akış modu aktif: sensör satırları doğrudan modele gidiyor.")
+    return worker
+
+# --- HOT WINDOW ---
+def publish_readings(hot, on_reading=None):
+    # readings go to the shared-memory window first, then on to the model (--stream)
+    def publish(values, device_id, t_read):
+        hot.publish(device_id, values)
+        if on_reading:
+            on_reading(values, device_id, t_read)
+    return publish
+
+# --- SERIAL ---
+def handle_line(line, device_id, log, on_reading=None):
+    t_read = time.perf_counter()
+    if line.startswith("LOG;"):
+        parts = line.split(";")
+        if len(parts) >= 4:
+            source = parts[1]
+            status = parts[2]
+            details = parts[3]
+            if source == "SENSORS" and status == "ALL":
+                # parsed once here, shared by sensor_readings and the model
+                values = readings.parse_reading(details)
+                PARSE_SECONDS.labels(device_id).observe(time.perf_counter() - t_read)
+                if on_reading:
+                    on_reading(values, device_id, t_read)
+                log(source, status, details, device_id, values)
+            else:
+                log(source, status, details, device_id)
+        else:
+            BAD_LINES.labels(device_id).inc()
+            logger.warning("✖ Hatalı log formatı [%s]: %s", device_id, line)
+
+def handle_frame(frame, device_id, log, on_reading=None):
+    # binary frame: values arrive typed and CRC-checked, nothing to parse
+    t_read = time.perf_counter()
+    if on_reading:
+        on_reading(frame.values, device_id, t_read)
+    log("SENSORS", "ALL", serial_frames.details(frame.values), device_id, frame.values)
+
+def handle_item(item, device_id, log, on_reading=None):
+    if isinstance(item, str):
+        handle_line(item, device_id, log, on_reading)
+    else:
+        handle_frame(item, device_id, log, on_reading)
+
+def read_chunk(ser):
+    # whatever is buffered, else block (timeout=1) for the first byte; frames
+    # may contain b"\n", so readline() can't be used for the binary protocol
+    return ser.read(ser.in_waiting or 1)
+
+def open_port(port):
+    # serial_for_url also takes "socket://host:port" (sim_arduino.py) besides COM4 / /dev/tty*
+    return serial.serial_for_url(port, BAUD_RATE, timeout=1, write_timeout=2)
+
+def parse_port_specs(specs):
+    ports = []
+    for spec in specs:
+        port, _, device_id = spec.partition("=")
+        ports.append((port, device_id or port))
+    return ports
+
+async def serve_port(port, device_id, writer, dispatcher, on_reading=None):
+    delay = RECONNECT_MIN_DELAY
     while True:
         try:
-            with serial.Serial(ARDUINO_PORT, BAUD_RATE, timeout=1, write_timeout=2) as ser:
+            ser = await asyncio.to_thread(open_port, port)
+        except serial.SerialException as e:
+            SERIAL_RECONNECTS.labels(device_id).inc()
+            print(f"✖ [{device_id}] {port} açılamadı, {delay:.0f} sn sonra tekrar: {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            continue
+
+        print(f"✔ [{device_id}] Arduino bağlı ({port}).")
+        try:
+            await asyncio.sleep(2)
+            dispatcher.attach(ser, device_id)
+            read_seconds = SERIAL_READ_SECONDS.labels(device_id)
+            lines = SERIAL_LINES.labels(device_id)
+            nbytes = SERIAL_BYTES.labels(device_id)
+            decoder = serial_frames.FrameDecoder(device_id)
+            while True:
+                t = time.perf_counter()
+                raw = await asyncio.to_thread(read_chunk, ser)
+                read_seconds.observe(time.perf_counter() - t)
+                if not raw:
+                    continue
+                nbytes.inc(len(raw))
+                for item in decoder.feed(raw):
+                    lines.inc()
+                    delay = RECONNECT_MIN_DELAY  # the board is really talking
+                    handle_item(item, device_id, writer.log, on_reading)
+        except serial.SerialException as e:
+            SERIAL_RECONNECTS.labels(device_id).inc()
+            print(f"✖ [{device_id}] Bağlantı koptu ({port}), {delay:.0f} sn sonra tekrar: {e}")
+        finally:
+            dispatcher.detach(device_id)
+            await asyncio.to_thread(ser.close)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+async def run_multi_port(ports, writer, dispatcher, on_reading=None):
+    # pyserial has no async API: blocking readline()s run in a pool sized to the port count
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=len(ports) + 4, thread_name_prefix="serial"))
+    await asyncio.gather(*(serve_port(port, device_id, writer, dispatcher, on_reading)
+                           for port, device_id in ports))
+
+def run_single_port(dispatcher, log, on_reading=None):
+    while True:
+        try:
+            with open_port(ARDUINO_PORT) as ser:
                 print(f"✔ Arduino bağlı ({ARDUINO_PORT}). Dinleme ve gönderme modu aktif...\n")
                 time.sleep(2) 
+                dispatcher.attach(ser, ARDUINO_PORT)
+                read_seconds = SERIAL_READ_SECONDS.labels(ARDUINO_PORT)
+                lines = SERIAL_LINES.labels(ARDUINO_PORT)
+                nbytes = SERIAL_BYTES.labels(ARDUINO_PORT)
+                decoder = serial_frames.FrameDecoder(ARDUINO_PORT)
 
                 while True:
                     try:
-                        line = ser.readline().decode("utf-8", errors="ignore").strip()
+                        t = time.perf_counter()
+                        raw = read_chunk(ser)
+                        read_seconds.observe(time.perf_counter() - t)
+                        nbytes.inc(len(raw))
                     except serial.SerialException:
                          raise 
 
-                    if line:
-                        if line.startswith("LOG;"):
-                            parts = line.split(";")
-                            if len(parts) >= 4:
-                                source = parts[1]
-                                status = parts[2]
-                                details = parts[3]
-                                log_to_database(cursor, conn, source, status, details)
-                            else:
-                                print("✖ Hatalı log formatı:", line)
-                    
-                    check_and_send_commands(cursor, conn, ser)
+                    for item in decoder.feed(raw):
+                        lines.inc()
+                        handle_item(item, ARDUINO_PORT, log, on_reading)
 
         except serial.SerialException:
+            SERIAL_RECONNECTS.labels(ARDUINO_PORT).inc()
+            dispatcher.detach(ARDUINO_PORT)
             print(f"✖ Arduino bağlantısı koptu veya bulunamadı ({ARDUINO_PORT}). 3 sn sonra tekrar deneniyor...")
             time.sleep(3)
         except KeyboardInterrupt:
             print("\nProgram sonlandırıldı.")
             break
         except Exception as e:
+            dispatcher.detach(ARDUINO_PORT)
             print("✖ Beklenmeyen genel hata:", e)
             time.sleep(3)
 
-    if conn and conn.is_connected():
-        cursor.close()
-        conn.close()
-        print("MySQL bağlantısı kapatıldı.")
+def parse_args():
+    p = argparse.ArgumentParser(description="MySQL <-> Arduino köprüsü")
+    p.add_argument("--write-behind", action="store_true",
+                   help="logları kuyruğa alıp ayrı thread'de toplu yaz")
+    p.add_argument("--batch-size", type=int, default=LOG_BATCH_SIZE)
+    p.add_argument("--batch-max-age", type=float, default=LOG_BATCH_MAX_AGE)
+    p.add_argument("--queue-size", type=int, default=LOG_QUEUE_SIZE)
+    p.add_argument("--command-interval", type=float, default=COMMAND_POLL_INTERVAL,
+                   help="command_queue kontrol aralığı (saniye)")
+    p.add_argument("--wakeup-port", type=int, default=COMMAND_WAKEUP_PORT)
+    p.add_argument("--ports", nargs="+", metavar="PORT[=DEVICE]",
+                   help="asyncio modunda dinlenecek seri portlar (örn. COM4=mutfak COM5)")
+    p.add_argument("--stream", action="store_true",
+                   help="sensör satırlarını doğrudan risk modeline ver, alarmı seri porta yaz")
+    p.add_argument("--spool", nargs="?", const=spool.SPOOL_DIR, metavar="KLASÖR",
+                   help="logları önce diske yaz, MySQL'e arka planda aktar (MySQL kesintisinde kayıp yok)")
+    p.add_argument("--hot-window", nargs="?", const=hot_window.HOT_WINDOW_PATH, metavar="DOSYA",
+                   help="son okumaları paylaşımlı belleğe yaz (tahminci / panel MySQL'e gitmeden okur)")
+    p.add_argument("--deadband", nargs="?", const=deadband.DEADBANDS, type=deadband.parse_deadbands,
+                   default=deadband.configured(), metavar="SÜTUN=X,...",
+                   help="sensör satırını sadece bir değer ölü bandını aştığında / heartbeat dolduğunda sakla "
+                        "(örn. gas=15,ldr=25; değersiz = varsayılan bantlar; varsayılan: SMART_HOME_DEADBAND)")
+    p.add_argument("--heartbeat", type=float, default=deadband.configured_heartbeat(),
+                   help="--deadband: değişmeyen kartın satırı yine de bu kadar saniyede bir saklanır "
+                        "(varsayılan: SMART_HOME_DEADBAND_HEARTBEAT, yoksa 60)")
+    metrics.add_arguments(p)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    metrics.configure(args)
+    print("MySQL <-> Arduino Köprüsü Başlatılıyor...\n")
+    db_ready = prepare_database()
+    if not db_ready and not args.spool:
+        return  
+
+    writer = None
+    if args.spool:
+        # without MySQL at startup the replay thread prepares the tables once it is back
+        writer = SpoolWriter(args.spool, prepare=None if db_ready else prepare_database)
+        writer.start()
+        print(f"✔ Spool aktif ({args.spool})")
+    elif args.write_behind or args.ports or args.stream or args.deadband is not None:
+        writer = BatchWriter(args.batch_size, args.batch_max_age, args.queue_size)
+        writer.start()
+        print(f"✔ Write-behind aktif (batch={args.batch_size}, max_age={args.batch_max_age}s)")
+
+    band = None
+    if args.deadband is not None:
+        band = writer.deadband = deadband.Deadband(args.deadband, args.heartbeat)
+        print(f"✔ Ölü bant aktif ({', '.join(f'{k}={v:g}' for k, v in args.deadband.items())}, "
+              f"heartbeat {args.heartbeat:g} sn)")
+        if deadband.configured() is None:
+            print(f"  ⚠ {deadband.DEADBAND_ENV} ayarlı değil: panel boş kovaları doldurmaz, "
+                  f"okuyucular için {deadband.DEADBAND_ENV}=on ayarlayın")
+        if args.heartbeat != deadband.configured_heartbeat():
+            print(f"  ⚠ okuyucular heartbeat {deadband.configured_heartbeat():g} sn bekliyor: daha uzun "
+                  f"sessizlikler kesinti sayılır, {deadband.HEARTBEAT_ENV}={args.heartbeat:g} ayarlayın")
+
+    dispatcher = CommandDispatcher(args.command_interval, args.wakeup_port)
+    dispatcher.start()
+
+    inference = start_streaming(dispatcher, writer) if args.stream else None
+    on_reading = inference.submit if inference else None
+    hot = None
+    if args.hot_window:
+        hot = hot_window.HotWindow.create(args.hot_window)
+        on_reading = publish_readings(hot, on_reading)
+        print(f"✔ Sıcak pencere: {args.hot_window} ({hot.devices} kart x {hot.rows} satır)")
+
+    if args.ports:
+        ports = parse_port_specs(args.ports)
+        print(f"✔ Çoklu port modu: {', '.join(f'{d}={p}' for p, d in ports)}")
+        try:
+            asyncio.run(run_multi_port(ports, writer, dispatcher, on_reading))
+        except KeyboardInterrupt:
+            print("\nProgram sonlandırıldı.")
+    else:
+        if writer:
+            log = writer.log
+        else:
+            session = db.session()
+            log = lambda *a: log_to_database(session, *a)
+        run_single_port(dispatcher, log, on_reading)
+
+    if inference:
+        inference.close()
+        print(f"Akış gecikmesi: {inference.latency_line()}")
+
+    dispatcher.detach(ARDUINO_PORT)
+    dispatcher.close()
+    print(f"Komut dağıtıcı istatistikleri: {dispatcher.stats}")
+
+    if hot:
+        hot.close()
+
+    if band:
+        print(f"Ölü bant istatistikleri: {band.stats_line()}")
+
+    if writer:
+        print("Kuyrukta kalan loglar yazılıyor...")
+        writer.close()
+        print(f"{'Spool' if args.spool else 'Write-behind'} istatistikleri: {writer.stats_line()}")
+
+    db.session().close()
+    print("MySQL bağlantısı kapatıldı.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,232 @@
+import atexit
+import bisect
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Counters, gauges and latency histograms for the runtime loops (bridge,
+# predictor), in the Prometheus text format:
+#   --metrics-port 9108          -> http://127.0.0.1:9108/metrics
+#   --metrics-file bridge.prom   -> rewritten every FILE_INTERVAL seconds
+#                                   (node_exporter textfile collector)
+# With neither flag ENABLED stays False and inc()/observe() return after one
+# flag check. Per-iteration messages go through logging (--log-level DEBUG).
+
+ENABLED = False
+FILE_INTERVAL = 5.0
+HTTP_HOST = "127.0.0.1"
+
+# seconds; a compiled-forest predict is ~50 us, a slow MySQL commit ~1 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _label_str(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _fmt(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _only(self):
+        # unlabelled metrics have a single child under ()
+        return self.labels()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items(), key=lambda kv: tuple(map(str, kv[0]))):
+            lines += child.render(self.name, self.labelnames, values)
+        return lines
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_label_str(labelnames, values)} {_fmt(self.value)}"]
+
+class Counter(_Metric):
+    kind = "counter"
+    _new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._only().inc(amount)
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0
+        self.fn = None
+
+    def set(self, value):
+        if ENABLED:
+            self.value = value
+
+    def set_function(self, fn):
+        # evaluated at scrape time, e.g. a queue depth
+        self.fn = fn
+
+    def render(self, name, labelnames, values):
+        value = self.value
+        if self.fn is not None:
+            try:
+                value = self.fn()
+            except Exception:
+                return []
+        return [f"{name}{_label_str(labelnames, values)} {_fmt(value)}"]
+
+class Gauge(_Metric):
+    kind = "gauge"
+    _new_child = _GaugeChild
+
+    def set(self, value):
+        self._only().set(value)
+
+    def set_function(self, fn):
+        self._only().set_function(fn)
+
+class _HistogramChild:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot: +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        if not ENABLED:
+            return
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, n in zip(self.bounds + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_label_str(labelnames, values, ('le', _fmt(bound)))} {cumulative}")
+        labels = _label_str(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_fmt(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._only().observe(value)
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for m in metrics:
+        lines += m.render()
+    return "\n".join(lines) + "\n"
+
+# --- EXPORT ---
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass    # one line per scrape would be the noise this replaces
+
+def serve(port, host=HTTP_HOST):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+def write_file(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)   # a collector never reads a half-written file
+
+def _file_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_file(path)
+        except OSError as e:
+            logging.getLogger("metrics").warning("Metrik dosyası yazılamadı (%s): %s", path, e)
+
+# --- CLI ---
+def add_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Prometheus metriklerini http://127.0.0.1:PORT/metrics adresinde yayınla")
+    parser.add_argument("--metrics-file", metavar="DOSYA",
+                        help=f"metrikleri {FILE_INTERVAL:.0f} sn'de bir bu dosyaya yaz")
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="DEBUG: her döngü adımını yazdır")
+
+def configure(args):
+    global ENABLED
+    # stdout, so log lines keep their order with the remaining print()s
+    logging.basicConfig(level=args.log_level, format="%(message)s", stream=sys.stdout)
+    ENABLED = bool(args.metrics_port or args.metrics_file)
+    if args.metrics_port:
+        serve(args.metrics_port)
+        print(f"✔ Metrikler: http://{HTTP_HOST}:{args.metrics_port}/metrics")
+    if args.metrics_file:
+        threading.Thread(target=_file_loop, args=(args.metrics_file, FILE_INTERVAL),
+                         name="metrics-file", daemon=True).start()
+        atexit.register(write_file, args.metrics_file)
+        print(f"✔ Metrikler: {args.metrics_file} ({FILE_INTERVAL:.0f} sn)")
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from fast_forest import CompiledForest
+
+# Versioned compiled models for the live predictor:
+#   models/v000007/{feature,threshold,left,right,value,roots,classes}.npy + meta.json
+#   models/CURRENT  -> "v000007", swapped with os.replace()
+# Arrays are opened with mmap_mode="r": loading a version is a few open()s,
+# no unpickling and no sklearn import; the OS page cache is shared between
+# the predictor, the bridge (--stream) and a reload of the same version.
+# train_modelv3.py publishes next to risk_model.pkl (which it still writes
+# for --incremental); predict_realtimev3.py polls CURRENT between cycles.
+# estimator.joblib (the sklearn model) is only unpickled on request, by batch
+# scorers such as backtest.py.
+
+REGISTRY_DIR = "models"
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 5
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots", "classes")
+ESTIMATOR_FILE = "estimator.joblib"
+
+def _version_name(n):
+    return f"v{n:06d}"
+
+def versions(root=REGISTRY_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(d for d in os.listdir(root) if d.startswith("v") and d[1:].isdigit())
+
+def current_version(root=REGISTRY_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def publish(compiled, feature_cols, root=REGISTRY_DIR, info=None, estimator=None):
+    os.makedirs(root, exist_ok=True)
+    existing = versions(root)
+    version = _version_name(int(existing[-1][1:]) + 1 if existing else 1)
+
+    # written under a temp name and renamed, so a reader never sees half a version
+    tmp = os.path.join(root, f".tmp-{version}-{os.getpid()}")
+    os.makedirs(tmp)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(compiled[name]))
+    if estimator is not None:
+        import joblib
+        joblib.dump(estimator, os.path.join(tmp, ESTIMATOR_FILE))
+    meta = {
+        "version": version,
+        "features": list(feature_cols),
+        "depth": int(compiled["depth"]),
+        "n_features": int(compiled["n_features"]),
+        "trees": int(len(compiled["roots"])),
+        "nodes": int(len(compiled["feature"])),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        **(info or {}),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2, default=str)
+    os.rename(tmp, os.path.join(root, version))
+
+    pointer = os.path.join(root, CURRENT_FILE)
+    with open(pointer + ".tmp", "w") as f:
+        f.write(version + "\n")
+    os.replace(pointer + ".tmp", pointer)
+    _prune(root, version)
+    return version
+
+def _prune(root, current):
+    # a predictor may still be mapping the previous version; keep a few
+    for old in versions(root)[:-KEEP_VERSIONS]:
+        if old != current:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+
+def load(root=REGISTRY_DIR, version=None, estimator=False):
+    version = version or current_version(root)
+    if version is None:
+        raise FileNotFoundError(f"{root}/{CURRENT_FILE} yok")
+    path = os.path.join(root, version)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    # np.asarray drops the memmap subclass: plain ndarrays over the mapped pages
+    arrays = {name: np.asarray(np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+              for name in ARRAYS}
+    arrays["depth"] = meta["depth"]
+    arrays["n_features"] = meta["n_features"]
+    model = CompiledForest(arrays)
+    if estimator and os.path.exists(os.path.join(path, ESTIMATOR_FILE)):
+        import joblib
+        model.estimator = joblib.load(os.path.join(path, ESTIMATOR_FILE))
+    return model, meta["features"], version
+
+class Watcher:
+    # cheap change check for the loops: one stat() of CURRENT per call
+    def __init__(self, root=REGISTRY_DIR, version=None):
+        self.root = root
+        self.version = version
+        self._mtime = self._stat()
+
+    def _stat(self):
+        try:
+            return os.stat(os.path.join(self.root, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self):
+        # (model, feature_cols, version) when CURRENT points somewhere new, else None
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return None
+        version = current_version(self.root)
+        if version is None or version == self.version:
+            self._mtime = mtime
+            return None
+        loaded = load(self.root, version)   # raises -> retried on the next poll
+        self._mtime, self.version = mtime, version
+        return loaded
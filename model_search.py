@@ -0,0 +1,231 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, recall_score
+from sklearn.model_selection import TimeSeriesSplit
+
+from fast_forest import CompiledForest, compile_forest
+
+# Hyperparameter sweep for the risk model with time-ordered CV.
+# The feature matrix is put once into shared memory; every worker process maps
+# it instead of receiving a pickled copy per task. Each (candidate, fold) pair
+# is one task. Candidates are then timed on the live predict path and the
+# winner is picked by recall within the latency budget.
+#   python train_modelv3.py --search        -> search, then train the winner
+#   python model_search.py --synthetic      -> quick run on synthetic data
+
+GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [8, 16, None],
+    "min_samples_leaf": [1, 4],
+}
+N_SPLITS = 5
+FOLD_GAP = 2                # roll3 / diff1 look 2 rows back: keep them out of the test fold
+HOLDOUT = 0.2               # newest share of the rows train_modelv3 scores the final model on
+LATENCY_SAMPLES = 500
+LATENCY_BUDGET_US = 2000    # p99 per-sample predict latency (CompiledForest.predict_one)
+SCORE_TIE = 0.005           # within this macro recall, prefer the faster model
+REPORT_PATH = "model_search_report.csv"
+
+# --- WORKER SIDE ---
+_shared = {}
+
+def time_folds(n_rows, n_splits):
+    return list(TimeSeriesSplit(n_splits=n_splits, gap=FOLD_GAP).split(np.empty((n_rows, 1))))
+
+def time_holdout(n_rows, holdout=HOLDOUT):
+    # -> (train end, test start): the newest rows, FOLD_GAP rows after training
+    split = int(n_rows * (1 - holdout))
+    return split, split + FOLD_GAP
+
+def _init_worker(blocks, n_rows, n_splits):
+    for key, (name, shape, dtype) in blocks.items():
+        # pool workers share the parent's resource tracker; the parent unlinks
+        shm = shared_memory.SharedMemory(name=name)
+        _shared[key] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    # fold indices are rebuilt here rather than pickled into every task
+    _shared["folds"] = time_folds(n_rows, n_splits)
+
+def _fit_fold(params, fold, classes, keep_model):
+    X = _shared["X"][1]
+    y = _shared["y"][1]
+    train_idx, test_idx = _shared["folds"][fold]
+    clf = RandomForestClassifier(class_weight="balanced", random_state=42, n_jobs=1, **params)
+    t = time.perf_counter()
+    clf.fit(X[train_idx], y[train_idx])
+    fit_s = time.perf_counter() - t
+
+    preds = clf.predict(X[test_idx])
+    result = {
+        "fold": fold,
+        "fit_s": fit_s,
+        "accuracy": accuracy_score(y[test_idx], preds),
+        "recall": recall_score(y[test_idx], preds, labels=classes, average=None, zero_division=0),
+        "present": np.isin(classes, y[test_idx]),
+    }
+    if keep_model:
+        result["compiled"] = compile_forest(clf)
+    return params, result
+
+# --- PARENT SIDE ---
+def _share(arr):
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[:] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def candidates(grid=GRID):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def measure_latency(compiled, X, n=LATENCY_SAMPLES):
+    model = CompiledForest(compiled)
+    rows = X[-n:]
+    times = []
+    for row in rows:
+        t = time.perf_counter()
+        model.predict_one(row)
+        times.append(time.perf_counter() - t)
+    us = np.array(times) * 1e6
+    return float(np.percentile(us, 50)), float(np.percentile(us, 99))
+
+def select(results, budget_us=LATENCY_BUDGET_US):
+    # best macro recall among the candidates inside the latency budget (all of
+    # them if none is); near-ties go to the lower p99 latency
+    pool = [r for r in results if r["p99_us"] <= budget_us] or results
+    best = max(r["macro_recall"] for r in pool)
+    close = [r for r in pool if r["macro_recall"] >= best - SCORE_TIE]
+    return min(close, key=lambda r: r["p99_us"])
+
+def search(X, y, grid=GRID, n_splits=N_SPLITS, workers=None, budget_us=LATENCY_BUDGET_US,
+           report_path=REPORT_PATH):
+    # X, y must be in time order (as make_features returns them)
+    X = np.ascontiguousarray(X, dtype=np.float32)   # what the trees compare against anyway
+    y = np.asarray(y)
+    classes = np.unique(y)
+    folds = time_folds(len(X), n_splits)
+    cands = candidates(grid)
+    workers = workers or os.cpu_count()
+    print(f"Search: {len(cands)} candidates x {len(folds)} time-ordered folds, "
+          f"{len(X)} rows, {workers} processes")
+
+    shm_x, meta_x = _share(X)
+    shm_y, meta_y = _share(y)
+    per_cand = {i: [] for i in range(len(cands))}
+    compiled = {}
+    t0 = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=({"X": meta_x, "y": meta_y}, len(X), n_splits)) as pool:
+            futures = {}
+            for i, params in enumerate(cands):
+                for f in range(len(folds)):
+                    # the last fold has the most history: its model is the one timed
+                    fut = pool.submit(_fit_fold, params, f, classes, f == len(folds) - 1)
+                    futures[fut] = i
+            for done, fut in enumerate(as_completed(futures), 1):
+                i = futures[fut]
+                _, result = fut.result()
+                if "compiled" in result:
+                    compiled[i] = result.pop("compiled")
+                per_cand[i].append(result)
+                if done % max(1, len(futures) // 10) == 0:
+                    print(f"  ... {done}/{len(futures)} fits ({time.perf_counter() - t0:.1f} s)")
+    finally:
+        shm_x.close()
+        shm_x.unlink()
+        shm_y.close()
+        shm_y.unlink()
+    t_cv = time.perf_counter() - t0
+
+    # latency is measured here, one model at a time, not under pool contention
+    results = []
+    for i, params in enumerate(cands):
+        folds_res = per_cand[i]
+        recall = np.array([r["recall"] for r in folds_res])
+        present = np.array([r["present"] for r in folds_res])
+        # a class missing from a test fold says nothing about its recall
+        class_recall = np.where(present.any(axis=0),
+                                (recall * present).sum(axis=0) / np.maximum(present.sum(axis=0), 1),
+                                np.nan)
+        acc = np.array([r["accuracy"] for r in folds_res])
+        p50, p99 = measure_latency(compiled[i], X)
+        results.append({
+            "params": params,
+            "accuracy": float(acc.mean()),
+            "accuracy_std": float(acc.std()),
+            "macro_recall": float(np.nanmean(class_recall)),
+            "class_recall": dict(zip(classes.tolist(), class_recall.tolist())),
+            "fit_s": float(np.mean([r["fit_s"] for r in folds_res])),
+            "p50_us": p50,
+            "p99_us": p99,
+        })
+
+    best = select(results, budget_us)
+    print_report(results, best, classes)
+    print(f"CV wall time {t_cv:.1f} s; total {time.perf_counter() - t0:.1f} s")
+    if report_path:
+        write_report(results, best, classes, report_path)
+        print(f"Report written to {report_path}")
+    return best, results
+
+def _params_str(params):
+    return " ".join(f"{k}={v}" for k, v in params.items())
+
+def print_report(results, best, classes):
+    header = (f"{'candidate':<48} {'acc':>6} {'±':>5} {'macroR':>6} "
+              + " ".join(f"R{c:>4}" for c in classes)
+              + f" {'fit s':>6} {'p50us':>7} {'p99us':>7}")
+    print("\n" + header)
+    for r in sorted(results, key=lambda r: -r["macro_recall"]):
+        mark = " *" if r is best else ""
+        print(f"{_params_str(r['params']):<48} {r['accuracy']:6.3f} {r['accuracy_std']:5.3f} "
+              f"{r['macro_recall']:6.3f} "
+              + " ".join(f"{r['class_recall'][c]:5.2f}" for c in classes.tolist())
+              + f" {r['fit_s']:6.2f} {r['p50_us']:7.0f} {r['p99_us']:7.0f}{mark}")
+    print(f"\nSelected: {_params_str(best['params'])} "
+          f"(macro recall {best['macro_recall']:.3f}, p99 {best['p99_us']:.0f} us)")
+
+def write_report(results, best, classes, path):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        keys = list(results[0]["params"])
+        w.writerow(keys + ["accuracy", "accuracy_std", "macro_recall"]
+                   + [f"recall_{c}" for c in classes.tolist()]
+                   + ["fit_s", "p50_us", "p99_us", "selected"])
+        for r in results:
+            w.writerow([r["params"].get(k) for k in keys]
+                       + [f"{r['accuracy']:.4f}", f"{r['accuracy_std']:.4f}", f"{r['macro_recall']:.4f}"]
+                       + [f"{r['class_recall'][c]:.4f}" for c in classes.tolist()]
+                       + [f"{r['fit_s']:.3f}", f"{r['p50_us']:.1f}", f"{r['p99_us']:.1f}", int(r is best)])
+
+def main():
+    p = argparse.ArgumentParser(description="Time-ordered CV + parallel hyperparameter search")
+    p.add_argument("--synthetic", type=int, nargs="?", const=20000, metavar="ROWS",
+                   help="search on synthetic readings instead of the database")
+    p.add_argument("--workers", type=int)
+    p.add_argument("--splits", type=int, default=N_SPLITS)
+    p.add_argument("--budget-us", type=float, default=LATENCY_BUDGET_US)
+    args = p.parse_args()
+
+    import pandas as pd
+    from train_modelv3 import load_sensor_readings, make_features, label_frame, parse_details_frame
+    if args.synthetic:
+        from feature_state import _synthetic_rows
+        rows = pd.DataFrame(_synthetic_rows(args.synthetic, seed=3), columns=["id", "ts", "details"])
+        df = pd.concat([rows[["id", "ts"]], parse_details_frame(rows["details"])], axis=1)
+    else:
+        df = load_sensor_readings()
+    df_features, feature_cols = make_features(df)
+    y = label_frame(df_features)
+    search(df_features[feature_cols].to_numpy(dtype=float), y, n_splits=args.splits,
+           workers=args.workers, budget_us=args.budget_us)
+
+if __name__ == "__main__":
+    main()
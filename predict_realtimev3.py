@@ -1,15 +1,21 @@
-import mysql.connector
-import pandas as pd
 import numpy as np
-import joblib
 import time
+import socket
+import logging
+import threading
+import argparse
 from datetime import datetime
 
-# --- DB ---
-DB_HOST = "localhost"
-DB_USER = "root"
-DB_PASSWORD = ""
-DB_NAME = "smart_home"
+import db
+import hot_window
+import metrics
+import model_registry
+from feature_state import FeatureState
+from fast_forest import CompiledForest
+from readings import SELECT_COLUMNS, reading_dict
+
+# loggerDaV2 komut dağıtıcısının UDP uyandırma adresi
+BRIDGE_WAKEUP_ADDR = ("127.0.0.1", 50555)
 
 # --- Counter  ---
 # 1:GAS, 2:FIRE, 3:FLOOD, 4:INTRUSION, 5:VIBRATION
@@ -22,9 +28,6 @@ ALARM_THRESHOLDS = {
 }
 
 
-alarm_counters = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-
-
 ALARM_NAMES = {
     0: "NORMAL",
     1: "GAS",
@@ -34,189 +37,487 @@ ALARM_NAMES = {
     5: "VIBRATION"
 }
 
+# aynı komut bu kadar saniye sonra tekrar yazılır (kart yeniden başladıysa
+# durumu geri alır); 0 = sadece durum değişikliklerinde yaz
+COMMAND_KEEPALIVE = 300.0
+
+MODEL_PATH = "risk_model.pkl"
+SKLEARN_BATCH_ROWS = 256   # bu kadar satırdan büyük toplu tahminde sklearn daha hızlı
+REGISTRY_DIR = model_registry.REGISTRY_DIR   # models/CURRENT, tercih edilen yol
+
+# --- Multi-device ---
+WARMUP_ROWS = 500        # başlangıçta pencereleri doldurmak için son satırlar
+MAX_ROWS_PER_TICK = 5000
+
+# --- SQL (prepared once per session) ---
+LAST_READINGS_SQL = f"SELECT {SELECT_COLUMNS} FROM sensor_readings ORDER BY id DESC LIMIT %s"
+READINGS_AFTER_SQL = f"SELECT {SELECT_COLUMNS} FROM sensor_readings WHERE id > %s ORDER BY id ASC LIMIT %s"
+LAST_PENDING_COMMAND_SQL = "SELECT command FROM command_queue WHERE is_sent=0 AND device_id <=> %s ORDER BY id DESC LIMIT 1"
+QUEUE_COMMAND_SQL = "INSERT INTO command_queue (command, is_sent, device_id) VALUES (%s, 0, %s)"
+
+# --- Metrics (no-op unless --metrics-port / --metrics-file) ---
+FETCH_SECONDS = metrics.Histogram("predict_fetch_seconds", "sensor_readings query per loop")
+FEATURE_SECONDS = metrics.Histogram("predict_feature_seconds", "FeatureState updates per loop")
+MODEL_SECONDS = metrics.Histogram("predict_model_seconds", "Model predict call per loop")
+COMMAND_WRITE_SECONDS = metrics.Histogram("predict_command_write_seconds", "command_queue check + INSERT + COMMIT")
+LOOP_SECONDS = metrics.Histogram("predict_loop_seconds", "One full loop, without the sleep")
+ROWS_READ = metrics.Counter("predict_rows_total", "sensor_readings rows read")
+PREDICTIONS = metrics.Counter("predict_predictions_total", "Model decisions by predicted class", ["pred"])
+COMMANDS_QUEUED = metrics.Counter("predict_commands_queued_total", "Commands inserted into command_queue", ["command"])
+COMMANDS_SUPPRESSED = metrics.Counter("predict_commands_suppressed_total", "Decisions not written: same as the last command for the device")
+ERRORS = metrics.Counter("predict_errors_total", "Failed loop stages", ["stage"])
+MODEL_RELOADS = metrics.Counter("predict_model_reloads_total", "Registry versions swapped in without a restart")
+
+logger = logging.getLogger("predict")
+
 # --- MODEL  ---
-print("[BAŞLATILIYOR] Model yükleniyor...")
-try:
-    bundle = joblib.load("risk_model.pkl")
-    model = bundle["model"]
-    feature_cols = bundle["features"]
-    print("[BAŞARILI] Model yüklendi.")
+def load_model(path=MODEL_PATH, registry=REGISTRY_DIR, estimator=False):
+    # estimator=True: the sklearn model is loaded too, for predict_batch() on big batches
+    print("[BAŞLATILIYOR] Model yükleniyor...")
+    if model_registry.current_version(registry):
+        # memory-mapped arrays: no unpickling, no sklearn/pandas import
+        model, feature_cols, version = model_registry.load(registry, estimator=estimator)
+        print(f"[BAŞARILI] Model yüklendi ({registry}/{version}, bellek eşlemeli).")
+    else:
+        import joblib
+        bundle = joblib.load(path)
+        model = bundle["model"]
+        feature_cols = bundle["features"]
+        if bundle.get("compiled") is not None:
+            model = CompiledForest(bundle["compiled"])
+            if estimator:
+                model.estimator = bundle["model"]
+            print("[BAŞARILI] Model yüklendi (derlenmiş hızlı yol).")
+        else:
+            print("[BAŞARILI] Model yüklendi.")
     print(f"Modelin Beklediği Özellikler: {feature_cols}")
-except Exception as e:
-    print(f"[HATA] Model yüklenemedi: {e}")
-    exit()
+    return model, feature_cols
+
+def reload_model(watcher):
+    # between cycles: (model, feature_cols, version) if train_modelv3 published a new one
+    try:
+        loaded = watcher.poll()
+    except Exception as e:
+        ERRORS.labels("reload").inc()
+        print(f"!! Yeni model yüklenemedi, eskisiyle devam ediliyor: {e}")
+        return None
+    if loaded:
+        MODEL_RELOADS.inc()
+        print(f"[MODEL] Yeni sürüm devreye alındı: {loaded[2]} ({len(loaded[0].roots)} ağaç)")
+    return loaded
+
+def predict_one(model, features, feature_cols):
+    if isinstance(model, CompiledForest):
+        return int(model.predict_one(features))
+    # eski pkl (derlenmiş dizi yok): sklearn yolu
+    import pandas as pd
+    X_live_df = pd.DataFrame([features], columns=feature_cols)
+    return int(model.predict(X_live_df)[0])
+
+def predict_batch(model, X, feature_cols):
+    # compiled walk for a few rows (one per device in the loop); sklearn's
+    # Cython walk for big batches when the estimator was loaded with the model
+    if isinstance(model, CompiledForest):
+        if model.estimator is None or len(X) < SKLEARN_BATCH_ROWS:
+            return model.predict(X)
+        model = model.estimator
+    import pandas as pd
+    return model.predict(pd.DataFrame(X, columns=feature_cols))
+
+def new_counters():
+    return {k: 0 for k in ALARM_THRESHOLDS}
 
 # --- DB OPERATIONS ---
-def send_command_to_db(command_str):
+def notify_bridge():
+    # fire-and-forget: the bridge also polls, so a lost datagram only adds latency
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME
-        )
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT command FROM command_queue WHERE is_sent=0 ORDER BY id DESC LIMIT 1")
-        result = cursor.fetchone()
-        
-        if result and result[0] == command_str:
-            pass 
-        else:
-            query = "INSERT INTO command_queue (command, is_sent) VALUES (%s, 0)"
-            cursor.execute(query, (command_str,))
-            conn.commit()
-            print(f"   -> [DB'YE YAZILDI] Emir Kuyruğa Eklendi: {command_str}")
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.sendto(b"cmd", BRIDGE_WAKEUP_ADDR)
+    except OSError:
+        pass
 
-        cursor.close()
-        conn.close()
-    except Exception as e:
-        print(f"!! DB Yazma Hatası: {e}")
+def send_command_to_db(command_str, device_id=None):
+    return send_commands_to_db([(command_str, device_id)])
 
-# --- DB DATA ---
-def get_last_logs(n=3):
+def send_commands_to_db(commands):
+    # commands: [(command, device_id)], device_id None = tüm kartlar; True if committed
+    session = db.session()
+    t = time.perf_counter()
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME,
-            connection_timeout=5
-        )
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT details, event_timestamp 
-            FROM event_logs
-            WHERE event_source='SENSORS' AND event_status='ALL'
-            ORDER BY id DESC
-            LIMIT %s
-            """,
-            (n,)
-        )
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
-        return rows[::-1]
+        queued = 0
+        for command_str, device_id in commands:
+            result = session.query(LAST_PENDING_COMMAND_SQL, (device_id,))
+
+            if result and result[0][0] == command_str:
+                pass 
+            else:
+                session.execute(QUEUE_COMMAND_SQL, (command_str, device_id))
+                queued += 1
+                COMMANDS_QUEUED.labels(command_str).inc()
+                logger.debug("   -> [DB'YE YAZILDI] Emir Kuyruğa Eklendi: %s (%s)", command_str, device_id or 'HEPSİ')
+
+        session.commit()
+        COMMAND_WRITE_SECONDS.observe(time.perf_counter() - t)
+        if queued:
+            notify_bridge()
+        return True
     except Exception as e:
-        print(f"[DB HATA] Veri çekilemedi: {e}")
-        return []
+        session.rollback()
+        ERRORS.labels("command").inc()
+        print(f"!! DB Yazma Hatası: {e}")
+        return False
 
-# --- PARSE  ---
-def parse_details(s):
-    out = {}
-    if not s: return out
-    parts = s.split(",")
-    for p in parts:
-        if "=" in p:
-            k, v = p.split("=", 1)
-            k = k.strip().upper()
-            v = v.strip()
-            try:
-                if "." in v: out[k] = float(v)
-                else: out[k] = int(v)
-            except: out[k] = v
-    return out
+# --- COMMAND EMISSION ---
+# Last command written per device, in memory: a decision reaches command_queue
+# only when it differs from that one or the keepalive is due, instead of an
+# ALARM:NORMAL row every tick. Nothing is remembered after a failed write, so
+# the next tick tries again.
+class CommandEmitter:
+    def __init__(self, keepalive=COMMAND_KEEPALIVE):
+        self.keepalive = keepalive
+        self.last = {}          # device_id -> (command, time.monotonic() written)
+        self.stats = {"written": 0, "suppressed": 0}
 
-# --- FEATURE ---
-def build_feature_row(last_logs):
-    df = pd.DataFrame()
-    for details, ts in last_logs:
-        row = parse_details(details)
-        row["ts"] = ts
-        
-        if "DIST" in row and "DISTANCE" not in row:
-            row["DISTANCE"] = row["DIST"]
-            
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+    def due(self, command, device_id, now):
+        last = self.last.get(device_id)
+        if last is None or last[0] != command:
+            return True
+        return self.keepalive > 0 and now - last[1] >= self.keepalive
 
-    base_cols = ["GAS", "FLAME", "LDR", "WATER", "VIBRATION", "DISTANCE"]
-    for c in base_cols:
-        if c not in df.columns: df[c] = 0
+    def mark(self, command, device_id, now):
+        self.last[device_id] = (command, now)
+        self.stats["written"] += 1
 
-    df["ts"] = pd.to_datetime(df["ts"])
-    
-    df["gas_roll3"] = df["GAS"].rolling(3, min_periods=1).mean()
-    df["flame_roll3"] = df["FLAME"].rolling(3, min_periods=1).mean()
-    df["ldr_roll3"] = df["LDR"].rolling(3, min_periods=1).mean()
-    df["water_roll3"] = df["WATER"].rolling(3, min_periods=1).mean()
-    df["dist_roll3"] = df["DISTANCE"].rolling(3, min_periods=1).mean()
-    df["vib_roll3"] = df["VIBRATION"].rolling(3, min_periods=1).mean()
-    
-    df["gas_diff1"] = df["GAS"].diff().fillna(0)
-    df["flame_diff1"] = df["FLAME"].diff().fillna(0)
-    df["dist_diff1"] = df["DISTANCE"].diff().fillna(0)
-    
-    df["hour"] = df["ts"].dt.hour
-    df["minute"] = df["ts"].dt.minute
+    def emit(self, commands):
+        now = time.monotonic()
+        due = [(c, d) for c, d in commands if self.due(c, d, now)]
+        skipped = len(commands) - len(due)
+        if skipped:
+            self.stats["suppressed"] += skipped
+            COMMANDS_SUPPRESSED.inc(skipped)
+        if due and send_commands_to_db(due):
+            for command, device_id in due:
+                self.mark(command, device_id, now)
+        return due
 
-    row = df.iloc[-1]
-    return [row[col] if col in row else 0 for col in feature_cols], df["ts"].iloc[-1]
+# --- HOT WINDOW DATA ---
+# Same rows as the queries below, from loggerDaV2 --hot-window's shared memory.
+# While no bridge publishes there (not started yet, stopped, mapping failed)
+# the loops read MySQL instead, like the dashboard feed.
+def use_hot(hot, was_live=None):
+    # True when the hot window can be read this tick; a change is printed once
+    live = hot is not None and hot.live()
+    if hot is not None and live != was_live:
+        if live:
+            print("[SICAK PENCERE] Köprü yayında, okumalar paylaşımlı bellekten alınıyor.")
+        else:
+            print(f"[SICAK PENCERE] Köprü yayında değil ({hot.error or 'güncelleme yok'}), MySQL'den okunuyor.")
+    return live
 
-# --- Main Loop ---
-print("\n[DÖNGÜ] Gerçek zamanlı tahmin başlıyor (DB Modu)...\n")
-print("Aktif Sayaç Limitleri:", ALARM_THRESHOLDS)
+def get_hot_last_logs(hot, n=3):
+    t = time.perf_counter()
+    try:
+        rows = hot.latest(n)
+    except Exception as e:
+        ERRORS.labels("fetch").inc()
+        print(f"[SICAK PENCERE HATA] Veri okunamadı: {e}")
+        return []
+    FETCH_SECONDS.observe(time.perf_counter() - t)
+    ROWS_READ.inc(len(rows))
+    return [(reading_dict(values), ts) for values, ts in rows]
 
-while True:
-    print(f"\n[{datetime.now().strftime('%H:%M:%S')}] --- Yeni Döngü ---")
-    
-    
-    print(">> Adım 1: DB'den veri okunuyor...")
-    logs = get_last_logs(3)
-    if not logs:
-        print("!! Veri bulunamadı. Bekleniyor...")
-        time.sleep(2)
-        continue
-    
-    print(">> Adım 2: Veriler işleniyor...")
+def get_hot_logs(hot, warmup=WARMUP_ROWS):
+    t = time.perf_counter()
     try:
-        features, last_ts = build_feature_row(logs)
-        print(f"   -> İşlenen son veri zamanı: {last_ts}")
+        rows = hot.poll(warmup)
     except Exception as e:
-        print(f"!! Özellik hatası: {e}")
-        time.sleep(2)
-        continue
- 
-    
-    print(">> Adım 3: Tahmin yapılıyor...")
+        ERRORS.labels("fetch").inc()
+        print(f"[SICAK PENCERE HATA] Veri okunamadı: {e}")
+        return []
+    FETCH_SECONDS.observe(time.perf_counter() - t)
+    ROWS_READ.inc(len(rows))
+    return [(n, device_id, reading_dict(values), ts) for n, device_id, values, ts in rows]
+
+# --- DB DATA ---
+def get_last_logs(n=3):
+    session = db.session()
+    t = time.perf_counter()
     try:
-        X_live_df = pd.DataFrame([features], columns=feature_cols)
-        pred = int(model.predict(X_live_df)[0]) 
-        
-        pred_name = ALARM_NAMES.get(pred, "UNKNOWN")
-        print(f"   -> AI TAHMİNİ: {pred} ({pred_name})")
-        
+        rows = session.query(LAST_READINGS_SQL, (n,))
+        session.commit()  # end the read snapshot so the next tick sees new rows
+        FETCH_SECONDS.observe(time.perf_counter() - t)
+        ROWS_READ.inc(len(rows))
+        return [(reading_dict(r[3:]), r[2]) for r in rows[::-1]]
     except Exception as e:
-        print(f"!! Model hatası: {e}")
-        continue
+        session.rollback()
+        ERRORS.labels("fetch").inc()
+        print(f"[DB HATA] Veri çekilemedi: {e}")
+        return []
 
-    print(">> Adım 4: Karar veriliyor (Sayaç Kontrolü)...")
-    
+def get_sensor_logs_after(last_id, limit=MAX_ROWS_PER_TICK):
+    session = db.session()
+    t = time.perf_counter()
+    try:
+        if last_id is None:
+            # ilk tur: pencereleri doldurmak için en son satırlar
+            rows = session.query(LAST_READINGS_SQL, (WARMUP_ROWS,))[::-1]
+        else:
+            rows = session.query(READINGS_AFTER_SQL, (last_id, limit))
+        session.commit()
+        FETCH_SECONDS.observe(time.perf_counter() - t)
+        ROWS_READ.inc(len(rows))
+        return [(r[0], r[1], reading_dict(r[3:]), r[2]) for r in rows]
+    except Exception as e:
+        session.rollback()
+        ERRORS.labels("fetch").inc()
+        print(f"[DB HATA] Veri çekilemedi: {e}")
+        return []
+
+# --- FEATURE ---
+def build_feature_row(last_logs, feature_cols):
+    # same result as the old per-cycle DataFrame + rolling(3)/diff() build
+    state = FeatureState(feature_cols)
+    features, last_ts = None, None
+    for reading, ts in last_logs:
+        features = state.update(reading, ts)
+        last_ts = ts
+    return features, last_ts
+
+# --- DECISION ---
+def decide_command(pred, counters):
+    pred_name = ALARM_NAMES.get(pred, "UNKNOWN")
     command = "ALARM:NORMAL"
+    PREDICTIONS.labels(pred_name).inc()
 
     if pred == 0:
-        for k in alarm_counters:
-            alarm_counters[k] = 0
-        print("   -> Durum NORMAL. Tüm sayaçlar sıfırlandı.")
+        for k in counters:
+            counters[k] = 0
+        logger.debug("   -> Durum NORMAL. Tüm sayaçlar sıfırlandı.")
         
     else:
 
-        alarm_counters[pred] += 1
+        counters[pred] += 1
         
         # Diğer sayaçları sıfırla
-        for k in alarm_counters:
+        for k in counters:
             if k != pred:
-                alarm_counters[k] = 0
+                counters[k] = 0
                 
-        count = alarm_counters[pred]
+        count = counters[pred]
         threshold = ALARM_THRESHOLDS.get(pred, 3) 
         
-        print(f"⚠️  [ŞÜPHE] {pred_name} Teyit Sayacı: {count}/{threshold}")
+        logger.debug("⚠️  [ŞÜPHE] %s Teyit Sayacı: %d/%d", pred_name, count, threshold)
         
         if count >= threshold:
             command = f"ALARM:{pred_name}" 
-            print(f"🚨🚨 ONAYLI ALARM TETİKLENDİ: {command} 🚨🚨")
+            # only the tick that confirms it is worth an INFO line; later ticks
+            # arrive with the counter already past the threshold
+            logger.log(logging.INFO if count == threshold else logging.DEBUG,
+                       "🚨🚨 ONAYLI ALARM TETİKLENDİ: %s 🚨🚨", command)
             
-            alarm_counters[pred] = threshold 
+            counters[pred] = threshold 
         else:
-            print("   -> Teyit bekleniyor, komut: NORMAL")
+            logger.debug("   -> Teyit bekleniyor, komut: NORMAL")
             command = "ALARM:NORMAL"
 
-    send_command_to_db(command)
+    return command
+
+# --- STREAMING ---
+# Fed line by line from loggerDaV2 (--stream); keeps one window and one set of
+# confirmation counters per board and returns a command only when it changes
+# (or the keepalive is due).
+class StreamingPredictor:
+    def __init__(self, model, feature_cols, keepalive=COMMAND_KEEPALIVE):
+        self.model = model
+        self.feature_cols = feature_cols
+        self.states = {}
+        self.counters = {}
+        self.emitter = CommandEmitter(keepalive)
+        self.lock = threading.Lock()
+
+    def swap(self, model, feature_cols):
+        with self.lock:
+            if list(feature_cols) != list(self.feature_cols):
+                self.states = {}    # windows were built for the old feature order
+            self.model, self.feature_cols = model, feature_cols
+
+    def on_reading(self, reading, ts, device_id=None):
+        with self.lock:
+            state = self.states.get(device_id)
+            if state is None:
+                state = self.states[device_id] = FeatureState(self.feature_cols)
+            features = state.update(reading, ts)
+            pred = predict_one(self.model, features, self.feature_cols)
+
+            counters = self.counters.setdefault(device_id, new_counters())
+            command = decide_command(pred, counters)
+            # the caller marks it in self.emitter once the port write succeeded
+            if not self.emitter.due(command, device_id, time.monotonic()):
+                COMMANDS_SUPPRESSED.inc()
+                return None
+            return command
+
+# --- Multi-device Loop ---
+# One FeatureState and one counter set per board. Each tick pulls only rows
+# newer than the last seen id, then scores the newest row of every board that
+# reported in a single predict() call.
+def run_multi_device(model, feature_cols, watcher, emitter, hot=None):
+    states = {}
+    counters = {}
+    last_id = None
+    from_hot = None
+
+    print("\n[DÖNGÜ] Çoklu cihaz tahmini başlıyor (DB Modu)...\n")
+    print("Aktif Sayaç Limitleri:", ALARM_THRESHOLDS)
+
+    while True:
+        loaded = reload_model(watcher)
+        if loaded:
+            if list(loaded[1]) != list(feature_cols):
+                states, last_id = {}, None   # new feature order: warm the windows up again
+                if hot:
+                    hot.rewind()
+            model, feature_cols, _ = loaded
+
+        live = use_hot(hot, from_hot)
+        if from_hot is not None and live != from_hot:
+            # other source, other row numbers: warm the windows up from it again
+            states, last_id = {}, None
+            if live:
+                hot.rewind()
+        from_hot = live
+
+        t_loop = time.perf_counter()
+        rows = get_hot_logs(hot) if live else get_sensor_logs_after(last_id)
+        t = time.perf_counter()
+        latest = {}
+        for row_id, device_id, reading, ts in rows:
+            state = states.get(device_id)
+            if state is None:
+                state = states[device_id] = FeatureState(feature_cols)
+            latest[device_id] = state.update(reading, ts)
+            last_id = row_id
+        FEATURE_SECONDS.observe(time.perf_counter() - t)
+
+        if last_id is None:
+            last_id = 0
+        if not latest:
+            time.sleep(2)
+            continue
+
+        devices = list(latest)
+        X = np.array([latest[d] for d in devices], dtype=float)
+        t = time.perf_counter()
+        try:
+            preds = predict_batch(model, X, feature_cols)
+        except Exception as e:
+            ERRORS.labels("model").inc()
+            print(f"!! Model hatası: {e}")
+            time.sleep(2)
+            continue
+        MODEL_SECONDS.observe(time.perf_counter() - t)
+
+        logger.debug("\n[%s] %d yeni satır, %d cihaz tek seferde tahmin edildi",
+                     datetime.now().strftime('%H:%M:%S'), len(rows), len(devices))
+        commands = []
+        for device_id, pred in zip(devices, preds):
+            pred = int(pred)
+            logger.debug("[%s] AI TAHMİNİ: %d (%s)", device_id, pred, ALARM_NAMES.get(pred, 'UNKNOWN'))
+            device_counters = counters.setdefault(device_id, new_counters())
+            commands.append((decide_command(pred, device_counters), device_id))
+        emitter.emit(commands)
+        LOOP_SECONDS.observe(time.perf_counter() - t_loop)
+
+        time.sleep(2)
+
+# --- Main Loop ---
+def main():
+    p = argparse.ArgumentParser(description="Gerçek zamanlı risk tahmini")
+    p.add_argument("--multi-device", action="store_true",
+                   help="her cihaz için ayrı pencere/sayaç, tek predict çağrısı")
+    p.add_argument("--hot-window", nargs="?", const=hot_window.HOT_WINDOW_PATH, metavar="DOSYA",
+                   help="okumaları MySQL yerine loggerDaV2 --hot-window paylaşımlı belleğinden al "
+                        "(köprü yayında değilken MySQL'den)")
+    p.add_argument("--keepalive", type=float, default=COMMAND_KEEPALIVE, metavar="SANİYE",
+                   help="değişmeyen komutu bu aralıkla tekrar yaz (0 = sadece değişimde)")
+    metrics.add_arguments(p)
+    args = p.parse_args()
+    metrics.configure(args)
+
+    # created before loading, so a version published meanwhile is not missed
+    watcher = model_registry.Watcher(REGISTRY_DIR)
+    try:
+        model, feature_cols = load_model()
+    except Exception as e:
+        print(f"[HATA] Model yüklenemedi: {e}")
+        return
+
+    emitter = CommandEmitter(args.keepalive)
+    hot = hot_window.HotReader(args.hot_window) if args.hot_window else None
+    if hot:
+        print(f"[SICAK PENCERE] Okumalar {args.hot_window} üzerinden alınıyor.")
+    if args.multi_device:
+        run_multi_device(model, feature_cols, watcher, emitter, hot)
+        return
+
+    alarm_counters = new_counters()
+    from_hot = None
+
+    print("\n[DÖNGÜ] Gerçek zamanlı tahmin başlıyor (DB Modu)...\n")
+    print("Aktif Sayaç Limitleri:", ALARM_THRESHOLDS)
+
+    while True:
+        loaded = reload_model(watcher)
+        if loaded:
+            model, feature_cols, _ = loaded
+
+        t_loop = time.perf_counter()
+        logger.debug("\n[%s] --- Yeni Döngü ---", datetime.now().strftime('%H:%M:%S'))
+    
+    
+        logger.debug(">> Adım 1: DB'den veri okunuyor...")
+        from_hot = use_hot(hot, from_hot)
+        logs = get_hot_last_logs(hot, 3) if from_hot else get_last_logs(3)
+        if not logs:
+            logger.debug("!! Veri bulunamadı. Bekleniyor...")
+            time.sleep(2)
+            continue
+    
+        logger.debug(">> Adım 2: Veriler işleniyor...")
+        t = time.perf_counter()
+        try:
+            features, last_ts = build_feature_row(logs, feature_cols)
+            FEATURE_SECONDS.observe(time.perf_counter() - t)
+            logger.debug("   -> İşlenen son veri zamanı: %s", last_ts)
+        except Exception as e:
+            ERRORS.labels("features").inc()
+            print(f"!! Özellik hatası: {e}")
+            time.sleep(2)
+            continue
+ 
+    
+        logger.debug(">> Adım 3: Tahmin yapılıyor...")
+        t = time.perf_counter()
+        try:
+            pred = predict_one(model, features, feature_cols)
+            MODEL_SECONDS.observe(time.perf_counter() - t)
+        
+            pred_name = ALARM_NAMES.get(pred, "UNKNOWN")
+            logger.debug("   -> AI TAHMİNİ: %d (%s)", pred, pred_name)
+        
+        except Exception as e:
+            ERRORS.labels("model").inc()
+            print(f"!! Model hatası: {e}")
+            continue
+
+        logger.debug(">> Adım 4: Karar veriliyor (Sayaç Kontrolü)...")
+        command = decide_command(pred, alarm_counters)
+
+        emitter.emit([(command, None)])
+        LOOP_SECONDS.observe(time.perf_counter() - t_loop)
+
+        logger.debug(">> Döngü sonu, 2 saniye bekleniyor...")
+        time.sleep(2)
 
-    print(">> Döngü sonu, 2 saniye bekleniyor...")
-    time.sleep(2)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import time
+
+import db
+
+# Typed copy of every LOG;SENSORS;ALL line, written by loggerDaV2 at ingest
+# time so readers never parse the details string again.
+#   python readings.py --backfill   -> copies older event_logs rows
+
+# details key -> column
+SENSOR_COLUMNS = {
+    "GAS": "gas",
+    "FLAME": "flame",
+    "LDR": "ldr",
+    "WATER": "water",
+    "VIBRATION": "vibration",
+    "DISTANCE": "distance",
+    "TEMP": "temp",
+    "HUM": "hum",
+}
+KEYS = list(SENSOR_COLUMNS)
+COLUMNS = list(SENSOR_COLUMNS.values())
+
+# label thresholds (train_modelv3 label rules, deadband alarm ranges)
+GAS_CRIT = 700
+FLAME_CRIT = 700
+WATER_CRIT = 150
+DISTANCE_MOTION = 30
+LDR_DARK = 700
+
+CREATE_SENSOR_READINGS_SQL = """
+    CREATE TABLE IF NOT EXISTS sensor_readings (
+        id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+        log_id BIGINT NULL,
+        device_id VARCHAR(64) NULL,
+        ts DATETIME NOT NULL,
+        gas SMALLINT NULL,
+        flame SMALLINT NULL,
+        ldr SMALLINT NULL,
+        water SMALLINT NULL,
+        vibration TINYINT NULL,
+        distance FLOAT NULL,
+        temp FLOAT NULL,
+        hum FLOAT NULL,
+        UNIQUE KEY uq_log_id (log_id),
+        KEY idx_device_ts (device_id, ts),
+        KEY idx_ts (ts)
+    )
+"""
+
+INSERT_READING_SQL = f"""
+    INSERT INTO sensor_readings (device_id, ts, {", ".join(COLUMNS)})
+    VALUES (%s, %s, {", ".join(["%s"] * len(COLUMNS))})
+"""
+
+# backfill rows carry the event_logs id so re-runs skip what is already there
+BACKFILL_READING_SQL = f"""
+    INSERT IGNORE INTO sensor_readings (log_id, device_id, ts, {", ".join(COLUMNS)})
+    VALUES (%s, %s, %s, {", ".join(["%s"] * len(COLUMNS))})
+"""
+
+SELECT_COLUMNS = f"id, device_id, ts, {', '.join(COLUMNS)}"
+
+def ensure_table(cursor, conn):
+    cursor.execute(CREATE_SENSOR_READINGS_SQL)
+    conn.commit()
+
+def parse_reading(details):
+    # "GAS=412,FLAME=1009,...,DIST=23.4" -> tuple in COLUMNS order, None if missing/invalid
+    found = {}
+    for part in details.split(","):
+        key, sep, value = part.partition("=")
+        if not sep:
+            continue
+        key = key.strip().upper()
+        if key == "DIST":
+            key = "DIST" if "DISTANCE" in found else "DISTANCE"
+        try:
+            v = float(value)
+        except ValueError:
+            v = None
+        if v != v:  # nan (e.g. DHT read error)
+            v = None
+        found[key] = v
+    return tuple(found.get(k) for k in KEYS)
+
+def reading_dict(values):
+    # tuple (COLUMNS order) -> the KEY=value dict FeatureState expects
+    return dict(zip(KEYS, values))
+
+# --- BACKFILL ---
+def backfill(batch_size=10000):
+    conn = db.connect()
+    cursor = conn.cursor()
+    ensure_table(cursor, conn)
+
+    # stop where ingest-time rows (log_id NULL) start, resume after the last copied log
+    cursor.execute("SELECT MIN(ts) FROM sensor_readings WHERE log_id IS NULL")
+    cutoff = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(MAX(log_id), 0) FROM sensor_readings")
+    last_id = cursor.fetchone()[0]
+    conn.commit()
+    print(f"Backfill: log_id > {last_id}" + (f", event_timestamp < {cutoff}" if cutoff else ""))
+
+    q = ("SELECT id, device_id, event_timestamp, details FROM event_logs "
+         "WHERE event_source='SENSORS' AND event_status='ALL' AND id > %s"
+         + (" AND event_timestamp < %s" if cutoff else "")
+         + " ORDER BY id ASC LIMIT %s")
+
+    total = 0
+    t0 = time.perf_counter()
+    while True:
+        params = (last_id, cutoff, batch_size) if cutoff else (last_id, batch_size)
+        cursor.execute(q, params)
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        batch = [(log_id, device_id, ts) + parse_reading(details or "")
+                 for log_id, device_id, ts, details in rows]
+        cursor.executemany(BACKFILL_READING_SQL, batch)
+        conn.commit()
+        last_id = rows[-1][0]
+        total += len(rows)
+        print(f"  ... {total} satır ({total / (time.perf_counter() - t0):,.0f} satır/sn)")
+
+    cursor.close()
+    conn.close()
+    print(f"Backfill bitti: {total} satır.")
+
+def main():
+    p = argparse.ArgumentParser(description="sensor_readings tablosu")
+    p.add_argument("--backfill", action="store_true",
+                   help="event_logs'taki eski sensör satırlarını sensor_readings'e kopyala")
+    p.add_argument("--batch-size", type=int, default=10000)
+    args = p.parse_args()
+
+    if args.backfill:
+        backfill(args.batch_size)
+    else:
+        conn = db.connect()
+        cursor = conn.cursor()
+        ensure_table(cursor, conn)
+        cursor.close()
+        conn.close()
+        print("sensor_readings tablosu hazır.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import db
+import deadband
+import readings
+
+# Retention for the raw tables + downsampled rollups.
+#   sensor_rollup_1m / sensor_rollup_1h : min / max / avg per sensor, per board
+#   raw event_logs / sensor_readings    : pruned (or archived into monthly
+#                                         <table>_YYYYMM tables) past RAW_RETENTION_DAYS
+#   command_queue                       : sent / superseded rows past
+#                                         COMMAND_RETENTION_DAYS, pending ones stay
+#   python retention.py                 -> roll up closed buckets, then prune
+#   python retention.py --every 300     -> same, every 5 minutes
+# SMART_HOME_RAW_DAYS / SMART_HOME_MINUTE_DAYS set the windows for this script
+# and for the dashboard, so it never asks raw / 1m tables for pruned ranges.
+
+RAW_RETENTION_DAYS = int(os.environ.get("SMART_HOME_RAW_DAYS", 30))
+MINUTE_RETENTION_DAYS = int(os.environ.get("SMART_HOME_MINUTE_DAYS", 365))   # sensor_rollup_1h is kept forever
+COMMAND_RETENTION_DAYS = 7      # handled commands; the dispatcher only looks at is_sent=0
+ROLLUP_LAG = 120                # seconds; buckets newer than this may still get rows
+ROLLUP_CHUNK = timedelta(hours=6)
+ROLLUP_SCAN = 50000             # sensor_readings ids per touched-bucket scan
+PRUNE_BATCH = 5000              # rows per DELETE, short locks for the bridge
+PRUNE_PAUSE = 0.05              # seconds between batches
+
+ROLLUPS = {
+    # table: (bucket seconds, bucket expression over sensor_readings.ts)
+    "sensor_rollup_1m": (60, "ts - INTERVAL SECOND(ts) SECOND"),
+    "sensor_rollup_1h": (3600, "ts - INTERVAL (MINUTE(ts) * 60 + SECOND(ts)) SECOND"),
+}
+
+# raw table -> timestamp column
+RAW_TABLES = {
+    "event_logs": "event_timestamp",
+    "sensor_readings": "ts",
+}
+
+# (table, index) -> columns
+INDEXES = {
+    # range scans for pruning and for ORDER BY event_timestamp in training
+    ("event_logs", "idx_event_ts"): "event_timestamp",
+    # pending-command lookups (dispatcher claim, predictor check) read only is_sent=0
+    ("command_queue", "idx_sent"): "is_sent, id",
+}
+
+def _rollup_columns():
+    cols = []
+    for c in readings.COLUMNS:
+        cols += [f"{c}_min", f"{c}_max", f"{c}_avg"]
+    return cols
+
+ROLLUP_COLUMNS = _rollup_columns()
+
+def create_rollup_sql(table):
+    col_defs = ",\n".join(f"        {c} FLOAT NULL" for c in ROLLUP_COLUMNS)
+    # device_id '' = readings without a board id (single-port bridge)
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        bucket DATETIME NOT NULL,
+        device_id VARCHAR(64) NOT NULL DEFAULT '',
+        samples INT NOT NULL,
+{col_defs},
+        PRIMARY KEY (bucket, device_id)
+    )
+"""
+
+def rollup_sql(table):
+    _, bucket = ROLLUPS[table]
+    aggs = []
+    for c in readings.COLUMNS:
+        aggs += [f"MIN({c})", f"MAX({c})", f"AVG({c})"]
+    updates = ", ".join(f"{c}=VALUES({c})" for c in ["samples"] + ROLLUP_COLUMNS)
+    # late rows for an already rolled bucket just recompute it
+    return f"""
+    INSERT INTO {table} (bucket, device_id, samples, {", ".join(ROLLUP_COLUMNS)})
+    SELECT {bucket} AS b, COALESCE(device_id, '') AS d, COUNT(*), {", ".join(aggs)}
+    FROM sensor_readings
+    WHERE ts >= %s AND ts < %s
+    GROUP BY b, d
+    ON DUPLICATE KEY UPDATE {updates}
+"""
+
+# sensor_readings.id up to which every row is in the rollup; rows past it
+# (new ones, or late ones from the spool drain after an outage) mark the
+# buckets to recompute
+CREATE_WATERMARK_SQL = """
+    CREATE TABLE IF NOT EXISTS rollup_watermark (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        last_id BIGINT NOT NULL
+    )
+"""
+
+def ensure_tables(cursor, conn):
+    readings.ensure_table(cursor, conn)
+    for table in ROLLUPS:
+        cursor.execute(create_rollup_sql(table))
+    cursor.execute(CREATE_WATERMARK_SQL)
+    for (table, index), columns in INDEXES.items():
+        cursor.execute(
+            "SELECT COUNT(*) FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s AND INDEX_NAME=%s",
+            (db.DB_NAME, table, index)
+        )
+        if cursor.fetchone()[0] == 0:
+            print(f"{table}({columns}) indeksi oluşturuluyor...")
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+    conn.commit()
+
+def floor_time(ts, seconds):
+    return datetime.fromtimestamp(int(ts.timestamp()) // seconds * seconds)
+
+# --- ROLLUP ---
+def bucket_ranges(buckets, seconds, chunk=ROLLUP_CHUNK):
+    # touched bucket starts -> [start, stop) ranges, neighbours merged, each at
+    # most `chunk` long so one statement stays short
+    ranges = []
+    step = timedelta(seconds=seconds)
+    for b in sorted(set(buckets)):
+        if ranges and ranges[-1][1] == b and b + step - ranges[-1][0] <= chunk:
+            ranges[-1][1] = b + step
+        else:
+            ranges.append([b, b + step])
+    return [tuple(r) for r in ranges]
+
+def touched_buckets(cursor, conn, table, after_id, end):
+    # bucket starts (before `end`) of rows with id > after_id, and the id the
+    # watermark can move to: the row before the first one still in an open bucket
+    _, bucket = ROLLUPS[table]
+    cursor.execute("SELECT MIN(id), MAX(id) FROM sensor_readings WHERE id > %s", (after_id,))
+    first, top = cursor.fetchone()
+    if first is None:
+        conn.commit()
+        return set(), after_id
+    buckets, last_id, lo = set(), top, first - 1
+    while lo < top:
+        hi = min(lo + ROLLUP_SCAN, top)
+        cursor.execute(
+            f"SELECT DISTINCT {bucket} FROM sensor_readings WHERE id > %s AND id <= %s AND ts < %s",
+            (lo, hi, end))
+        buckets.update(r[0] for r in cursor.fetchall())
+        cursor.execute("SELECT MIN(id) FROM sensor_readings WHERE id > %s AND id <= %s AND ts >= %s",
+                       (lo, hi, end))
+        first_open = cursor.fetchone()[0]
+        if first_open is not None and first_open - 1 < last_id:
+            last_id = first_open - 1
+        lo = hi
+    conn.commit()
+    return buckets, last_id
+
+def rollup(cursor, conn, table, now=None):
+    # -> (rolled up to, sensor_readings.id watermark)
+    seconds, _ = ROLLUPS[table]
+    end = floor_time((now or datetime.now()) - timedelta(seconds=ROLLUP_LAG), seconds)
+
+    cursor.execute("SELECT last_id FROM rollup_watermark WHERE name=%s", (table,))
+    row = cursor.fetchone()
+    after_id = row[0] if row else 0
+    buckets, last_id = touched_buckets(cursor, conn, table, after_id, end)
+
+    total = 0
+    ranges = bucket_ranges(buckets, seconds)
+    for start, stop in ranges:
+        # every row of the bucket, not just the new ones: the upsert recomputes it
+        cursor.execute(rollup_sql(table), (start, stop))
+        total += cursor.rowcount
+        conn.commit()
+    cursor.execute(
+        "INSERT INTO rollup_watermark (name, last_id) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE last_id=VALUES(last_id)", (table, last_id))
+    conn.commit()
+    print(f"{table}: {end} öncesi toplandı, {len(buckets)} kova ({len(ranges)} aralık, "
+          f"{total} satır değişti), id <= {last_id}")
+    return end, last_id
+
+# --- PRUNE / ARCHIVE ---
+def _months(first, last):
+    month = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= last:
+        nxt = (month + timedelta(days=32)).replace(day=1)
+        yield month, nxt
+        month = nxt
+
+def prune(cursor, conn, table, ts_col, cutoff, archive=False, batch=PRUNE_BATCH, where=None):
+    # walks the primary key in fixed id ranges so each DELETE is short;
+    # `where` narrows what may go (e.g. only handled commands)
+    old = f"{ts_col} < %s" + (f" AND ({where})" if where else "")
+    cursor.execute(f"SELECT MIN(id), MAX(id) FROM {table} WHERE {old}", (cutoff,))
+    lo, hi = cursor.fetchone()
+    conn.commit()
+    if lo is None:
+        return 0
+
+    removed = 0
+    while lo <= hi:
+        upper = lo + batch - 1
+        if archive:
+            cursor.execute(
+                f"SELECT MIN({ts_col}), MAX({ts_col}) FROM {table} WHERE id BETWEEN %s AND %s AND {old}",
+                (lo, upper, cutoff)
+            )
+            first, last = cursor.fetchone()
+            if first is not None:
+                for month, nxt in _months(first, last):
+                    archive_table = f"{table}_{month:%Y%m}"
+                    cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive_table} LIKE {table}")
+                    cursor.execute(
+                        f"INSERT IGNORE INTO {archive_table} SELECT * FROM {table} "
+                        f"WHERE id BETWEEN %s AND %s AND {ts_col} >= %s AND {ts_col} < %s AND {old}",
+                        (lo, upper, month, nxt, cutoff)
+                    )
+        cursor.execute(f"DELETE FROM {table} WHERE id BETWEEN %s AND %s AND {old}", (lo, upper, cutoff))
+        removed += cursor.rowcount
+        conn.commit()
+        lo = upper + 1
+        time.sleep(PRUNE_PAUSE)
+    print(f"{table}: {cutoff} öncesi {removed} satır {'arşivlendi' if archive else 'silindi'}")
+    return removed
+
+def prune_rollup(cursor, conn, table, cutoff, batch=PRUNE_BATCH):
+    removed = 0
+    while True:
+        cursor.execute(f"DELETE FROM {table} WHERE bucket < %s LIMIT %s", (cutoff, batch))
+        conn.commit()
+        removed += cursor.rowcount
+        if cursor.rowcount < batch:
+            break
+        time.sleep(PRUNE_PAUSE)
+    print(f"{table}: {cutoff} öncesi {removed} satır silindi")
+    return removed
+
+def run_once(args):
+    conn = db.connect()
+    cursor = conn.cursor()
+    try:
+        ensure_tables(cursor, conn)
+        t0 = time.perf_counter()
+        rolled, rolled_id = map(min, zip(*(rollup(cursor, conn, table) for table in ROLLUPS)))
+        t_rollup = time.perf_counter()
+
+        if not args.no_prune:
+            now = datetime.now()
+            raw_cutoff = now - timedelta(days=args.raw_days)
+            for table, ts_col in RAW_TABLES.items():
+                cutoff, where = raw_cutoff, None
+                if table == "sensor_readings":
+                    # never drop readings that are not in every rollup yet
+                    cutoff, where = min(cutoff, rolled), f"id <= {int(rolled_id)}"
+                prune(cursor, conn, table, ts_col, cutoff, args.archive, args.batch_size, where)
+            prune_rollup(cursor, conn, "sensor_rollup_1m", now - timedelta(days=args.minute_days), args.batch_size)
+            # keeps the is_sent=0 lookups on a small table; pending rows are never touched
+            prune(cursor, conn, "command_queue", "created_at", now - timedelta(days=args.command_days),
+                  batch=args.batch_size, where="is_sent <> 0")
+        print(f"Toplama {t_rollup - t0:.1f} sn, budama {time.perf_counter() - t_rollup:.1f} sn")
+    finally:
+        cursor.close()
+        conn.close()
+
+# --- READ SIDE (dashboard / training) ---
+CHART_POINTS = 400      # points per series sent to a chart, whatever the range
+# bucket sizes (seconds) the dashboard can aggregate to
+CHART_BUCKETS = (10, 30, 60, 300, 900, 3600, 4 * 3600, 86400)
+BUCKET_EPOCH = "2000-01-01 00:00:00"
+
+def rollup_table_for(span):
+    return "sensor_rollup_1m" if span <= timedelta(days=2) else "sensor_rollup_1h"
+
+def bucket_for(span, points=CHART_POINTS):
+    # smallest step giving at most ~2 x points buckets; lttb() does the rest
+    target = span.total_seconds() / (2 * points)
+    for seconds in CHART_BUCKETS:
+        if seconds >= target:
+            return seconds
+    return CHART_BUCKETS[-1]
+
+def source_for(since, bucket, now=None, raw_days=RAW_RETENTION_DAYS, minute_days=MINUTE_RETENTION_DAYS):
+    # coarsest table that is still finer than the bucket and still covers
+    # `since` under the retention windows retention.py prunes with
+    age = (now or datetime.now()) - since
+    if bucket < 60 and age <= timedelta(days=raw_days):
+        return "sensor_readings"
+    if bucket < 3600 and age <= timedelta(days=minute_days):
+        return "sensor_rollup_1m"
+    return "sensor_rollup_1h"
+
+def bucket_sql(table, seconds):
+    # all boards merged per bucket: min of mins, max of maxes, sample-weighted mean
+    seconds = int(seconds)
+    if table == "sensor_readings":
+        ts, samples = "ts", "COUNT(*)"
+        aggs = [f"MIN({c}), MAX({c}), AVG({c})" for c in readings.COLUMNS]
+    else:
+        ts, samples = "bucket", "SUM(samples)"
+        aggs = [f"MIN({c}_min), MAX({c}_max), SUM({c}_avg * samples) / SUM(samples)" for c in readings.COLUMNS]
+    # DATETIME arithmetic from a fixed local midnight: day buckets start at 00:00
+    step = f"'{BUCKET_EPOCH}' + INTERVAL (TIMESTAMPDIFF(SECOND, '{BUCKET_EPOCH}', {ts}) DIV {seconds} * {seconds}) SECOND"
+    return (f"SELECT {step} AS b, {samples}, {', '.join(aggs)} FROM {table} "
+            f"WHERE {ts} >= %s AND {ts} < %s GROUP BY b ORDER BY b")
+
+def _bucket_frame(rows):
+    names = ["ts", "samples"]
+    for key in readings.KEYS:
+        names += [f"{key}_min", f"{key}_max", key]
+    df = pd.DataFrame(rows, columns=names)
+    df["ts"] = pd.to_datetime(df["ts"])
+    for c in names[1:]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df
+
+def _query_buckets(sql, since, until):
+    conn = db.connect()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, (since, until))
+        return _bucket_frame(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+def load_rollup(since, until=None, table=None):
+    # one row per stored rollup bucket
+    until = until or datetime.now()
+    table = table or rollup_table_for(until - since)
+    seconds, _ = ROLLUPS[table]
+    return _query_buckets(bucket_sql(table, seconds), since, until)
+
+def hold_buckets(df, bucket, heartbeat=None):
+    # raw rows stored with loggerDaV2 --deadband leave buckets empty while the
+    # values hold still: those get the previous bucket's mean (samples 0), for
+    # at most one heartbeat (the bridge's, deadband.configured_heartbeat()),
+    # longer gaps are real outages
+    heartbeat = deadband.configured_heartbeat() if heartbeat is None else heartbeat
+    limit = int(heartbeat // bucket)
+    if df.empty or limit < 1:
+        return df
+    grid = pd.date_range(df["ts"].iloc[0], df["ts"].iloc[-1], freq=f"{bucket}s")
+    out = df.set_index("ts").reindex(grid)
+    empty = out["samples"].isna()
+    held = out[readings.KEYS].ffill(limit=limit)
+    for key in readings.KEYS:
+        for c in (f"{key}_min", f"{key}_max", key):
+            out[c] = out[c].where(~empty, held[key])
+    out["samples"] = out["samples"].fillna(0)
+    out = out[~empty | held.notna().any(axis=1)]
+    return out.rename_axis("ts").reset_index()
+
+def load_buckets(since, until=None, bucket=None, held=None,
+                 raw_days=RAW_RETENTION_DAYS, minute_days=MINUTE_RETENTION_DAYS):
+    # GROUP BY in MySQL: at most (until - since) / bucket rows come back,
+    # from raw readings or the finest rollup that can answer -> (df, table);
+    # held: raw rows are deadband-compressed (default: SMART_HOME_DEADBAND set),
+    # otherwise an empty bucket is a real gap and stays one
+    until = until or datetime.now()
+    bucket = bucket or bucket_for(until - since)
+    table = source_for(since, bucket, raw_days=raw_days, minute_days=minute_days)
+    df = _query_buckets(bucket_sql(table, bucket), since, until)
+    if held is None:
+        held = deadband.configured() is not None
+    if table == "sensor_readings" and held:
+        df = hold_buckets(df, bucket)
+    return df, table
+
+def lttb(x, y, points):
+    # Largest-Triangle-Three-Buckets: indices of `points` samples that keep
+    # the visual shape of y(x) (peaks survive, flat stretches thin out)
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(int)   # points - 2 inner bins
+    out = np.empty(points, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            cx, cy = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+def downsample(df, columns, points=CHART_POINTS):
+    # union of each column's LTTB picks: every series keeps its own peaks,
+    # the others just get a few more points that lie on their curve
+    if len(df) <= points:
+        return df
+    x = df["ts"].to_numpy("datetime64[s]").astype(np.int64).astype(float)
+    keep = set()
+    for c in columns:
+        y = df[c].interpolate(limit_direction="both").fillna(0).to_numpy(float)
+        keep.update(lttb(x, y, points).tolist())
+    return df.iloc[sorted(keep)]
+
+def parse_args():
+    p = argparse.ArgumentParser(description="event_logs / sensor_readings saklama ve özet tabloları")
+    p.add_argument("--raw-days", type=int, default=RAW_RETENTION_DAYS,
+                   help="ham satırların saklanacağı gün sayısı (varsayılan: SMART_HOME_RAW_DAYS; "
+                        "panel de aynı değeri okusun)")
+    p.add_argument("--minute-days", type=int, default=MINUTE_RETENTION_DAYS,
+                   help="dakikalık özetlerin saklanacağı gün sayısı (varsayılan: SMART_HOME_MINUTE_DAYS)")
+    p.add_argument("--command-days", type=int, default=COMMAND_RETENTION_DAYS,
+                   help="gönderilmiş komutların saklanacağı gün sayısı")
+    p.add_argument("--archive", action="store_true",
+                   help="silmeden önce aylık <tablo>_YYYYMM tablolarına taşı")
+    p.add_argument("--batch-size", type=int, default=PRUNE_BATCH)
+    p.add_argument("--no-prune", action="store_true", help="sadece özetleri güncelle")
+    p.add_argument("--every", type=float, metavar="SANİYE",
+                   help="sürekli çalış, bu aralıkla tekrarla")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    while True:
+        run_once(args)
+        if not args.every:
+            break
+        time.sleep(args.every)
+
+if __name__ == "__main__":
+    main()
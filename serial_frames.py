@@ -0,0 +1,166 @@
+import binascii
+import struct
+from collections import namedtuple
+
+import metrics
+
+# Binary sensor frame (sketch_jan15a.ino with BINARY_FRAMES 1), 28 bytes
+# instead of ~95 for the LOG;SENSORS;ALL text line:
+#   off size
+#    0   2  sync 0xA5 0x5A
+#    2   1  version (FRAME_VERSION)
+#    3   1  type (TYPE_SENSORS)
+#    4   1  board id
+#    5   2  sequence, +1 per frame, wraps at 65536
+#    7   4  millis() when sampled
+#   11   8  gas, flame, ldr, water     uint16 (raw analogRead)
+#   19   1  vibration                  uint8
+#   20   2  distance                   uint16, cm * 10
+#   22   4  temp, hum                  int16, * 100, NAN16 = DHT read error
+#   26   2  CRC-16/CCITT-FALSE over bytes 2..25
+# Little endian (AVR). Text lines (EVENT|..., LOG;... from older sketches)
+# can be mixed into the same stream: they never contain the sync bytes.
+
+SYNC = b"\xa5\x5a"
+FRAME_VERSION = 1
+TYPE_SENSORS = 1
+NAN16 = 0x7FFF
+MAX_LINE = 512          # text without a newline past this is dropped
+
+FRAME = struct.Struct("<2sBBBHIHHHHBHhhH")
+FRAME_SIZE = FRAME.size
+CRC_START, CRC_END = 2, FRAME_SIZE - 2
+
+# values in readings.COLUMNS order; lost = frames missing before this one
+SensorFrame = namedtuple("SensorFrame", "board seq millis values lost")
+
+FRAMES = metrics.Counter("serial_frames_total", "Binary frames by decode result", ["device", "result"])
+FRAMES_LOST = metrics.Counter("serial_frames_lost_total", "Frames missing from the sequence numbers", ["device"])
+SKIPPED_BYTES = metrics.Counter("serial_skipped_bytes_total", "Bytes dropped while resynchronising", ["device"])
+
+def crc16(data):
+    # CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), same as crc16_ccitt() in the sketch
+    return binascii.crc_hqx(data, 0xFFFF)
+
+def _scaled(raw, scale):
+    return None if raw == NAN16 else raw / scale
+
+def encode(board, seq, millis, values):
+    # values in readings.COLUMNS order (None -> NAN16); used by sim_arduino.py
+    gas, flame, ldr, water, vib, dist, temp, hum = values
+    body = FRAME.pack(
+        SYNC, FRAME_VERSION, TYPE_SENSORS, board, seq & 0xFFFF, millis & 0xFFFFFFFF,
+        int(gas), int(flame), int(ldr), int(water), int(vib),
+        min(int(round(dist * 10)), 0xFFFF),
+        NAN16 if temp is None else int(round(temp * 100)),
+        NAN16 if hum is None else int(round(hum * 100)),
+        0,
+    )
+    return body[:CRC_END] + struct.pack("<H", crc16(body[CRC_START:CRC_END]))
+
+def details(values):
+    # event_logs.details text for a frame, formatted like logSensors()
+    gas, flame, ldr, water, vib, dist, temp, hum = values
+    t = "nan" if temp is None else f"{temp:.2f}"
+    h = "nan" if hum is None else f"{hum:.2f}"
+    return (f"GAS={gas:.0f},FLAME={flame:.0f},LDR={ldr:.0f},WATER={water:.0f},"
+            f"VIBRATION={vib:.0f},DIST={dist:.2f},TEMP={t},HUM={h}")
+
+class FrameDecoder:
+    # One per port. feed() takes whatever read() returned and gives back
+    # SensorFrame / str (text line) items in arrival order; a partial frame or
+    # line stays in the buffer for the next call.
+    def __init__(self, device_id=None):
+        self.device_id = device_id or ""
+        self.buf = bytearray()
+        self.last = {}          # board -> (seq, millis)
+        self.stats = {"frames": 0, "lines": 0, "crc_errors": 0, "bad_version": 0,
+                      "lost": 0, "resets": 0, "skipped_bytes": 0}
+        self._ok = FRAMES.labels(self.device_id, "ok")
+        self._crc = FRAMES.labels(self.device_id, "crc_error")
+        self._version = FRAMES.labels(self.device_id, "bad_version")
+        self._lost = FRAMES_LOST.labels(self.device_id)
+        self._skipped = SKIPPED_BYTES.labels(self.device_id)
+
+    def feed(self, data):
+        buf = self.buf
+        buf += data
+        out = []
+        pos, n = 0, len(buf)
+        # slices of mv are views: CRC and unpack read the buffer in place
+        with memoryview(buf) as mv:
+            while pos < n:
+                if buf[pos] == 0xA5:
+                    if n - pos < 2:
+                        break
+                    if buf[pos + 1] == 0x5A:
+                        if n - pos < FRAME_SIZE:
+                            break       # rest of the frame not here yet
+                        frame = self._frame(mv, pos)
+                        if frame is None:
+                            # bad frame: its bytes are not text either, jump to
+                            # the next sync (keep a last byte, it may start one)
+                            nxt = buf.find(SYNC, pos + 1)
+                            nxt = n - 1 if nxt == -1 else nxt
+                            self._skip(nxt - pos)
+                            pos = nxt
+                            continue
+                        out.append(frame)
+                        pos += FRAME_SIZE
+                        continue
+
+                nl = buf.find(b"\n", pos)
+                sync = buf.find(SYNC, pos)
+                if sync != -1 and (nl == -1 or sync < nl):
+                    # no newline before the next frame: a cut line or noise
+                    self._skip(sync - pos)
+                    pos = sync
+                    continue
+                if nl == -1:
+                    if n - pos > MAX_LINE:
+                        self._skip(n - pos)
+                        pos = n
+                    break
+                line = bytes(mv[pos:nl]).decode("utf-8", errors="ignore").strip()
+                pos = nl + 1
+                if line:
+                    self.stats["lines"] += 1
+                    out.append(line)
+        del buf[:pos]
+        return out
+
+    def _skip(self, count):
+        self.stats["skipped_bytes"] += count
+        self._skipped.inc(count)
+
+    def _frame(self, mv, pos):
+        (_, version, ftype, board, seq, millis, gas, flame, ldr, water, vib,
+         dist, temp, hum, crc) = FRAME.unpack_from(mv, pos)
+        if crc16(mv[pos + CRC_START:pos + CRC_END]) != crc:
+            self.stats["crc_errors"] += 1
+            self._crc.inc()
+            return None
+        if version != FRAME_VERSION or ftype != TYPE_SENSORS:
+            self.stats["bad_version"] += 1
+            self._version.inc()
+            return None
+
+        lost = 0
+        prev = self.last.get(board)
+        if prev is not None:
+            gap = (seq - prev[0] - 1) & 0xFFFF
+            if millis < prev[1]:
+                self.stats["resets"] += 1   # board rebooted: sequence starts over
+            elif gap < 0x8000:
+                lost = gap
+            # else: an old frame seen again, nothing lost
+        self.last[board] = (seq, millis)
+        self.stats["frames"] += 1
+        self._ok.inc()
+        if lost:
+            self.stats["lost"] += lost
+            self._lost.inc(lost)
+
+        values = (float(gas), float(flame), float(ldr), float(water), float(vib),
+                  dist / 10, _scaled(temp, 100), _scaled(hum, 100))
+        return SensorFrame(board, seq, millis, values, lost)
@@ -0,0 +1,233 @@
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+
+import serial_frames
+
+# Simulated sketch_jan15a.ino boards. Each board prints the sketch's
+# "LOG;SENSORS;ALL;GAS=...,DIST=...,TEMP=...,HUM=..." line (println -> \r\n),
+# or with --protocol binary the BINARY_FRAMES frame (serial_frames.py), at a
+# fixed rate and reads back the ALARM:... commands the bridge writes.
+#   pty : POSIX pseudo-terminal, the bridge opens the slave path (/dev/pts/N)
+#   tcp : loopback socket, the bridge opens socket://127.0.0.1:PORT
+#   python sim_arduino.py --devices 4 --rate 10 --transport tcp
+
+ALARM_VALUES = {
+    # sensor overrides that make label_frame() return the alarm
+    "FIRE": {"flame": (100, 400)},
+    "GAS": {"gas": (750, 950)},
+    "FLOOD": {"water": (200, 400)},
+    "INTRUSION": {"ldr": (750, 1000), "dist": (5.0, 25.0)},
+    "VIBRATION": {"vib": (1, 1)},
+}
+
+def sensor_values(rnd, alarm=None):
+    # readings.COLUMNS order; temp/hum None = DHT read error ("nan")
+    v = {
+        "gas": rnd.randint(150, 450),
+        "flame": rnd.randint(850, 1023),
+        "ldr": rnd.randint(200, 650),
+        "water": rnd.randint(0, 60),
+        "vib": 0,
+        "dist": rnd.uniform(60.0, 300.0),
+        "temp": rnd.uniform(19.0, 26.0),
+        "hum": rnd.uniform(35.0, 60.0),
+    }
+    for key, (lo, hi) in ALARM_VALUES.get(alarm, {}).items():
+        v[key] = rnd.uniform(lo, hi) if isinstance(lo, float) else rnd.randint(lo, hi)
+    dht_error = rnd.random() < 0.002
+    return (v["gas"], v["flame"], v["ldr"], v["water"], v["vib"], round(v["dist"], 2),
+            None if dht_error else round(v["temp"], 2), None if dht_error else round(v["hum"], 2))
+
+def sensor_line(rnd, alarm=None):
+    # same field order and number formatting as logSensors() in the sketch
+    return "LOG;SENSORS;ALL;" + serial_frames.details(sensor_values(rnd, alarm))
+
+class PtyLink:
+    def __init__(self):
+        import tty
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)      # no echo / line editing, like a USB CDC port
+        self.port = os.ttyname(self.slave)
+
+    def wait_connected(self, timeout):
+        return True                 # the kernel buffers until the bridge opens the slave
+
+    def send(self, data):
+        os.write(self.master, data)
+
+    def recv(self):
+        return os.read(self.master, 1024)
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+class TcpLink:
+    def __init__(self, host="127.0.0.1"):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, 0))
+        self.server.listen(1)
+        self.port = f"socket://{host}:{self.server.getsockname()[1]}"
+        self.conn = None
+        self.connected = threading.Event()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.conn = conn
+            self.connected.set()
+
+    def wait_connected(self, timeout):
+        return self.connected.wait(timeout)
+
+    def send(self, data):
+        if self.conn is None:
+            return              # board powered, nobody listening: line is lost
+        try:
+            self.conn.sendall(data)
+        except OSError:
+            self.conn = None
+            self.connected.clear()
+
+    def recv(self):
+        self.connected.wait()
+        try:
+            data = self.conn.recv(1024)
+        except (OSError, AttributeError):
+            data = b""
+        if not data:
+            self.conn = None
+            self.connected.clear()
+            time.sleep(0.05)
+        return data
+
+    def close(self):
+        self.server.close()
+        if self.conn:
+            self.conn.close()
+
+class SimBoard:
+    def __init__(self, device_id, rate=1.0, transport="pty", seed=0, protocol="text", drop=0.0):
+        self.device_id = device_id
+        self.rate = rate
+        self.protocol = protocol
+        self.drop = drop            # share of binary frames lost on the wire
+        self.board = seed & 0xFF
+        self.seq = 0
+        self.link = PtyLink() if transport == "pty" else TcpLink()
+        self.port = self.link.port
+        self.rnd = random.Random(seed)
+        self.sent = 0
+        self.commands = []          # (perf_counter, command)
+        self.alarm = None
+        self.alarm_left = 0
+        self.alarm_started = None   # perf_counter of the first alarm line
+        self.lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._send_loop, name=f"sim-{self.device_id}", daemon=True).start()
+        threading.Thread(target=self._recv_loop, name=f"sim-rx-{self.device_id}", daemon=True).start()
+        return self
+
+    def trigger(self, alarm, lines):
+        with self.lock:
+            self.alarm, self.alarm_left, self.alarm_started = alarm, lines, None
+
+    def _send_loop(self):
+        interval = 1.0 / self.rate
+        next_at = started = time.perf_counter()
+        while not self._stop_event.is_set():
+            with self.lock:
+                alarm = self.alarm if self.alarm_left > 0 else None
+                if alarm:
+                    self.alarm_left -= 1
+                    if self.alarm_started is None:
+                        self.alarm_started = time.perf_counter()
+            if self.protocol == "binary":
+                millis = int((time.perf_counter() - started) * 1000)
+                data = serial_frames.encode(self.board, self.seq, millis, sensor_values(self.rnd, alarm))
+                self.seq += 1
+                if self.drop and self.rnd.random() < self.drop:
+                    data = b""
+            else:
+                data = (sensor_line(self.rnd, alarm) + "\r\n").encode()
+            try:
+                if data:
+                    self.link.send(data)
+            except OSError:
+                break
+            self.sent += 1
+            # fixed schedule: a slow write does not lower the long-run rate
+            next_at += interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at = time.perf_counter()
+
+    def _recv_loop(self):
+        buf = b""
+        while not self._stop_event.is_set():
+            try:
+                data = self.link.recv()
+            except OSError:
+                break
+            buf += data
+            while b"\n" in buf:
+                line, buf = buf.split(b"\n", 1)
+                command = line.decode(errors="ignore").strip()
+                if command:
+                    with self.lock:
+                        self.commands.append((time.perf_counter(), command))
+
+    def wait_command(self, predicate, after, timeout):
+        # first command matching predicate received after `after` (perf_counter)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            with self.lock:
+                for t, cmd in self.commands:
+                    if t >= after and predicate(cmd):
+                        return t, cmd
+            time.sleep(0.005)
+        return None
+
+    def close(self):
+        self._stop_event.set()
+        self.link.close()
+
+def main():
+    p = argparse.ArgumentParser(description="sketch_jan15a.ino simülatörü")
+    p.add_argument("--devices", type=int, default=1)
+    p.add_argument("--rate", type=float, default=1.0, help="kart başına satır/sn")
+    p.add_argument("--transport", choices=["pty", "tcp"], default="pty" if os.name == "posix" else "tcp")
+    p.add_argument("--protocol", choices=["text", "binary"], default="text")
+    p.add_argument("--drop", type=float, default=0.0, help="binary: kaybolan çerçeve oranı")
+    args = p.parse_args()
+
+    boards = [SimBoard(f"sim{i}", args.rate, args.transport, seed=i, protocol=args.protocol, drop=args.drop).start()
+              for i in range(args.devices)]
+    print("loggerDaV2.py --ports " + " ".join(f"{b.port}={b.device_id}" for b in boards))
+    try:
+        while True:
+            time.sleep(5)
+            print(" ".join(f"{b.device_id}: gönderilen={b.sent} komut={len(b.commands)}" for b in boards))
+    except KeyboardInterrupt:
+        for b in boards:
+            b.close()
+
+if __name__ == "__main__":
+    main()
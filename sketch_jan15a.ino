@@ -60,6 +60,15 @@ int buzzerInterval = 0;
 
 float currentDistance = 0;
 
+// Binary sensor frames (serial_frames.py): 28 bytes with sequence number and
+// CRC instead of the ~95 byte LOG;SENSORS;ALL line. EVENT| lines stay text.
+#define BINARY_FRAMES 0
+#define FRAME_VERSION 1
+#define FRAME_TYPE_SENSORS 1
+#define FRAME_NAN16 0x7FFF
+const byte boardId = 1;
+uint16_t frameSeq = 0;
+
 void setup() {
     Serial.begin(9600);  
     Serial1.begin(9600); 
@@ -191,16 +200,52 @@ void logSensors() {
   int water = analogRead(waterSensorPin);
   int vib = digitalRead(vibrationSensorPin);
 
+#if BINARY_FRAMES
+  sendSensorFrame(gas, flame, ldr, water, vib);
+#else
   String data = "GAS=" + String(gas) + ",FLAME=" + String(flame) + 
                 ",LDR=" + String(ldr) + ",WATER=" + String(water) + 
                 ",VIBRATION=" + String(vib) + ",DIST=" + String(currentDistance) +
                 ",TEMP=" + String(temperature) + ",HUM=" + String(humidity);
 
   Serial1.println("LOG;SENSORS;ALL;" + data);
+#endif
   Serial.print("Sıcaklık: "); Serial.print(temperature);
   Serial.print("C, Nem: %"); Serial.println(humidity);
 }
 
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), binascii.crc_hqx(data, 0xFFFF) in Python
+uint16_t crc16_ccitt(const uint8_t* data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  for (size_t i = 0; i < len; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (byte b = 0; b < 8; b++) crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+void putU16(uint8_t* p, uint16_t v) { p[0] = v & 0xFF; p[1] = v >> 8; }
+
+int16_t scaled16(float v) { return isnan(v) ? FRAME_NAN16 : (int16_t)lround(v * 100); }
+
+void sendSensorFrame(int gas, int flame, int ldr, int water, int vib) {
+  // layout: see serial_frames.py (little endian)
+  uint8_t f[28];
+  unsigned long now = millis();
+  f[0] = 0xA5; f[1] = 0x5A;
+  f[2] = FRAME_VERSION; f[3] = FRAME_TYPE_SENSORS; f[4] = boardId;
+  putU16(f + 5, frameSeq++);
+  f[7] = now; f[8] = now >> 8; f[9] = now >> 16; f[10] = now >> 24;
+  putU16(f + 11, gas); putU16(f + 13, flame); putU16(f + 15, ldr); putU16(f + 17, water);
+  f[19] = vib;
+  float d = currentDistance * 10 + 0.5;
+  putU16(f + 20, d > 65535 ? 65535 : (uint16_t)d);
+  putU16(f + 22, scaled16(temperature));
+  putU16(f + 24, scaled16(humidity));
+  putU16(f + 26, crc16_ccitt(f + 2, 24));
+  Serial1.write(f, sizeof(f));
+}
+
 void checkPassword() {
   lcd_1.clear();
   if (enteredPassword.equals(correctPassword)) {
@@ -0,0 +1,305 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from mysql.connector import Error
+
+import db
+import metrics
+
+# Durable local spool between the serial threads and MySQL.
+#   put()  -> one record appended to the current segment file (one write(),
+#             no DB round trip); the serial read never waits for MySQL
+#   run()  -> replay thread: reads records in order and inserts them in bulk;
+#             each batch commits together with spool_checkpoint.last_seq, and
+#             after a failed batch the checkpoint is read back before the
+#             retry, so a crash, outage or lost commit reply never inserts a
+#             row twice
+# spool/seg-<first seq>.log, records: len, crc32, seq, time, JSON [statement, params].
+# Replayed segments are deleted; the current one always stays.
+#   python loggerDaV2.py --ports COM4 COM5 --spool
+
+SPOOL_DIR = "spool"
+SPOOL_NAME = "bridge"           # spool_checkpoint row
+SEGMENT_BYTES = 4 * 1024 * 1024
+REPLAY_BATCH = 500
+REPLAY_IDLE = 0.2               # seconds between polls when caught up
+RETRY_MIN_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+FSYNC_INTERVAL = 1.0            # power loss costs at most this much
+
+RECORD = struct.Struct("<IIQd")   # payload length, crc32(payload), seq, time.time()
+
+CREATE_CHECKPOINT_SQL = """
+    CREATE TABLE IF NOT EXISTS spool_checkpoint (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        last_seq BIGINT UNSIGNED NOT NULL
+    )
+"""
+INIT_CHECKPOINT_SQL = "INSERT IGNORE INTO spool_checkpoint (name, last_seq) VALUES (%s, 0)"
+SELECT_CHECKPOINT_SQL = "SELECT last_seq FROM spool_checkpoint WHERE name=%s"
+UPDATE_CHECKPOINT_SQL = "UPDATE spool_checkpoint SET last_seq=%s WHERE name=%s"
+
+APPEND_SECONDS = metrics.Histogram("spool_append_seconds", "One record written to the segment file")
+APPENDED = metrics.Counter("spool_appended_total", "Records appended")
+REPLAYED = metrics.Counter("spool_replayed_total", "Records inserted into MySQL")
+REPLAY_ERRORS = metrics.Counter("spool_replay_errors_total", "Failed replay batches (MySQL down / slow)")
+TORN = metrics.Counter("spool_torn_records_total", "Damaged records skipped at a segment tail")
+DEPTH = metrics.Gauge("spool_depth_records", "Records in the spool not yet in MySQL")
+LAG = metrics.Gauge("spool_lag_seconds", "Age of the oldest record not yet in MySQL")
+BYTES = metrics.Gauge("spool_bytes", "Segment files on disk")
+
+def _segment_name(first_seq):
+    return f"seg-{first_seq:020d}.log"
+
+class Spool(threading.Thread):
+    def __init__(self, directory=SPOOL_DIR, statements=None, name=SPOOL_NAME, prepare=None, batch=REPLAY_BATCH):
+        super().__init__(name="spool-replay", daemon=True)
+        self.dir = directory
+        self.statements = dict(statements or {})         # key -> SQL
+        self._keys = {sql: key for key, sql in self.statements.items()}
+        self.spool_name = name
+        self.prepare = prepare      # called until it returns True before the first replay
+        self.batch = batch
+        self.stats = {"appended": 0, "replayed": 0, "batches": 0, "errors": 0, "torn": 0}
+        self.checkpoint = None      # last seq known to be in MySQL
+        self._head_time = None      # time of the oldest record not in MySQL
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._synced = True
+
+        os.makedirs(directory, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            next_seq = self._last_seq(segments[-1]) + 1
+            if next_seq == segments[-1]:
+                # last segment holds no intact record (only a torn one): reuse it empty
+                os.remove(self._path(segments[-1]))
+        else:
+            # fresh directory: start past anything an older spool could have
+            # checkpointed under the same name (µs clock, ~1k records/s)
+            next_seq = time.time_ns() // 1000
+        self.next_seq = next_seq
+        self._open_segment(next_seq)
+        self._reader = None         # (first_seq, file, offset)
+
+        DEPTH.set_function(self.depth)
+        LAG.set_function(self.lag)
+        BYTES.set_function(self.disk_bytes)
+
+    # --- segments ---
+    def _segments(self):
+        return sorted(int(f[4:-4]) for f in os.listdir(self.dir) if f.startswith("seg-") and f.endswith(".log"))
+
+    def _path(self, first_seq):
+        return os.path.join(self.dir, _segment_name(first_seq))
+
+    def _records(self, f, offset, limit=None):
+        # complete, intact records from offset; stops at a partial or damaged one
+        out = []
+        f.seek(offset)
+        while limit is None or len(out) < limit:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                break
+            length, crc, seq, t = RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                return out, offset, True
+            offset += RECORD.size + length
+            out.append((seq, t, payload))
+        return out, offset, False
+
+    def _last_seq(self, first_seq):
+        with open(self._path(first_seq), "rb") as f:
+            records, _, _ = self._records(f, 0)
+        return records[-1][0] if records else first_seq - 1
+
+    def _open_segment(self, first_seq):
+        # a restart never appends to an old segment: its tail may be torn
+        self._segment = first_seq
+        self._file = open(self._path(first_seq), "ab", buffering=0)
+        self._size = 0
+
+    # --- append side (serial threads) ---
+    def put(self, sql, params):
+        payload = json.dumps([self._keys[sql], params], separators=(",", ":"), default=str).encode()
+        t = time.perf_counter()
+        with self._lock:
+            seq = self.next_seq
+            self.next_seq += 1
+            # unbuffered: once write() returns the record survives a process crash
+            self._file.write(RECORD.pack(len(payload), zlib.crc32(payload), seq, time.time()) + payload)
+            self._size += RECORD.size + len(payload)
+            self._synced = False
+            if self._size >= SEGMENT_BYTES:
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._open_segment(self.next_seq)
+            self.stats["appended"] += 1
+        APPEND_SECONDS.observe(time.perf_counter() - t)
+        APPENDED.inc()
+        return True
+
+    def _fsync(self):
+        with self._lock:
+            if self._synced:
+                return
+            fd = os.dup(self._file.fileno())   # the segment may rotate meanwhile
+            self._synced = True
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # --- replay side ---
+    def _read_batch(self):
+        # next records after the checkpoint, in seq order, across segments
+        while True:
+            if self._reader is None:
+                segments = self._segments()
+                if not segments:
+                    return []
+                first = segments[0]
+                self._reader = (first, open(self._path(first), "rb"), 0)
+            first, f, offset = self._reader
+            # checked before reading: a segment closed by then is complete on disk
+            with self._lock:
+                active = first == self._segment
+            records, offset, torn = self._records(f, offset, self.batch)
+            self._reader = (first, f, offset)
+            records = [r for r in records if r[0] > self.checkpoint]
+            if records:
+                return records
+            if active:
+                return []   # caught up (a partial record here is still being written)
+            if torn:
+                # a crash cut this segment short; the rest of it is unreadable
+                self.stats["torn"] += 1
+                TORN.inc()
+            f.close()
+            later = [s for s in self._segments() if s > first]
+            self._reader = (later[0], open(self._path(later[0]), "rb"), 0) if later else None
+
+    def _drop_replayed(self):
+        segments = self._segments()
+        for first, nxt in zip(segments, segments[1:]):
+            # everything in `first` is < nxt; keep the one being read or written
+            if nxt - 1 > self.checkpoint or first == self._segment or \
+                    (self._reader and first == self._reader[0]):
+                break
+            os.remove(self._path(first))
+
+    def _load_checkpoint(self, session):
+        session.execute(CREATE_CHECKPOINT_SQL, prepared=False)
+        session.execute(INIT_CHECKPOINT_SQL, (self.spool_name,))
+        rows = session.query(SELECT_CHECKPOINT_SQL, (self.spool_name,))
+        session.commit()
+        return int(rows[0][0])
+
+    def _insert(self, session, records):
+        groups = {}
+        for _, _, payload in records:
+            key, params = json.loads(payload)
+            groups.setdefault(key, []).append(params)
+        for key, rows in groups.items():
+            session.executemany(self.statements[key], rows)
+        session.execute(UPDATE_CHECKPOINT_SQL, (records[-1][0], self.spool_name))
+        session.commit()
+
+    def run(self):
+        session = db.session()
+        delay = RETRY_MIN_DELAY
+        pending = []
+        next_sync = time.monotonic() + FSYNC_INTERVAL
+        outage = False
+        while True:
+            if time.monotonic() >= next_sync:
+                self._fsync()
+                next_sync = time.monotonic() + FSYNC_INTERVAL
+            try:
+                if self.prepare is not None:
+                    if not self.prepare():
+                        raise Error(msg="veritabanı hazırlanamadı")
+                    self.prepare = None
+                if self.checkpoint is None:
+                    self.checkpoint = self._load_checkpoint(session)
+                    # a commit that failed or timed out may still have landed:
+                    # whatever the checkpoint now covers is in MySQL already
+                    pending = [r for r in pending if r[0] > self.checkpoint]
+                if not pending:
+                    pending = self._read_batch()
+                self._head_time = pending[0][1] if pending else None
+                if not pending:
+                    if self._stop_event.is_set():
+                        break
+                    self._stop_event.wait(REPLAY_IDLE)
+                    continue
+
+                self._insert(session, pending)
+                self.checkpoint = pending[-1][0]
+                self.stats["replayed"] += len(pending)
+                self.stats["batches"] += 1
+                REPLAYED.inc(len(pending))
+                pending = []
+                self._drop_replayed()
+                if outage:
+                    print(f"✔ MySQL tekrar erişilebilir, spool boşaltılıyor (derinlik {self.depth()})")
+                outage, delay = False, RETRY_MIN_DELAY
+            except Error as e:
+                session.rollback()
+                self.checkpoint = None      # reloaded before the retry
+                self.stats["errors"] += 1
+                REPLAY_ERRORS.inc()
+                if not outage:
+                    print(f"✖ MySQL yazılamıyor, kayıtlar spool'da bekliyor: {e}")
+                outage = True
+                if self._stop_event.is_set():
+                    break   # closing during an outage: the records stay on disk
+                retry_at = time.monotonic() + delay
+                while not self._stop_event.is_set() and time.monotonic() < retry_at:
+                    self._fsync()
+                    self._stop_event.wait(min(FSYNC_INTERVAL, max(0.0, retry_at - time.monotonic())))
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+        session.close()
+
+    # --- state ---
+    def depth(self):
+        # seqs are contiguous from the oldest segment on disk to next_seq - 1
+        with self._lock:
+            last = self.next_seq - 1
+        segments = self._segments()
+        done = segments[0] - 1 if segments else last
+        if self.checkpoint is not None:
+            done = max(done, self.checkpoint)
+        return max(0, last - done)
+
+    def lag(self):
+        head = self._head_time
+        return 0.0 if head is None else max(0.0, time.time() - head)
+
+    def disk_bytes(self):
+        total = 0
+        for first in self._segments():
+            try:
+                total += os.path.getsize(self._path(first))
+            except OSError:
+                pass
+        return total
+
+    def close(self, timeout=10):
+        # let the replay thread catch up (if MySQL is there), then sync the tail
+        self._stop_event.set()
+        self.join(timeout)
+        with self._lock:
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if self._reader:
+            self._reader[1].close()
+
+    def stats_line(self):
+        s = dict(self.stats, depth=self.depth(), lag=f"{self.lag():.1f}s", bytes=self.disk_bytes())
+        return ", ".join(f"{k}={v}" for k, v in s.items())
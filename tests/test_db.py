@@ -0,0 +1,14 @@
+import db
+
+
+def test_session_hands_the_connection_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_URL", f"sqlite:///{tmp_path / 'db.sqlite'}")
+    s = db.Session()
+    s.execute("INSERT INTO spool_checkpoint (name, last_seq) VALUES (%s, %s)", ("a", 1))
+    assert s.conn is not None and s.dirty
+    s.commit()
+    assert s.conn is None and not s.dirty
+
+    assert s.query("SELECT last_seq FROM spool_checkpoint WHERE name=%s", ("a",)) == [(1,)]
+    s.rollback()
+    assert s.conn is None
@@ -0,0 +1,37 @@
+import pandas as pd
+
+import deadband
+import readings
+import retention
+
+
+def _stored(gaps):
+    t = pd.Timestamp("2025-01-01")
+    ts = [t]
+    for g in gaps:
+        ts.append(ts[-1] + pd.Timedelta(seconds=g))
+    df = pd.DataFrame({"ts": ts, "device_id": "a"})
+    for key in readings.KEYS:
+        df[key] = 1.0
+    return df
+
+
+def test_expand_holds_for_the_configured_heartbeat(monkeypatch):
+    df = _stored([100, 1])
+    monkeypatch.delenv(deadband.HEARTBEAT_ENV, raising=False)
+    assert len(deadband.expand(df)) == 3        # 100 s > 60 + slack: an outage
+    monkeypatch.setenv(deadband.HEARTBEAT_ENV, "120")
+    assert len(deadband.expand(df)) == 102      # quiet stretch of a 120 s heartbeat
+
+
+def test_hold_buckets_follows_the_configured_heartbeat(monkeypatch):
+    t = pd.Timestamp("2025-01-01")
+    df = pd.DataFrame({"ts": [t, t + pd.Timedelta(seconds=100)], "samples": [5, 5]})
+    for key in readings.KEYS:
+        df[key] = df[f"{key}_min"] = df[f"{key}_max"] = 1.0
+    monkeypatch.delenv(deadband.HEARTBEAT_ENV, raising=False)
+    held = retention.hold_buckets(df, 10)
+    assert (held["samples"] == 0).sum() == 6
+    monkeypatch.setenv(deadband.HEARTBEAT_ENV, "120")
+    held = retention.hold_buckets(df, 10)
+    assert (held["samples"] == 0).sum() == 9
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import fast_forest
+from fast_forest import CompiledForest, compile_forest
+from predict_realtimev3 import SKLEARN_BATCH_ROWS, predict_batch
+
+COLS = [f"f{i}" for i in range(8)]
+
+
+@pytest.fixture(scope="module")
+def forest():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(3000, 8)) * [1, 10, 100, 1, 1, 5, 1, 1000]
+    y = np.select([X[:, 0] > 1, X[:, 1] + X[:, 2] / 10 > 12, X[:, 7] < -800], ["FIRE", "GAS", "WATER"], "NORMAL")
+    clf = RandomForestClassifier(n_estimators=40, random_state=42).fit(pd.DataFrame(X, columns=COLS), y)
+    X_test = rng.normal(size=(5000, 8)) * [1, 10, 100, 1, 1, 5, 1, 1000]
+    return clf, CompiledForest(compile_forest(clf)), X_test
+
+
+def _frame(X):
+    return pd.DataFrame(X, columns=COLS)
+
+
+def test_predict_one_matches_sklearn(forest):
+    clf, fast, X = forest
+    expected = clf.predict(_frame(X[:300]))
+    assert [fast.predict_one(x) for x in X[:300]] == list(expected)
+
+
+@pytest.mark.parametrize("size", [1, 16, 5000])
+def test_batch_matches_sklearn(forest, size):
+    # small batches step all trees together, big ones go tree by tree
+    clf, fast, X = forest
+    assert (size * len(fast.roots) <= fast_forest.TOGETHER_CELLS) == (size < 5000)
+    np.testing.assert_array_equal(fast.predict(X[:size]), clf.predict(_frame(X[:size])))
+    np.testing.assert_allclose(fast.predict_proba(X[:size]), clf.predict_proba(_frame(X[:size])), rtol=0, atol=1e-12)
+
+
+def test_predict_batch_with_estimator(forest):
+    clf, fast, X = forest
+    fast.estimator = clf
+    try:
+        for size in (SKLEARN_BATCH_ROWS - 1, len(X)):
+            np.testing.assert_array_equal(predict_batch(fast, X[:size], COLS), clf.predict(_frame(X[:size])))
+    finally:
+        fast.estimator = None
+
+
+def test_multi_output_rejected(forest):
+    clf = RandomForestClassifier(n_estimators=2, random_state=0).fit([[0], [1]], [[0, 1], [1, 0]])
+    with pytest.raises(ValueError):
+        compile_forest(clf)
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from feature_state import FeatureState, _synthetic_rows
+from train_modelv3 import parse_details, make_features
+
+
+def _expected(rows, devices=None):
+    df = pd.DataFrame(rows, columns=["id", "ts", "details"])
+    if devices is not None:
+        df["device_id"] = devices
+    df["details_parsed"] = df["details"].apply(parse_details)
+    df_features, feature_cols = make_features(df)
+    return df_features[feature_cols].to_numpy(dtype=float), feature_cols
+
+
+def _assert_close(got, expected, feature_cols):
+    diff = np.abs(got - expected)
+    bad = np.argwhere(diff > 1e-9 * np.maximum(1.0, np.abs(expected)))
+    assert not len(bad), [(int(r), feature_cols[c], got[r, c], expected[r, c]) for r, c in bad[:10]]
+
+
+def test_matches_make_features():
+    rows = _synthetic_rows(5000)
+    expected, feature_cols = _expected(rows)
+
+    state = FeatureState(feature_cols)
+    got = np.array([state.update(parse_details(d), ts) for _, ts, d in rows], dtype=float)
+    _assert_close(got, expected, feature_cols)
+
+
+def test_one_state_per_device_matches_make_features():
+    # interleaved boards: windows and diffs never mix readings of two devices
+    rows = _synthetic_rows(3000, seed=5)
+    devices = [("dev-a", "dev-b", "dev-c")[i % 3] if i % 7 else "dev-b" for i in range(len(rows))]
+    expected, feature_cols = _expected(rows, devices)
+
+    states = {}
+    got = []
+    for (_, ts, d), device_id in zip(rows, devices):
+        state = states.setdefault(device_id, FeatureState(feature_cols))
+        got.append(state.update(parse_details(d), ts))
+    _assert_close(np.array(got, dtype=float), expected, feature_cols)
+
+
+def test_missing_and_bad_values_count_as_zero():
+    state = FeatureState(["GAS", "WATER", "DISTANCE", "gas_diff1"])
+    assert state.update({"GAS": "ERR", "DIST": "nan"}, "2025-01-15 10:00:00") == [0.0, 0.0, 0.0, 0.0]
+    assert state.update({"GAS": "120", "DISTANCE": 40}, "2025-01-15 10:00:01") == [120.0, 0.0, 40.0, 120.0]
@@ -0,0 +1,25 @@
+import pandas as pd
+
+from feature_state import _synthetic_rows
+from train_modelv3 import label_frame, label_from_row, make_features, parse_details
+
+
+def _rows(extra=()):
+    rows = _synthetic_rows(3000, seed=9)
+    t = rows[-1][1]
+    return pd.DataFrame(rows + [(len(rows) + i + 1, t, d) for i, d in enumerate(extra)],
+                        columns=["id", "ts", "details"])
+
+
+def test_label_frame_matches_label_from_row():
+    # GAS=ERR rows come from _synthetic_rows; the extras put a non-numeric label
+    # key next to values that would alarm on their own
+    df = _rows(["GAS=ERR,FLAME=100,LDR=10,VIBRATION=0,WATER=0,DIST=50",
+                "GAS=900,FLAME=1000,LDR=10,VIBRATION=0,WATER=x,DIST=50",
+                "GAS=100,FLAME=1000,LDR=900,VIBRATION=1,WATER=0,DIST=abc"])
+    expected = df["details"].apply(parse_details).apply(label_from_row).to_numpy()
+    assert (expected[-3:] == 0).all()
+
+    df_features, _ = make_features(df)
+    assert "_invalid" in df_features.columns
+    assert (label_frame(df_features) == expected).all()
@@ -0,0 +1,11 @@
+import model_search
+
+
+def test_holdout_is_the_newest_rows_after_the_gap():
+    split, test_start = model_search.time_holdout(1000)
+    assert split == 800 and test_start == 800 + model_search.FOLD_GAP
+
+
+def test_folds_never_test_on_rows_before_training():
+    for train, test in model_search.time_folds(500, 4):
+        assert train.max() + model_search.FOLD_GAP < test.min()
@@ -0,0 +1,24 @@
+from datetime import datetime, timedelta
+
+import retention
+
+
+def test_bucket_ranges_merge_neighbours_up_to_a_chunk():
+    t = datetime(2025, 1, 1)
+    minutes = [t + timedelta(minutes=m) for m in (0, 1, 2, 5, 1, 9)]
+    assert retention.bucket_ranges(minutes, 60) == [
+        (t, t + timedelta(minutes=3)),
+        (t + timedelta(minutes=5), t + timedelta(minutes=6)),
+        (t + timedelta(minutes=9), t + timedelta(minutes=10)),
+    ]
+    hours = [t + timedelta(hours=h) for h in range(10)]
+    assert [b - a for a, b in retention.bucket_ranges(hours, 3600, chunk=timedelta(hours=4))] == \
+        [timedelta(hours=4), timedelta(hours=4), timedelta(hours=2)]
+
+
+def test_source_for_follows_the_retention_windows():
+    now = datetime(2025, 6, 1)
+    since = now - timedelta(days=10)
+    assert retention.source_for(since, 10, now, raw_days=30) == "sensor_readings"
+    assert retention.source_for(since, 10, now, raw_days=7) == "sensor_rollup_1m"
+    assert retention.source_for(since, 10, now, raw_days=7, minute_days=7) == "sensor_rollup_1h"
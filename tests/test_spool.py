@@ -0,0 +1,43 @@
+import time
+
+from mysql.connector import errors
+
+import db
+import spool
+
+INSERT_SQL = "INSERT INTO event_logs (event_timestamp, event_source, event_status, details) VALUES (%s, %s, %s, %s)"
+
+
+def _count(session):
+    n = session.query("SELECT COUNT(*) FROM event_logs")[0][0]
+    session.commit()
+    return n
+
+
+def test_replay_after_a_commit_that_landed_but_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_URL", f"sqlite:///{tmp_path / 'db.sqlite'}")
+    monkeypatch.setattr(spool, "RETRY_MIN_DELAY", 0.01)
+    commit = db.Session.commit
+    commits = []
+
+    def commit_then_fail(self):
+        # the first batch (after the checkpoint load) is applied by the
+        # server, but its reply never comes back
+        commit(self)
+        commits.append(True)
+        if len(commits) == 2:
+            raise errors.OperationalError(msg="Lost connection to MySQL server during query")
+
+    monkeypatch.setattr(db.Session, "commit", commit_then_fail)
+    sp = spool.Spool(str(tmp_path / "spool"), {"log": INSERT_SQL}, batch=50)
+    for i in range(120):
+        sp.put(INSERT_SQL, ["2025-01-01 00:00:00", "SENSORS", "ALL", f"GAS={i}"])
+    sp.start()
+    deadline = time.monotonic() + 10
+    while sp.depth() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    sp.close()
+
+    assert len(commits) > 2 and sp.stats["errors"] >= 1
+    assert sp.depth() == 0
+    assert _count(db.Session()) == 120
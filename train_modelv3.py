@@ -1,18 +1,45 @@
-import mysql.connector
 import pandas as pd
 import numpy as np
 import re
+import io
+import csv
 import joblib
 import time
+import argparse
+import tracemalloc
+import json
+import os
+from datetime import datetime
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 
-# --- DB ---
-DB_HOST = "localhost"
-DB_USER = "root"
-DB_PASSWORD = ""
-DB_NAME = "smart_home"
+import db
+import deadband
+from fast_forest import compile_forest
+import model_registry
+import model_search
+import readings
+
+# --- LABEL THRESHOLDS ---
+from readings import GAS_CRIT, FLAME_CRIT, WATER_CRIT, DISTANCE_MOTION, LDR_DARK
+
+# keys read from the sketch's "KEY=value,..." details string
+LABEL_KEYS = ["GAS", "FLAME", "LDR", "WATER", "VIBRATION", "DISTANCE", "DIST"]
+SENSOR_KEYS = LABEL_KEYS + ["TEMP", "HUM"]
+
+CHUNK_SIZE = 50000
+NORMAL_MINUTE_FRACTION = 0.1   # share of quiet minutes kept by --source rollup
+CONTEXT_SCAN = 5000             # rows before the watermark searched for --incremental context
+
+# --- MODEL FILES ---
+MODEL_PATH = "risk_model.pkl"
+STATE_PATH = "risk_model.state.json"     # watermark + run history
+REPLAY_PATH = "risk_model.replay.npz"    # class-balanced sample of past rows
+
+N_ESTIMATORS = 200
+INCREMENT_TREES = 20     # trees added per incremental run
+MAX_TREES = 400          # oldest trees are dropped past this
+REPLAY_PER_CLASS = 2000
 
 # --- PARSE ---
 def parse_details(details_str):
@@ -35,17 +62,75 @@ def parse_details(details_str):
                 out[k] = v
     return out
 
+# Vectorized version of parse_details over a whole column. The sketch sends a
+# fixed "KEY=value,..." layout, so turning "=" into "," gives a plain CSV that
+# the C parser reads into numeric columns; pair columns are then mapped to keys
+# with NumPy masks. Rows that don't fit the layout fall back to parse_details.
+# "_invalid" marks rows where a label key is present but not a number
+# (label_from_row returns 0 for those).
+def parse_details_frame(details):
+    details = details.reset_index(drop=True)
+    text = details.where(details.map(lambda x: isinstance(x, str)), "")
+    malformed = (text != "") & (text.str.count("=") != text.str.count(",") + 1)
+    text = text.mask(malformed, "")
+    # empty rows become a lone "," so the CSV keeps one line per row
+    lines = text.str.replace("=", ",", regex=False).mask(text == "", ",")
+
+    n = len(text)
+    cols = {key: np.full(n, np.nan) for key in SENSOR_KEYS}
+    invalid = np.zeros(n, dtype=bool)
+
+    n_pairs = int(text.str.count(",").max()) + 1 if n else 0
+    if n and (text != "").any():
+        raw = pd.read_csv(
+            io.StringIO("\n".join(lines)),
+            header=None, names=range(2 * n_pairs),
+            quoting=csv.QUOTE_NONE, skipinitialspace=True, engine="c"
+        )
+        for j in range(0, 2 * n_pairs, 2):
+            keys, vals = raw[j], raw[j + 1]
+            if vals.dtype.kind in "biuf":
+                num = vals.to_numpy(dtype="float64")
+                bad = np.zeros(n, dtype=bool)
+            else:
+                num = pd.to_numeric(vals, errors="coerce").to_numpy(dtype="float64")
+                literal_nan = vals.str.strip().str.lower().isin(["nan", "+nan", "-nan"])
+                bad = (vals.notna() & ~literal_nan).to_numpy() & np.isnan(num)
+            for key in keys.dropna().unique():
+                name = str(key).strip().upper()
+                if name not in cols:
+                    continue
+                m = (keys == key).to_numpy(dtype=bool)
+                cols[name] = np.where(m, num, cols[name])   # last one wins, like parse_details
+                if name in LABEL_KEYS:
+                    invalid |= m & bad
+
+    for i in np.flatnonzero(malformed.to_numpy()):
+        r = parse_details(details.iloc[i])
+        for name in SENSOR_KEYS:
+            if name in r:
+                try:
+                    cols[name][i] = float(r[name])
+                except (TypeError, ValueError):
+                    invalid[i] |= name in LABEL_KEYS
+
+    out = pd.DataFrame(cols)
+    out["_invalid"] = invalid
+    return out
+
 # --- load logs from db ---
 def load_sensor_logs(limit=None, since=None):
-    conn = mysql.connector.connect(host=DB_HOST, user=DB_USER,
-                                   password=DB_PASSWORD, database=DB_NAME)
+    conn = db.connect()
     cursor = conn.cursor()
-    q = "SELECT id, event_timestamp, event_source, event_status, details FROM event_logs WHERE event_source='SENSORS' AND event_status='ALL' ORDER BY event_timestamp ASC"
-    if limit:
-        q = q.replace("ORDER BY event_timestamp ASC", "ORDER BY event_timestamp ASC LIMIT %s" % int(limit))
+    q = "SELECT id, event_timestamp, event_source, event_status, details FROM event_logs WHERE event_source='SENSORS' AND event_status='ALL'"
+    params = ()
     if since:
-        q = "SELECT id, event_timestamp, event_source, event_status, details FROM event_logs WHERE event_source='SENSORS' AND event_status='ALL' AND event_timestamp >= %s ORDER BY event_timestamp ASC"
-    cursor.execute(q)
+        q += " AND event_timestamp >= %s"
+        params = (since,)
+    q += " ORDER BY event_timestamp ASC"
+    if limit:
+        q += " LIMIT %d" % int(limit)
+    cursor.execute(q, params)
     rows = cursor.fetchall()
     cursor.close()
     conn.close()
@@ -53,6 +138,130 @@ def load_sensor_logs(limit=None, since=None):
     df = pd.DataFrame(rows, columns=["id", "ts", "source", "status", "details"])
     return df
 
+# Streams the result set with fetchmany() from an unbuffered cursor and keeps
+# only the parsed numeric columns of each chunk, never the full text table.
+def load_sensor_frame(limit=None, chunksize=CHUNK_SIZE):
+    conn = db.connect()
+    cursor = conn.cursor(buffered=False)
+    q = "SELECT id, event_timestamp, details FROM event_logs WHERE event_source='SENSORS' AND event_status='ALL' ORDER BY event_timestamp ASC"
+    if limit:
+        q += " LIMIT %d" % int(limit)
+    cursor.execute(q)
+
+    frames = []
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        chunk = pd.DataFrame(rows, columns=["id", "ts", "details"])
+        parsed = parse_details_frame(chunk["details"])
+        frames.append(pd.concat([chunk[["id", "ts"]], parsed], axis=1))
+        print(f"  ... {sum(len(f) for f in frames)} rows")
+    cursor.close()
+    conn.close()
+
+    if not frames:
+        return pd.DataFrame(columns=["id", "ts"] + SENSOR_KEYS + ["_invalid"])
+    return pd.concat(frames, ignore_index=True)
+
+# Typed sensor_readings rows (written by loggerDaV2 / readings.py --backfill):
+# no text parsing at all, just numeric columns fetched chunk by chunk.
+# after_id: only rows past a watermark; context: that many rows at/before the
+# watermark are prepended per board so roll3/diff1 of the first new rows are correct.
+def load_sensor_readings(limit=None, chunksize=CHUNK_SIZE, after_id=None, context=0):
+    conn = db.connect()
+    cursor = conn.cursor(buffered=False)
+    columns = ["id", "device_id", "ts"] + readings.KEYS
+    frames = []
+
+    q = f"SELECT {readings.SELECT_COLUMNS} FROM sensor_readings"
+    params = ()
+    if after_id is not None:
+        if context:
+            # the last `context` rows of every board (windows are per board),
+            # looked for among the CONTEXT_SCAN rows before the watermark
+            cursor.execute(
+                f"SELECT {readings.SELECT_COLUMNS} FROM ("
+                f"SELECT {readings.SELECT_COLUMNS}, ROW_NUMBER() OVER "
+                "(PARTITION BY device_id ORDER BY id DESC) AS rn FROM sensor_readings "
+                "WHERE id <= %s AND id > %s) c WHERE rn <= %s ORDER BY ts ASC, id ASC",
+                (after_id, after_id - CONTEXT_SCAN, context))
+            frames.append(pd.DataFrame(cursor.fetchall(), columns=columns))
+        q += " WHERE id > %s"
+        params = (after_id,)
+    q += " ORDER BY ts ASC, id ASC"
+    if limit:
+        q += " LIMIT %d" % int(limit)
+    cursor.execute(q, params)
+
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        frames.append(pd.DataFrame(rows, columns=columns))
+    cursor.close()
+    conn.close()
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    df[readings.KEYS] = df[readings.KEYS].astype("float64")
+    return df
+
+# Minutes picked from sensor_rollup_1m (see retention.py): every minute whose
+# min/max crossed an alarm threshold plus a random share of quiet minutes; only
+# those minutes' raw rows are read, never the whole history.
+def load_rollup_sample(normal_fraction=NORMAL_MINUTE_FRACTION, chunksize=CHUNK_SIZE, seed=42):
+    conn = db.connect()
+    cursor = conn.cursor(buffered=False)
+    columns = ["id", "device_id", "ts"] + readings.KEYS
+
+    cursor.execute("CREATE TEMPORARY TABLE IF NOT EXISTS tmp_train_buckets (bucket DATETIME PRIMARY KEY)")
+    cursor.execute("TRUNCATE TABLE tmp_train_buckets")
+    cursor.execute(
+        """
+        INSERT INTO tmp_train_buckets
+        SELECT DISTINCT bucket FROM sensor_rollup_1m
+        WHERE flame_min <= %s OR gas_max >= %s OR water_max >= %s OR vibration_max >= 1
+           OR (ldr_max > %s AND distance_min < %s)
+           OR RAND(%s) < %s
+        """,
+        (FLAME_CRIT, GAS_CRIT, WATER_CRIT, LDR_DARK, DISTANCE_MOTION, seed, normal_fraction)
+    )
+    print(f"  ... {cursor.rowcount} minutes sampled from sensor_rollup_1m")
+    cursor.execute(
+        f"""
+        SELECT {readings.SELECT_COLUMNS}
+        FROM tmp_train_buckets b
+        JOIN sensor_readings r ON r.ts >= b.bucket AND r.ts < b.bucket + INTERVAL 1 MINUTE
+        ORDER BY r.ts ASC, r.id ASC
+        """
+    )
+
+    frames = []
+    while True:
+        rows = cursor.fetchmany(chunksize)
+        if not rows:
+            break
+        frames.append(pd.DataFrame(rows, columns=columns))
+    cursor.execute("DROP TEMPORARY TABLE tmp_train_buckets")
+    cursor.close()
+    conn.close()
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    df[readings.KEYS] = df[readings.KEYS].astype("float64")
+    return df
+
+# Offline source: the Parquet dataset written by export_dataset.py. Reads are
+# memory-mapped, only the needed columns are decoded, and since/until prune
+# day partitions and row groups before anything is loaded.
+def load_sensor_parquet(root=None, since=None, until=None, device_id=None):
+    import export_dataset  # pyarrow is only needed for this source
+    return export_dataset.load_dataset(root or export_dataset.DATASET_DIR, since, until, device_id,
+                                       columns=["id", "device_id", "ts"] + readings.KEYS)
+
 def label_from_row(r):
     try:
         gas = float(r.get("GAS", 0))
@@ -67,14 +276,6 @@ def label_from_row(r):
     except (ValueError, TypeError):
         return 0 
 
-    GAS_CRIT = 700
-    
-    FLAME_CRIT = 700 
-    WATER_CRIT = 150
-    DISTANCE_MOTION = 30 
-    LDR_DARK = 700 
-
-
     if flame <= FLAME_CRIT:
         return 2 
         
@@ -93,23 +294,61 @@ def label_from_row(r):
 
     return 0  
 
+# Same rules and order as label_from_row, evaluated on whole columns.
+def label_frame(df):
+    gas = df["GAS"].fillna(0).to_numpy()
+    flame = df["FLAME"].fillna(0).to_numpy()
+    ldr = df["LDR"].fillna(0).to_numpy()
+    water = df["WATER"].fillna(0).to_numpy()
+    vibration = df["VIBRATION"].fillna(0).to_numpy()
+    distance = df["DISTANCE"].fillna(0).to_numpy()
+    if "DIST" in df.columns:
+        dist = df["DIST"].to_numpy()
+        distance = np.where((distance == 0) & ~np.isnan(dist), dist, distance)
+
+    conditions = [
+        flame <= FLAME_CRIT,
+        gas >= GAS_CRIT,
+        water >= WATER_CRIT,
+        (ldr > LDR_DARK) & (np.abs(distance) < DISTANCE_MOTION) & (distance != 0),
+        (vibration == 1) & (flame > FLAME_CRIT) & (gas < GAS_CRIT),
+    ]
+    labels = np.select(conditions, [2, 1, 3, 4, 5], default=0)
+    if "_invalid" in df.columns:
+        labels = np.where(df["_invalid"].to_numpy(dtype=bool), 0, labels)
+    return labels
+
 # --- FEATURE ---
 def make_features(df_parsed):
     cols = ["GAS","FLAME","LDR","WATER","VIBRATION","DISTANCE"]
     
-    parsed = pd.json_normalize(df_parsed["details_parsed"])
-    
-    if "DIST" in parsed.columns and "DISTANCE" not in parsed.columns:
-        parsed["DISTANCE"] = parsed["DIST"]
-    elif "DIST" in parsed.columns and "DISTANCE" in parsed.columns:
+    if "details_parsed" in df_parsed.columns:
+        parsed = pd.json_normalize(df_parsed["details_parsed"])
+    elif "GAS" in df_parsed.columns:
+        # already parsed by load_sensor_frame / parse_details_frame
+        parsed = None
+    else:
+        parsed = parse_details_frame(df_parsed["details"])
 
-        parsed["DISTANCE"] = parsed["DISTANCE"].fillna(parsed["DIST"])
+    if parsed is None:
+        df = df_parsed.reset_index(drop=True)
+        if "DIST" in df.columns:
+            df["DISTANCE"] = df["DISTANCE"].fillna(df["DIST"])
+    else:
+        if "DIST" in parsed.columns and "DISTANCE" not in parsed.columns:
+            parsed["DISTANCE"] = parsed["DIST"]
+        elif "DIST" in parsed.columns and "DISTANCE" in parsed.columns:
 
-    for c in cols:
-        if c not in parsed.columns:
-            parsed[c] = 0
+            parsed["DISTANCE"] = parsed["DISTANCE"].fillna(parsed["DIST"])
+
+        for c in cols:
+            if c not in parsed.columns:
+                parsed[c] = 0
             
-    df = pd.concat([df_parsed.reset_index(drop=True), parsed[cols]], axis=1)
+        # _invalid (parse_details_frame) goes along so label_frame() keeps
+        # agreeing with label_from_row on non-numeric label keys
+        keep = cols + ["_invalid"] if "_invalid" in parsed.columns else cols
+        df = pd.concat([df_parsed.reset_index(drop=True), parsed[keep]], axis=1)
 
     for c in cols:
         df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0)
@@ -122,17 +361,29 @@ def make_features(df_parsed):
     df["second"] = df["ts"].dt.second
 
 
-    df["gas_roll3"] = df["GAS"].rolling(window=3, min_periods=1).mean()
-    df["flame_roll3"] = df["FLAME"].rolling(window=3, min_periods=1).mean()
-    df["ldr_roll3"] = df["LDR"].rolling(window=3, min_periods=1).mean()
-    df["water_roll3"] = df["WATER"].rolling(window=3, min_periods=1).mean()
-    df["dist_roll3"] = df["DISTANCE"].rolling(window=3, min_periods=1).mean()
-    df["vib_roll3"] = df["VIBRATION"].rolling(window=3, min_periods=1).mean()
+    # windows per board, in (device_id, ts) order like FeatureState sees them;
+    # rows keep their place in df
+    if "device_id" in df.columns:
+        key = df["device_id"].fillna("")
+        order = df.assign(_key=key).sort_values(["_key", "ts"], kind="stable").index
+        groups = df.loc[order, cols].groupby(key.loc[order], sort=False)
+    else:
+        groups = df[cols].groupby(np.zeros(len(df)), sort=False)
+
+    def roll3(c):
+        return groups[c].rolling(window=3, min_periods=1).mean().reset_index(level=0, drop=True)
+
+    df["gas_roll3"] = roll3("GAS")
+    df["flame_roll3"] = roll3("FLAME")
+    df["ldr_roll3"] = roll3("LDR")
+    df["water_roll3"] = roll3("WATER")
+    df["dist_roll3"] = roll3("DISTANCE")
+    df["vib_roll3"] = roll3("VIBRATION")
 
     # Rate of Change
-    df["gas_diff1"] = df["GAS"].diff().fillna(0)
-    df["flame_diff1"] = df["FLAME"].diff().fillna(0)
-    df["dist_diff1"] = df["DISTANCE"].diff().fillna(0)
+    df["gas_diff1"] = groups["GAS"].diff().fillna(0)
+    df["flame_diff1"] = groups["FLAME"].diff().fillna(0)
+    df["dist_diff1"] = groups["DISTANCE"].diff().fillna(0)
 
     feature_cols = [
         "GAS","FLAME","LDR","WATER","VIBRATION","DISTANCE",
@@ -144,21 +395,191 @@ def make_features(df_parsed):
     df[feature_cols] = df[feature_cols].fillna(0)
     return df, feature_cols
 
+# --- SAVE / STATE ---
+def save_model(clf, feature_cols, path=MODEL_PATH, info=None):
+    compiled = compile_forest(clf)
+    # the pkl keeps the sklearn model for --incremental; the live predictor
+    # maps the registry copy and picks the new version up by itself
+    joblib.dump({"model": clf, "features": feature_cols, "compiled": compiled}, path)
+    root = os.path.join(os.path.dirname(path), model_registry.REGISTRY_DIR)
+    version = model_registry.publish(compiled, feature_cols, root, info, estimator=clf)
+    print(f"Published {root}/{version}")
+    return version
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return None
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(state):
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2, default=str)
+    os.replace(tmp, STATE_PATH)
+
+def update_replay(X, y, seed=42):
+    # keep up to REPLAY_PER_CLASS rows per class, newest data mixed in each run,
+    # so incremental trees still see every class the model knows
+    if os.path.exists(REPLAY_PATH):
+        old = np.load(REPLAY_PATH)
+        X = np.vstack([old["X"], X])
+        y = np.concatenate([old["y"], y])
+    rng = np.random.default_rng(seed)
+    keep = []
+    for cls in np.unique(y):
+        idx = np.flatnonzero(y == cls)
+        if len(idx) > REPLAY_PER_CLASS:
+            # favour the newest half, sample the rest
+            recent = idx[-REPLAY_PER_CLASS // 2:]
+            older = rng.choice(idx[:-REPLAY_PER_CLASS // 2], REPLAY_PER_CLASS - len(recent), replace=False)
+            idx = np.sort(np.concatenate([older, recent]))
+        keep.append(idx)
+    keep = np.sort(np.concatenate(keep))
+    np.savez(REPLAY_PATH, X=X[keep], y=y[keep])
+
+def record_run(state, mode, df_features, n_trees, timings, source):
+    state = state or {"runs": []}
+    state["source"] = source
+    state["last_id"] = int(df_features["id"].max())
+    state["last_ts"] = str(df_features["ts"].max())
+    state["runs"] = (state.get("runs", []) + [{
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "rows": len(df_features),
+        "trees": n_trees,
+        **{k: round(v, 3) for k, v in timings.items()},
+    }])[-50:]
+    save_state(state)
+    print(f"Training wall time ({mode}): " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+# --- INCREMENTAL ---
+# Loads only rows past the stored watermark, adds INCREMENT_TREES trees fitted
+# on them plus the replay sample (warm_start), and drops the oldest trees past
+# MAX_TREES. Falls back to a full retrain when there is no usable state.
+def train_incremental(args):
+    state = load_state()
+    if not state or state.get("source") != "readings" or not os.path.exists(MODEL_PATH) \
+            or not os.path.exists(REPLAY_PATH):
+        print("No incremental state for sensor_readings, running a full retrain.")
+        return False
+
+    t0 = time.perf_counter()
+    bundle = joblib.load(MODEL_PATH)
+    clf, feature_cols = bundle["model"], bundle["features"]
+
+    print(f"Loading readings after id {state['last_id']}...")
+    df = load_sensor_readings(chunksize=args.chunksize, after_id=state["last_id"], context=2)
+    if args.expand:
+        # held copies keep the id of the row they repeat: seconds held from the
+        # watermark row count as context, expand() interleaves boards by ts
+        df = deadband.expand(df)
+    if df.empty or not (df["id"] > state["last_id"]).any():
+        print("No new readings since the last run.")
+        return True
+    t_load = time.perf_counter()
+
+    df_features, _ = make_features(df)
+    df_features["label"] = label_frame(df_features)
+    df_features = df_features[df_features["id"] > state["last_id"]]
+    t_feat = time.perf_counter()
+
+    X_new = df_features[feature_cols].to_numpy(dtype=float)
+    y_new = df_features["label"].to_numpy()
+    replay = np.load(REPLAY_PATH)
+    X = np.vstack([X_new, replay["X"]])
+    y = np.concatenate([y_new, replay["y"]])
+    if not np.array_equal(np.unique(y), clf.classes_):
+        print(f"Class set changed ({np.unique(y)} vs {clf.classes_}), running a full retrain.")
+        return False
+
+    clf.set_params(warm_start=True, n_estimators=len(clf.estimators_) + INCREMENT_TREES)
+    clf.fit(pd.DataFrame(X, columns=feature_cols), y)
+    if len(clf.estimators_) > MAX_TREES:
+        clf.estimators_ = clf.estimators_[-MAX_TREES:]
+        clf.set_params(n_estimators=MAX_TREES)
+    t_fit = time.perf_counter()
+
+    save_model(clf, feature_cols, info={"mode": "incremental", "rows": len(df_features)})
+    update_replay(X_new, y_new)
+    record_run(state, "incremental", df_features, len(clf.estimators_), {
+        "load": t_load - t0, "features": t_feat - t_load, "fit": t_fit - t_feat,
+        "total": time.perf_counter() - t0,
+    }, "readings")
+    print(f"\n✅ SUCCESS: {len(df_features)} new rows, model now has {len(clf.estimators_)} trees")
+    return True
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Train the risk model")
+    p.add_argument("--source", choices=["readings", "logs", "rollup", "parquet"], default="readings",
+                   help="typed sensor_readings table, raw event_logs details, minutes sampled via "
+                        "sensor_rollup_1m, or the export_dataset.py Parquet files")
+    p.add_argument("--dataset", help="--source parquet: dataset directory")
+    p.add_argument("--since", help="--source parquet: first day/time to load (YYYY-MM-DD[THH:MM])")
+    p.add_argument("--until", help="--source parquet: load rows before this day/time")
+    p.add_argument("--device", help="--source parquet: only this device_id")
+    p.add_argument("--normal-fraction", type=float, default=NORMAL_MINUTE_FRACTION,
+                   help="--source rollup: share of quiet minutes to keep")
+    p.add_argument("--chunksize", type=int, default=CHUNK_SIZE,
+                   help="rows fetched and parsed per chunk")
+    p.add_argument("--legacy-parse", action="store_true",
+                   help="old per-row parse_details/json_normalize/apply path")
+    p.add_argument("--incremental", action="store_true",
+                   help="train only on rows past the stored watermark (sensor_readings)")
+    p.add_argument("--expand", action="store_true",
+                   help="rebuild the 1 Hz series from rows stored with loggerDaV2.py --deadband")
+    p.add_argument("--search", action="store_true",
+                   help="time-ordered CV + parallel hyperparameter search (model_search.py) before training")
+    p.add_argument("--workers", type=int, help="--search: worker processes (default: all cores)")
+    p.add_argument("--report-memory", action="store_true",
+                   help="trace Python/NumPy allocations and print the peak")
+    return p.parse_args()
+
 def main():
+    args = parse_args()
+    if args.incremental and train_incremental(args):
+        return
+    if args.report_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+
     print("Loading logs from DB...")
-    df = load_sensor_logs()
+    if args.legacy_parse:
+        df = load_sensor_logs()
+    elif args.source == "logs":
+        df = load_sensor_frame(chunksize=args.chunksize)
+    elif args.source == "rollup":
+        df = load_rollup_sample(args.normal_fraction, chunksize=args.chunksize)
+    elif args.source == "parquet":
+        df = load_sensor_parquet(args.dataset, args.since, args.until, args.device)
+    else:
+        df = load_sensor_readings(chunksize=args.chunksize)
     if df.empty:
         print("No sensor logs found. Exit.")
         return
+    if args.expand:
+        n = len(df)
+        df = deadband.expand(df)
+        print(f"  ... {n} stored rows -> {len(df)} seconds")
 
-    df["details_parsed"] = df["details"].apply(parse_details)
+    if args.legacy_parse:
+        df["details_parsed"] = df["details"].apply(parse_details)
 
     print("Building features...")
     df_features, feature_cols = make_features(df)
 
     
     print("Applying updated labels...")
-    df_features["label"] = df_features["details_parsed"].apply(label_from_row)
+    if args.legacy_parse:
+        df_features["label"] = df_features["details_parsed"].apply(label_from_row)
+    else:
+        df_features["label"] = label_frame(df_features)
+
+    t_feat = time.perf_counter()
+    print(f"Load + parse + features + labels: {t_feat - t0:.2f} s for {len(df_features)} rows")
+    if args.report_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        print(f"Peak traced memory: {peak / 1e6:.1f} MB")
 
     print("Data sample (Last 5 rows):")
     print(df_features[["ts", "FLAME", "VIBRATION", "label"]].tail(10))
@@ -166,16 +587,21 @@ def main():
     X = df_features[feature_cols]
     y = df_features["label"]
 
-    
-    try:
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
-    except ValueError:
-        print("⚠ Uyarı: Veri azlığı nedeniyle stratify devre dışı.")
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # time-ordered holdout, with or without --search: the newest 20% is never
+    # searched or trained on (rolling features would leak it into a random split)
+    split, test_start = model_search.time_holdout(len(X))
+    X_train, X_test = X.iloc[:split], X.iloc[test_start:]
+    y_train, y_test = y.iloc[:split], y.iloc[test_start:]
+
+    params = {"n_estimators": N_ESTIMATORS}
+    if args.search:
+        best, _ = model_search.search(X_train.to_numpy(dtype=float), y_train.to_numpy(), workers=args.workers)
+        params = best["params"]
 
     print("Training Random Forest...")
-    clf = RandomForestClassifier(n_estimators=200, class_weight="balanced", random_state=42)
+    clf = RandomForestClassifier(class_weight="balanced", random_state=42, n_jobs=-1, **params)
     clf.fit(X_train, y_train)
+    t_fit = time.perf_counter()
 
     print("Evaluating...")
     preds = clf.predict(X_test)
@@ -184,8 +610,18 @@ def main():
     print(confusion_matrix(y_test, preds))
 
     # Save
-    joblib.dump({"model": clf, "features": feature_cols}, "risk_model.pkl")
-    print("\n✅ SUCCESS: Model saved to risk_model.pkl")
+    save_model(clf, feature_cols, info={"mode": "full", "rows": len(df_features)})
+    print(f"\n✅ SUCCESS: Model saved to {MODEL_PATH}")
+
+    # watermark + replay sample for later --incremental runs
+    source = "logs" if args.legacy_parse else args.source
+    if os.path.exists(REPLAY_PATH):
+        os.remove(REPLAY_PATH)
+    update_replay(X.to_numpy(dtype=float), y.to_numpy())
+    record_run(None, "full", df_features, len(clf.estimators_), {
+        "load+features": t_feat - t0, "fit": t_fit - t_feat,
+        "total": time.perf_counter() - t0,
+    }, source)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file